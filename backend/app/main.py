@@ -1,17 +1,69 @@
-from fastapi import FastAPI, File, UploadFile, Request, Form, Body
+from fastapi import FastAPI, File, UploadFile, Request, Form, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.datastructures import Headers
 from pydantic import BaseModel, Field
 import os
 import json
-from typing import Optional, Literal
+import itertools
+import math
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, Literal, List
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
-from app.services.classifier import classify_email
-from app.utils.file_parser import parse_file
+from app.models.email import ClassificationMode
+from app.services.backends.openai_backend import get_pool_stats
+from app.services.backends.registry import backend_stats, close_backends
+from app.services.batch import BATCH_MAX_CONCURRENCY, classify_batch, iter_batch_results, text_item, upload_items
+from app.services.batcher import get_classification_batcher
+from app.services.dispatcher import LLMUnavailableError, get_llm_dispatcher
+from app.services.cache import get_classification_cache, close_classification_cache
+from app.services.jobs import (
+    JOBS_DB_PATH,
+    JobNotFoundError,
+    close_job_manager,
+    export_csv,
+    export_jsonl,
+    file_job_inputs,
+    get_job_manager,
+    job_stats,
+    text_job_input,
+)
+from app.services.near_duplicate import get_near_duplicate_index
+from app.services.local_classifier import local_classifier_stats
+from app.services.classifier import classify_email, generate_reply, stream_classification
+from app.services.replies import ReplyNotFoundError, get_reply_store
+from app.services.result_log import close_result_log, export_results_csv, get_result_log, result_log_stats, start_result_log
+from app.services.speculative import speculative_stats
+from app.services.warmup import STARTUP_WARMUP, warm_up, warmup_stats
+from app.services.shared_state import SHARED_STATE_DB_PATH, close_shared_state, render_shared_metrics, start_shared_state
+from app.utils.file_parser import (
+    SUPPORTED_EXTENSIONS,
+    UNSUPPORTED_FILE_MESSAGE,
+    FileTooLargeError,
+    parse_file,
+    shutdown_pdf_executor,
+)
+from app.utils.mail_parser import MAILBOX_MAX_BYTES
+from app.utils.preprocess import PREPROCESS_ENABLED, preprocess_stats, start_tokenizer_load
+from app.utils.metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    REQUEST_DURATION,
+    REQUESTS_IN_FLIGHT,
+    render_metrics,
+    server_timing_header,
+    stage,
+    start_request_timing,
+)
+from app.utils.streaming import NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE, SSE_HEADERS, ndjson_stream, sse_event, sse_stream
+
+
+logger = logging.getLogger(__name__)
 
 
 class ClassificationResponse(BaseModel):
@@ -20,9 +72,9 @@ class ClassificationResponse(BaseModel):
         ..., 
         description="Categoria do email: 'Produtivo' para emails que requerem ação, 'Improdutivo' para emails sem ação necessária"
     )
-    suggested_response: str = Field(
-        ..., 
-        description="Resposta sugerida gerada pela IA para o email"
+    suggested_response: Optional[str] = Field(
+        None,
+        description="Resposta sugerida gerada pela IA para o email. Ausente quando include_reply=false"
     )
     confidence: float = Field(
         ..., 
@@ -30,6 +82,10 @@ class ClassificationResponse(BaseModel):
         le=1.0, 
         description="Nível de confiança da classificação (0.0 a 1.0)"
     )
+    reply_id: Optional[str] = Field(
+        None,
+        description="Identificador para gerar a resposta depois em POST /api/reply/{reply_id}. Presente quando include_reply=false"
+    )
 
     model_config = {
         "json_schema_extra": {
@@ -62,13 +118,124 @@ class TextRequest(BaseModel):
         }
     }
 
+class BatchEmail(BaseModel):
+    """Email de um lote"""
+    id: Optional[str] = Field(None, description="Identificador opcional devolvido junto com o resultado")
+    text: str = Field(..., description="Conteúdo do email (máximo 800 caracteres)")
+
+class BatchRequest(BaseModel):
+    """Requisição de classificação em lote"""
+    emails: List[BatchEmail] = Field(..., min_length=1, description="Emails a serem classificados")
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "emails": [
+                        {"id": "1", "text": "Olá, não consigo acessar minha conta. Podem ajudar?"},
+                        {"id": "2", "text": "Feliz Natal a toda a equipe!"}
+                    ]
+                }
+            ]
+        }
+    }
+
+class MailMessageInfo(BaseModel):
+    """Cabeçalhos de uma mensagem lida de uma caixa de email"""
+    message_id: str = Field("", description="Cabeçalho Message-ID")
+    subject: str = Field("", description="Assunto")
+    sender: str = Field("", description="Remetente (cabeçalho From)")
+
+class BatchItemResult(BaseModel):
+    """Resultado de um email do lote"""
+    index: int = Field(..., description="Posição do email na entrada")
+    id: Optional[str] = Field(None, description="Identificador enviado na entrada, nome do arquivo ou posição da mensagem na caixa de email")
+    result: Optional[ClassificationResponse] = Field(None, description="Classificação, quando bem-sucedida")
+    error: Optional[str] = Field(None, description="Mensagem de erro, quando a classificação falhou")
+    message: Optional[MailMessageInfo] = Field(None, description="Assunto e remetente, para mensagens de arquivos .mbox ou Maildir")
+
+class BatchResponse(BaseModel):
+    """Resposta da classificação em lote"""
+    results: List[BatchItemResult] = Field(..., description="Resultados na mesma ordem da entrada")
+    succeeded: int = Field(..., description="Quantidade de emails classificados")
+    failed: int = Field(..., description="Quantidade de emails com erro")
+
+MODE_QUERY = Query(
+    None,
+    description="Modo de classificação: 'two_step' (classificação e resposta em chamadas separadas) ou 'combined' (uma única chamada). Padrão definido por CLASSIFY_MODE"
+)
+REFRESH_QUERY = Query(
+    False,
+    description="Ignora o cache e força uma nova classificação pelo modelo"
+)
+INCLUDE_REPLY_QUERY = Query(
+    True,
+    description="Gera a resposta sugerida junto com a classificação. Com false, devolve só a categoria e um reply_id para pedir a resposta depois em POST /api/reply/{reply_id}"
+)
+
+StreamFormat = Literal["ndjson", "sse"]
+
+class JobRequest(BaseModel):
+    """Requisição de criação de job"""
+    emails: List[BatchEmail] = Field(..., min_length=1, description="Emails a serem classificados")
+
+class JobStatus(BaseModel):
+    """Estado e progresso de um job"""
+    id: str = Field(..., description="Identificador do job")
+    status: Literal["loading", "queued", "running", "completed", "cancelled"] = Field(..., description="Situação do job")
+    mode: Optional[ClassificationMode] = Field(None, description="Modo de classificação usado pelo job")
+    total: int = Field(..., description="Quantidade de emails no job")
+    succeeded: int = Field(..., description="Emails classificados")
+    failed: int = Field(..., description="Emails com erro")
+    pending: int = Field(..., description="Emails ainda não processados")
+    created_at: float = Field(..., description="Criação do job (timestamp Unix)")
+    finished_at: Optional[float] = Field(None, description="Conclusão ou cancelamento do job (timestamp Unix)")
+
+class ResultRecord(BaseModel):
+    """Classificação registrada no histórico"""
+    id: int = Field(..., description="Posição no histórico (crescente)")
+    created_at: float = Field(..., description="Momento da classificação (timestamp Unix)")
+    category: Literal["Produtivo", "Improdutivo"] = Field(..., description="Categoria atribuída")
+    confidence: Optional[float] = Field(None, description="Confiança da classificação")
+    source: Literal["model", "cache", "near_duplicate"] = Field(..., description="Origem do resultado: modelo (LLM ou pré-classificador local), cache ou email quase idêntico")
+    model: str = Field(..., description="Modelo(s) em uso na classificação")
+    email_hash: str = Field(..., description="SHA-256 do email normalizado, para agrupar emails repetidos")
+    email_chars: int = Field(..., description="Tamanho do email classificado, em caracteres")
+    email: Optional[str] = Field(None, description="Texto do email; só com RESULT_LOG_INCLUDE_TEXT=true")
+    suggested_response: Optional[str] = Field(None, description="Resposta sugerida; só com RESULT_LOG_INCLUDE_TEXT=true")
+    response_chars: Optional[int] = Field(None, description="Tamanho da resposta sugerida, em caracteres, quando foi gerada junto")
+
 class ErrorResponse(BaseModel):
     """Resposta de erro"""
     error: str = Field(..., description="Mensagem de erro")
     detail: Optional[str] = Field(None, description="Detalhes adicionais do erro")
 
 
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STARTUP_WARMUP:
+        await warm_up()
+    elif PREPROCESS_ENABLED:
+        start_tokenizer_load()
+    await start_result_log()
+    await start_shared_state()
+    if os.path.exists(JOBS_DB_PATH):
+        await get_job_manager().start()
+    yield
+    await close_job_manager(SHUTDOWN_DRAIN_SECONDS)
+    await get_reply_store().drain(SHUTDOWN_DRAIN_SECONDS)
+    await close_result_log()
+    await close_backends()
+    close_classification_cache()
+    await close_shared_state()
+    shutdown_pdf_executor()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Classificador de Emails API",
     description="""
 ## API para classificação automática de emails usando IA
@@ -93,6 +260,94 @@ Esta API classifica emails em duas categorias:
     }
 )
 
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(25 * 1024 * 1024)))
+MAILBOX_UPLOAD_PATHS = ("/api/classify/batch", "/api/jobs")
+
+
+class RequestTooLargeError(Exception):
+    pass
+
+
+class LimitRequestSizeMiddleware:
+    """Responde 413 quando o corpo passa do limite: pelo Content-Length ou, sem ele (chunked), contando os bytes recebidos.
+
+    Se o limite estoura no meio da leitura, a resposta que a rota tentar enviar é descartada e trocada pelo 413.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = MAILBOX_MAX_BYTES if scope["path"] in MAILBOX_UPLOAD_PATHS else REQUEST_MAX_BYTES
+        too_large = JSONResponse(
+            status_code=413,
+            content={"error": f"Requisição muito grande. Máximo {round(max_bytes / (1024 * 1024), 2):g} MB"}
+        )
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise RequestTooLargeError()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded or started:
+                raise
+        if exceeded and not started:
+            await too_large(scope, receive, send)
+
+
+app.add_middleware(LimitRequestSizeMiddleware)
+
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    timings = start_request_timing()
+    start = time.perf_counter()
+    status = 500
+    with REQUESTS_IN_FLIGHT.track_inprogress():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - start
+            route = request.scope.get("route")
+            REQUEST_DURATION.observe(
+                elapsed,
+                method=request.method,
+                path=getattr(route, "path", "unmatched"),
+                status=str(status)
+            )
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:5173")
 app.add_middleware(
     CORSMiddleware,
@@ -103,9 +358,53 @@ app.add_middleware(
 )
 
 
+def _service_unavailable(error: LLMUnavailableError) -> JSONResponse:
+    headers = {}
+    if error.retry_after:
+        headers["Retry-After"] = str(max(1, math.ceil(error.retry_after)))
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(error)},
+        headers=headers
+    )
+
+
+async def _read_email_content(request: Request) -> str:
+    content_type = request.headers.get("content-type", "").lower()
+    text: Optional[str] = None
+    file: Optional[UploadFile] = None
+    
+    if "application/json" in content_type:
+        with stage("request_body"):
+            body = await request.json()
+        text = body.get("text")
+    elif "multipart/form-data" in content_type:
+        with stage("request_body"):
+            form_data = await request.form()
+        
+        if "file" in form_data:
+            file = form_data["file"]
+        if "text" in form_data:
+            text = form_data.get("text")
+    
+    if not file and not text:
+        raise ValueError("É necessário fornecer um arquivo ou texto")
+    
+    if file:
+        if hasattr(file, 'filename'):
+            if file.filename and not file.filename.endswith(SUPPORTED_EXTENSIONS):
+                raise ValueError(UNSUPPORTED_FILE_MESSAGE)
+        return await parse_file(file)
+    
+    if len(text) > 800:
+        raise ValueError("Texto muito longo. Máximo 800 caracteres")
+    return text
+
+
 @app.post(
     "/api/classify",
     response_model=ClassificationResponse,
+    response_model_exclude_none=True,
     responses={
         200: {
             "description": "Classificação realizada com sucesso",
@@ -123,7 +422,7 @@ app.add_middleware(
                         },
                         "arquivo_invalido": {
                             "summary": "Arquivo inválido",
-                            "value": {"error": "Tipo de arquivo não suportado. Use .txt ou .pdf"}
+                            "value": {"error": UNSUPPORTED_FILE_MESSAGE}
                         },
                         "texto_longo": {
                             "summary": "Texto muito longo",
@@ -133,6 +432,14 @@ app.add_middleware(
                 }
             }
         },
+        413: {
+            "description": "Arquivo ou requisição acima do tamanho máximo",
+            "model": ErrorResponse
+        },
+        503: {
+            "description": "Serviço de IA indisponível ou sobrecarregado (ver cabeçalho Retry-After)",
+            "model": ErrorResponse
+        },
         500: {
             "description": "Erro interno do servidor",
             "model": ErrorResponse
@@ -142,6 +449,8 @@ app.add_middleware(
     description="""
 Classifica um email como **Produtivo** ou **Improdutivo** e gera uma resposta sugerida.
 
+Com `?include_reply=false` só a classificação é feita: a resposta volta sem `suggested_response` e com um `reply_id`, e a resposta é gerada depois, se necessário, em `POST /api/reply/{reply_id}`.
+
 ### Formas de envio:
 
 **1. Via JSON (texto direto):**
@@ -152,7 +461,7 @@ Classifica um email como **Produtivo** ou **Improdutivo** e gera uma resposta su
 ```
 
 **2. Via Form Data (upload de arquivo):**
-- Campo `file`: Arquivo .txt ou .pdf
+- Campo `file`: Arquivo .txt, .pdf ou .eml
 - Campo `text` (opcional): Texto alternativo
 
 ### Critérios de classificação:
@@ -171,58 +480,24 @@ Classifica um email como **Produtivo** ou **Improdutivo** e gera uma resposta su
     """,
     tags=["Classificação"]
 )
-async def classify_email_endpoint(request: Request):
+async def classify_email_endpoint(
+    request: Request,
+    mode: Optional[ClassificationMode] = MODE_QUERY,
+    refresh: bool = REFRESH_QUERY,
+    include_reply: bool = INCLUDE_REPLY_QUERY
+):
     try:
-        content_type = request.headers.get("content-type", "").lower()
-        text: Optional[str] = None
-        file: Optional[UploadFile] = None
+        email_content = await _read_email_content(request)
         
-        if "application/json" in content_type:
-            body = await request.json()
-            text = body.get("text")
-        elif "multipart/form-data" in content_type:
-            form_data = await request.form()
-            
-            if "file" in form_data:
-                file = form_data["file"]
-            if "text" in form_data:
-                text = form_data.get("text")
-        
-        if not file and not text:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "É necessário fornecer um arquivo ou texto"}
-            )
-        
-        email_content = ""
-        
-        if file:
-            if hasattr(file, 'filename'):
-                if file.filename and not file.filename.endswith(('.txt', '.pdf')):
-                    return JSONResponse(
-                        status_code=400,
-                        content={"error": "Tipo de arquivo não suportado. Use .txt ou .pdf"}
-                    )
-            try:
-                email_content = await parse_file(file)
-            except ValueError as e:
-                return JSONResponse(
-                    status_code=400,
-                    content={"error": str(e)}
-                )
-        
-        elif text:
-            if len(text) > 800:
-                return JSONResponse(
-                    status_code=400,
-                    content={"error": "Texto muito longo. Máximo 800 caracteres"}
-                )
-            email_content = text
-        
-        result = await classify_email(email_content)
+        result = await classify_email(email_content, mode=mode, refresh=refresh, include_reply=include_reply, speculative=True)
         
         return result
     
+    except FileTooLargeError as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
     except json.JSONDecodeError:
         return JSONResponse(
             status_code=400,
@@ -233,6 +508,8 @@ async def classify_email_endpoint(request: Request):
             status_code=400,
             content={"error": str(e)}
         )
+    except LLMUnavailableError as e:
+        return _service_unavailable(e)
     except Exception as e:
         error_message = str(e)
         if "OPENAI_API_KEY" in error_message or "api key" in error_message.lower():
@@ -249,19 +526,28 @@ async def classify_email_endpoint(request: Request):
 @app.post(
     "/api/classify/text",
     response_model=ClassificationResponse,
+    response_model_exclude_none=True,
     responses={
         200: {"description": "Classificação realizada com sucesso", "model": ClassificationResponse},
         400: {"description": "Erro de validação", "model": ErrorResponse},
-        500: {"description": "Erro interno do servidor", "model": ErrorResponse}
+        500: {"description": "Erro interno do servidor", "model": ErrorResponse},
+        503: {"description": "Serviço de IA indisponível ou sobrecarregado", "model": ErrorResponse}
     },
     summary="Classificar Email (Texto)",
     description="Classifica um email enviado como texto JSON. Endpoint alternativo com tipagem explícita.",
     tags=["Classificação"]
 )
-async def classify_email_text(body: TextRequest):
+async def classify_email_text(
+    body: TextRequest,
+    mode: Optional[ClassificationMode] = MODE_QUERY,
+    refresh: bool = REFRESH_QUERY,
+    include_reply: bool = INCLUDE_REPLY_QUERY
+):
     try:
-        result = await classify_email(body.text)
+        result = await classify_email(body.text, mode=mode, refresh=refresh, include_reply=include_reply, speculative=True)
         return result
+    except LLMUnavailableError as e:
+        return _service_unavailable(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -272,33 +558,450 @@ async def classify_email_text(body: TextRequest):
 @app.post(
     "/api/classify/file",
     response_model=ClassificationResponse,
+    response_model_exclude_none=True,
     responses={
         200: {"description": "Classificação realizada com sucesso", "model": ClassificationResponse},
         400: {"description": "Erro de validação", "model": ErrorResponse},
-        500: {"description": "Erro interno do servidor", "model": ErrorResponse}
+        413: {"description": "Arquivo acima do tamanho máximo", "model": ErrorResponse},
+        500: {"description": "Erro interno do servidor", "model": ErrorResponse},
+        503: {"description": "Serviço de IA indisponível ou sobrecarregado", "model": ErrorResponse}
     },
     summary="Classificar Email (Arquivo)",
-    description="Classifica um email enviado como arquivo (.txt ou .pdf).",
+    description="Classifica um email enviado como arquivo (.txt, .pdf ou .eml). De arquivos .eml são usados o assunto, o remetente e o corpo em texto (ou o HTML convertido em texto).",
     tags=["Classificação"]
 )
 async def classify_email_file(
-    file: UploadFile = File(..., description="Arquivo .txt ou .pdf contendo o email")
+    file: UploadFile = File(..., description="Arquivo .txt, .pdf ou .eml contendo o email"),
+    mode: Optional[ClassificationMode] = MODE_QUERY,
+    refresh: bool = REFRESH_QUERY,
+    include_reply: bool = INCLUDE_REPLY_QUERY
 ):
     try:
-        if not file.filename.endswith(('.txt', '.pdf')):
+        if not file.filename.endswith(SUPPORTED_EXTENSIONS):
             return JSONResponse(
                 status_code=400,
-                content={"error": "Tipo de arquivo não suportado. Use .txt ou .pdf"}
+                content={"error": UNSUPPORTED_FILE_MESSAGE}
             )
         
         email_content = await parse_file(file)
-        result = await classify_email(email_content)
+        result = await classify_email(email_content, mode=mode, refresh=refresh, include_reply=include_reply, speculative=True)
         return result
+    except FileTooLargeError as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
     except ValueError as e:
         return JSONResponse(
             status_code=400,
             content={"error": str(e)}
         )
+    except LLMUnavailableError as e:
+        return _service_unavailable(e)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Erro ao processar: {str(e)}"}
+        )
+
+
+@app.post(
+    "/api/classify/stream",
+    responses={
+        200: {
+            "description": "Eventos da classificação (Server-Sent Events)",
+            "content": {SSE_MEDIA_TYPE: {"schema": {"type": "string"}}}
+        },
+        400: {"description": "Erro de validação", "model": ErrorResponse}
+    },
+    summary="Classificar Email (Streaming)",
+    description="""
+Classifica um email e transmite o resultado como Server-Sent Events, aceitando as mesmas entradas de `/api/classify`.
+
+### Eventos:
+- `classification`: `{"category": ..., "confidence": ...}`, enviado assim que a classificação termina
+- `token`: `{"text": ...}`, trechos da resposta sugerida conforme são gerados
+- `done`: resultado completo (`category`, `suggested_response`, `confidence`), com a resposta já finalizada e assinada
+- `error`: `{"error": ...}`, se algo falhar durante a geração
+    """,
+    tags=["Classificação"]
+)
+async def classify_email_stream(request: Request, refresh: bool = REFRESH_QUERY):
+    try:
+        email_content = await _read_email_content(request)
+        if not email_content.strip():
+            raise ValueError("Conteúdo do email não pode estar vazio")
+    except FileTooLargeError as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
+    except ValueError as e:
+        message = "Formato JSON inválido" if isinstance(e, json.JSONDecodeError) else str(e)
+        return JSONResponse(
+            status_code=400,
+            content={"error": message}
+        )
+
+    async def events():
+        try:
+            async for event in stream_classification(email_content, refresh=refresh):
+                name = event.pop("event")
+                yield sse_event(name, event)
+        except Exception as e:
+            yield sse_event("error", {"error": f"Erro ao processar: {str(e)}"})
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+def _stream_format_from_accept(request: Request) -> Optional[StreamFormat]:
+    accept = request.headers.get("accept", "").lower()
+    if NDJSON_MEDIA_TYPE in accept:
+        return "ndjson"
+    if SSE_MEDIA_TYPE in accept:
+        return "sse"
+    return None
+
+
+@app.post(
+    "/api/classify/batch",
+    response_model=BatchResponse,
+    response_model_exclude_none=True,
+    responses={
+        200: {
+            "description": "Lote processado (erros individuais aparecem em cada item)",
+            "model": BatchResponse,
+            "content": {
+                NDJSON_MEDIA_TYPE: {"schema": BatchItemResult.model_json_schema()},
+                SSE_MEDIA_TYPE: {"schema": {"type": "string"}}
+            }
+        },
+        400: {"description": "Erro de validação", "model": ErrorResponse},
+        500: {"description": "Erro interno do servidor", "model": ErrorResponse}
+    },
+    summary="Classificar Lote de Emails",
+    description="""
+Classifica vários emails em uma única requisição, processando até `concurrency` emails em paralelo.
+
+### Formas de envio:
+
+**1. Via JSON:**
+```json
+{
+    "emails": [
+        {"id": "1", "text": "Conteúdo do primeiro email"},
+        {"id": "2", "text": "Conteúdo do segundo email"}
+    ]
+}
+```
+
+**2. Via Form Data:** um ou mais campos `files` com arquivos .txt, .pdf ou .eml, ou caixas de email inteiras em `.mbox` ou Maildir compactado em `.zip`. As mensagens de uma caixa são lidas uma a uma conforme são classificadas, sem carregar o arquivo inteiro em memória; cada resultado traz o `id` da mensagem e um campo `message` com `message_id`, `subject` e `sender`. Para caixas grandes, prefira o modo streaming ou `/api/jobs`.
+
+Com `?include_reply=false` cada resultado traz só a categoria e um `reply_id`; a resposta é gerada depois, apenas para os emails que precisarem dela, em `POST /api/reply/{reply_id}`.
+
+Os resultados voltam na ordem da entrada. Um item inválido (por exemplo, um PDF sem texto) gera erro apenas naquele item.
+
+### Streaming
+
+Com `?stream=ndjson` (ou `Accept: application/x-ndjson`) cada resultado é enviado em uma linha JSON assim que fica pronto, com o `index` e o `id` da entrada. Com `?stream=sse` (ou `Accept: text/event-stream`) os resultados chegam como eventos `result`, seguidos de um evento `done` com o resumo. Nesse modo a ordem é a de conclusão, e um cliente lento desacelera o processamento em vez de fazer o servidor acumular resultados.
+    """,
+    tags=["Classificação"]
+)
+async def classify_email_batch(
+    request: Request,
+    concurrency: Optional[int] = Query(None, ge=1, le=BATCH_MAX_CONCURRENCY, description="Máximo de emails processados em paralelo"),
+    mode: Optional[ClassificationMode] = MODE_QUERY,
+    refresh: bool = REFRESH_QUERY,
+    include_reply: bool = INCLUDE_REPLY_QUERY,
+    stream: Optional[StreamFormat] = Query(None, description="Envia os resultados conforme ficam prontos: 'ndjson' ou 'sse'")
+):
+    try:
+        content_type = request.headers.get("content-type", "").lower()
+        items = []
+
+        if "application/json" in content_type:
+            body = BatchRequest.model_validate(await request.json())
+            items = [text_item(email.text, email.id) for email in body.emails]
+        elif "multipart/form-data" in content_type:
+            form_data = await request.form()
+            files = [file for file in form_data.getlist("files") if hasattr(file, "filename")]
+            items = upload_items(files) if files else []
+
+        if not items:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "É necessário fornecer uma lista de emails ou arquivos"}
+            )
+
+        stream = stream or _stream_format_from_accept(request)
+        if stream:
+            results = iter_batch_results(items, concurrency=concurrency, mode=mode, refresh=refresh, include_reply=include_reply)
+            if stream == "sse":
+                return StreamingResponse(sse_stream(results), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+            return StreamingResponse(ndjson_stream(results), media_type=NDJSON_MEDIA_TYPE)
+
+        results = await classify_batch(items, concurrency=concurrency, mode=mode, refresh=refresh, include_reply=include_reply)
+        failed = sum(1 for item in results if "error" in item)
+
+        return {
+            "results": results,
+            "succeeded": len(results) - failed,
+            "failed": failed
+        }
+
+    except json.JSONDecodeError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Formato JSON inválido"}
+        )
+    except FileTooLargeError as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": str(e)}
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Erro ao processar: {str(e)}"}
+        )
+
+
+def _job_not_found() -> JSONResponse:
+    return JSONResponse(
+        status_code=404,
+        content={"error": "Job não encontrado"}
+    )
+
+
+@app.post(
+    "/api/jobs",
+    status_code=202,
+    response_model=JobStatus,
+    responses={
+        202: {"description": "Job criado e enfileirado", "model": JobStatus},
+        400: {"description": "Erro de validação", "model": ErrorResponse},
+        413: {"description": "Arquivo acima do tamanho máximo", "model": ErrorResponse},
+        500: {"description": "Erro interno do servidor", "model": ErrorResponse}
+    },
+    summary="Criar Job de Classificação",
+    description="""
+Enfileira um conjunto de emails para classificação em segundo plano e devolve o identificador do job.
+
+Aceita as mesmas entradas de `/api/classify/batch` (JSON com `emails` ou campos `files` com arquivos .txt, .pdf, .eml, .mbox ou Maildir em .zip; cada mensagem de uma caixa de email vira um item do job). Os emails ficam em uma fila persistente (sqlite, em `JOBS_DB_PATH`) processada por `JOBS_WORKERS` workers; cada resultado é gravado assim que fica pronto, e um job interrompido por uma reinicialização continua de onde parou.
+
+Acompanhe o progresso em `GET /api/jobs/{job_id}` ou `GET /api/jobs/{job_id}/events` e baixe os resultados em `GET /api/jobs/{job_id}/results`.
+    """,
+    tags=["Jobs"]
+)
+async def create_job(
+    request: Request,
+    mode: Optional[ClassificationMode] = MODE_QUERY,
+    refresh: bool = REFRESH_QUERY
+):
+    try:
+        content_type = request.headers.get("content-type", "").lower()
+        inputs = []
+
+        if "application/json" in content_type:
+            body = JobRequest.model_validate(await request.json())
+            inputs = [text_job_input(email.text, email.id) for email in body.emails]
+        elif "multipart/form-data" in content_type:
+            form_data = await request.form()
+            sources = [await file_job_inputs(file) for file in form_data.getlist("files") if hasattr(file, "filename")]
+            inputs = itertools.chain.from_iterable(sources)
+
+        job = await get_job_manager().submit(inputs, mode=mode, refresh=refresh)
+        return JSONResponse(status_code=202, content=job)
+
+    except json.JSONDecodeError:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Formato JSON inválido"}
+        )
+    except FileTooLargeError as e:
+        return JSONResponse(
+            status_code=413,
+            content={"error": str(e)}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": str(e)}
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Erro ao processar: {str(e)}"}
+        )
+
+
+@app.get(
+    "/api/jobs",
+    response_model=List[JobStatus],
+    summary="Listar Jobs",
+    description="Lista os jobs mais recentes.",
+    tags=["Jobs"]
+)
+async def list_jobs(limit: int = Query(50, ge=1, le=500, description="Quantidade máxima de jobs")):
+    return await get_job_manager().list_jobs(limit)
+
+
+@app.get(
+    "/api/jobs/{job_id}",
+    response_model=JobStatus,
+    responses={404: {"description": "Job não encontrado", "model": ErrorResponse}},
+    summary="Consultar Job",
+    description="Retorna a situação e o progresso de um job.",
+    tags=["Jobs"]
+)
+async def get_job(job_id: str):
+    try:
+        return await get_job_manager().get_job(job_id)
+    except JobNotFoundError:
+        return _job_not_found()
+
+
+@app.delete(
+    "/api/jobs/{job_id}",
+    response_model=JobStatus,
+    responses={404: {"description": "Job não encontrado", "model": ErrorResponse}},
+    summary="Cancelar Job",
+    description="Cancela um job: emails ainda não processados deixam de ser enviados ao modelo. Os resultados já gravados continuam disponíveis.",
+    tags=["Jobs"]
+)
+async def cancel_job(job_id: str):
+    try:
+        return await get_job_manager().cancel(job_id)
+    except JobNotFoundError:
+        return _job_not_found()
+
+
+@app.get(
+    "/api/jobs/{job_id}/events",
+    responses={
+        200: {
+            "description": "Resultados do job conforme ficam prontos (Server-Sent Events)",
+            "content": {SSE_MEDIA_TYPE: {"schema": {"type": "string"}}}
+        },
+        404: {"description": "Job não encontrado", "model": ErrorResponse}
+    },
+    summary="Acompanhar Job (Streaming)",
+    description="""
+Transmite um evento `result` para cada email concluído (com `index`, `id`, `result` e `error`) e um evento `done` com a situação final do job.
+
+Cada evento traz um `id`; ao reconectar, envie o último recebido no cabeçalho `Last-Event-ID` (ou em `?after=`) para receber apenas os resultados seguintes.
+    """,
+    tags=["Jobs"]
+)
+async def job_events(request: Request, job_id: str, after: int = Query(0, ge=0, description="Envia apenas resultados após este id de evento")):
+    manager = get_job_manager()
+    try:
+        await manager.get_job(job_id)
+    except JobNotFoundError:
+        return _job_not_found()
+
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def events():
+        async for event, order, data in manager.iter_events(job_id, after):
+            yield sse_event(event, data, event_id=str(order))
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@app.get(
+    "/api/jobs/{job_id}/results",
+    responses={
+        200: {
+            "description": "Resultados do job na ordem da entrada",
+            "content": {
+                NDJSON_MEDIA_TYPE: {"schema": BatchItemResult.model_json_schema()},
+                "text/csv": {"schema": {"type": "string"}}
+            }
+        },
+        404: {"description": "Job não encontrado", "model": ErrorResponse}
+    },
+    summary="Exportar Resultados do Job",
+    description="Exporta os resultados do job, inclusive parciais, em JSONL (`format=jsonl`) ou CSV (`format=csv`). Cada linha traz também o `status` do email (`pending`, `running`, `done` ou `failed`).",
+    tags=["Jobs"]
+)
+async def job_results(job_id: str, format: Literal["jsonl", "csv"] = Query("jsonl", description="Formato da exportação")):
+    manager = get_job_manager()
+    try:
+        await manager.get_job(job_id)
+    except JobNotFoundError:
+        return _job_not_found()
+
+    results = manager.iter_results(job_id)
+    headers = {"Content-Disposition": f'attachment; filename="job-{job_id}.{format}"'}
+    if format == "csv":
+        return StreamingResponse(export_csv(results), media_type="text/csv; charset=utf-8", headers=headers)
+    return StreamingResponse(export_jsonl(results), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+@app.get(
+    "/api/results",
+    responses={
+        200: {
+            "description": "Classificações registradas, da mais antiga para a mais recente",
+            "content": {
+                NDJSON_MEDIA_TYPE: {"schema": ResultRecord.model_json_schema()},
+                "text/csv": {"schema": {"type": "string"}}
+            }
+        },
+        404: {"description": "Histórico desativado (sem RESULT_LOG_ENABLED=true)", "model": ErrorResponse}
+    },
+    summary="Exportar Histórico de Classificações",
+    description="Exporta as classificações registradas em JSONL (`format=jsonl`) ou CSV (`format=csv`), filtradas por intervalo de tempo (`start` inclusivo, `end` exclusivo, timestamps Unix) e categoria. Os resultados são lidos do disco aos poucos, sem carregar o histórico inteiro em memória.",
+    tags=["Classificação"]
+)
+async def export_results(
+    start: Optional[float] = Query(None, description="Início do intervalo (timestamp Unix)"),
+    end: Optional[float] = Query(None, description="Fim do intervalo, exclusivo (timestamp Unix)"),
+    category: Optional[Literal["Produtivo", "Improdutivo"]] = Query(None, description="Apenas esta categoria"),
+    format: Literal["jsonl", "csv"] = Query("jsonl", description="Formato da exportação")
+):
+    result_log = get_result_log()
+    if result_log is None:
+        return JSONResponse(status_code=404, content={"error": "Histórico de classificações desativado"})
+
+    results = result_log.iter_results(start, end, category)
+    headers = {"Content-Disposition": f'attachment; filename="results.{format}"'}
+    if format == "csv":
+        return StreamingResponse(export_results_csv(results), media_type="text/csv; charset=utf-8", headers=headers)
+    return StreamingResponse(ndjson_stream(results), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+@app.post(
+    "/api/reply/{reply_id}",
+    response_model=ClassificationResponse,
+    response_model_exclude_none=True,
+    responses={
+        200: {"description": "Resposta gerada (ou reaproveitada, se já tinha sido pedida)", "model": ClassificationResponse},
+        404: {"description": "reply_id não encontrado ou expirado", "model": ErrorResponse},
+        503: {"description": "Serviço de IA indisponível ou sobrecarregado", "model": ErrorResponse}
+    },
+    summary="Gerar Resposta",
+    description="Gera a resposta sugerida de um email classificado com `include_reply=false`. Pedidos repetidos para o mesmo `reply_id` reaproveitam a mesma geração. O `reply_id` expira após REPLY_STORE_TTL_SECONDS.",
+    tags=["Classificação"]
+)
+async def generate_reply_endpoint(reply_id: str):
+    try:
+        return await generate_reply(reply_id)
+    except ReplyNotFoundError:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Resposta não encontrada ou expirada. Classifique o email novamente"}
+        )
+    except LLMUnavailableError as e:
+        return _service_unavailable(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -328,4 +1031,42 @@ async def root():
     tags=["Status"]
 )
 async def health():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get(
+    "/api/stats",
+    summary="Estatísticas",
+    description="Retorna estatísticas internas do serviço, como o uso do pool de conexões com o LLM. Com vários workers, os números são do worker que atendeu a requisição (ver `worker.pid`).",
+    tags=["Status"]
+)
+async def stats():
+    return {
+        "llm_pool": get_pool_stats(),
+        "backends": backend_stats(),
+        "cache": get_classification_cache().stats(),
+        "local_classifier": local_classifier_stats(),
+        "microbatch": get_classification_batcher().stats(),
+        "llm_dispatcher": get_llm_dispatcher().stats(),
+        "jobs": job_stats(),
+        "preprocessing": preprocess_stats(),
+        "near_duplicate": get_near_duplicate_index().stats(),
+        "replies": get_reply_store().stats(),
+        "speculative": speculative_stats(),
+        "startup": warmup_stats(),
+        "result_log": result_log_stats(),
+        "worker": {"pid": os.getpid(), "shared_state": SHARED_STATE_DB_PATH or None},
+    }
+
+
+@app.get(
+    "/metrics",
+    summary="Métricas",
+    description="Métricas do serviço no formato de texto do Prometheus: duração por etapa, tokens consumidos, cache, fallbacks e requisições em andamento. Com estado compartilhado (vários workers), os valores são a soma de todos os workers.",
+    response_class=PlainTextResponse,
+    tags=["Status"]
+)
+async def metrics():
+    if SHARED_STATE_DB_PATH:
+        return PlainTextResponse(await render_shared_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
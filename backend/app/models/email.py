@@ -2,14 +2,16 @@ from pydantic import BaseModel, Field
 from typing import Literal
 
 EmailCategory = Literal["Produtivo", "Improdutivo"]
+ClassificationMode = Literal["two_step", "combined"]
 
 class ClassificationRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=800)
 
 class ClassificationResponse(BaseModel):
     category: EmailCategory
-    suggested_response: str
+    suggested_response: str | None = None
     confidence: float | None = Field(None, ge=0.0, le=1.0)
+    reply_id: str | None = None
 
 class ErrorResponse(BaseModel):
     error: str
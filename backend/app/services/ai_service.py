@@ -1,31 +1,32 @@
-import os
+import hashlib
 import json
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, List, Optional
 
+from app.services.backends.base import Completion
+from app.services.backends.registry import backend_for
+from app.services.dispatcher import LLMUnavailableError
+from app.utils.metrics import FALLBACKS, LLM_CALLS, LLM_CALLS_IN_FLIGHT, record_usage, stage
+from app.utils.preprocess import truncate_email
 
-def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY não encontrada nas variáveis de ambiente")
-    
-    try:
-        from openai import OpenAI
-        
-        client = OpenAI(
-            api_key=api_key.strip(),
-        )
-        return client
-    except ImportError:
-        raise ValueError("Biblioteca openai não está instalada. Execute: pip install openai>=1.40.0")
-    except Exception as e:
-        raise ValueError(f"Erro ao inicializar cliente OpenAI: {str(e)}")
+OPERATION_PARAMS: Dict[str, Dict[str, Any]] = {
+    "classification": {"temperature": 0.3, "max_tokens": 100},
+    "batch_classification": {"temperature": 0.3, "json_output": True},
+    "combined": {"temperature": 0.3, "max_tokens": 300, "json_output": True},
+    "reply": {"temperature": 0.7, "max_tokens": 200},
+    "reply_stream": {"temperature": 0.7, "max_tokens": 200},
+}
 
+NOME = "Lucas"
+CARGO = "CEO"
+EMPRESA = "AutoU"
+ASSINATURA = f"Atenciosamente.\n{NOME}\n{CARGO}\n{EMPRESA}"
 
-async def get_ai_classification(text: str) -> Dict[str, Any]:
-    try:
-        client = get_openai_client()
-        
-        prompt = f"""Você é um classificador de emails profissional para uma empresa financeira.
+
+CLASSIFICATION_SYSTEM_PROMPT = "Você é um classificador de emails especializado. Sempre responda apenas com JSON válido."
+REPLY_SYSTEM_PROMPT = "Você é um assistente que gera respostas profissionais para emails corporativos. Sempre responda em português brasileiro."
+COMBINED_SYSTEM_PROMPT = "Você é um classificador de emails especializado que também redige respostas profissionais em português brasileiro. Sempre responda apenas com JSON válido."
+
+CLASSIFICATION_PROMPT = """Você é um classificador de emails profissional para uma empresa financeira.
 Analise o seguinte email e classifique-o como "Produtivo" ou "Improdutivo":
 Email: {text}
 Critérios:
@@ -34,24 +35,156 @@ Critérios:
 Responda APENAS com JSON válido no formato:
 {{"category": "Produtivo" ou "Improdutivo", "confidence": 0.0-1.0}}
 Não inclua nenhum texto adicional, apenas o JSON."""
+
+PRODUCTIVE_REPLY_PROMPT = """Você é um assistente profissional de uma empresa financeira.
+Gere uma resposta profissional, curta e adequada para o seguinte email produtivo.
+Email recebido:
+{email_content}
+Requisitos:
+- Resposta em português brasileiro
+- Profissional mas calorosa
+- Indique que a solicitação foi recebida e será analisada
+- Seja específico e relevante ao conteúdo do email
+- Máximo 150 palavras
+- Sempre finalize a resposta com:
+  Atenciosamente.
+  {nome}
+  {cargo}
+  {empresa}
+
+Responda APENAS com a resposta sugerida, sem explicações ou formatação adicional."""
+
+UNPRODUCTIVE_REPLY_PROMPT = """Você é um assistente profissional de uma empresa financeira.
+Gere uma resposta profissional, curta e adequada para o seguinte email improdutivo (agradecimento, felicitações, etc).
+Email recebido:
+{email_content}
+Requisitos:
+- Resposta em português brasileiro
+- Profissional mas calorosa
+- Agradeça o contato
+- Seja breve e cordial
+- Máximo 50 palavras
+- Sempre finalize a resposta com:
+  Atenciosamente.
+  {nome}
+  {cargo}
+  {empresa}
+
+Responda APENAS com a resposta sugerida, sem explicações ou formatação adicional."""
+
+COMBINED_PROMPT = """Você é um classificador de emails profissional para uma empresa financeira.
+Analise o seguinte email, classifique-o como "Produtivo" ou "Improdutivo" e gere uma resposta sugerida:
+Email: {text}
+Critérios:
+- Produtivo: Emails que requerem uma ação ou resposta específica (solicitações de suporte técnico, atualização sobre casos, dúvidas sobre o sistema, problemas técnicos, solicitações de informação)
+- Improdutivo: Emails que não necessitam de uma ação imediata (mensagens de felicitações, agradecimentos genéricos, spam, mensagens sem propósito claro)
+Requisitos da resposta sugerida:
+- Resposta em português brasileiro
+- Profissional mas calorosa
+- Se Produtivo: indique que a solicitação foi recebida e será analisada, seja específico e relevante ao conteúdo do email, máximo 150 palavras
+- Se Improdutivo: agradeça o contato, seja breve e cordial, máximo 50 palavras
+- Sempre finalize a resposta com:
+  Atenciosamente.
+  {nome}
+  {cargo}
+  {empresa}
+Responda APENAS com JSON válido no formato:
+{{"category": "Produtivo" ou "Improdutivo", "confidence": 0.0-1.0, "suggested_response": "texto da resposta"}}
+Não inclua nenhum texto adicional, apenas o JSON."""
+
+BATCH_CLASSIFICATION_PROMPT = """Você é um classificador de emails profissional para uma empresa financeira.
+Analise cada um dos {count} emails abaixo e classifique-os como "Produtivo" ou "Improdutivo".
+Critérios:
+- Produtivo: Emails que requerem uma ação ou resposta específica (solicitações de suporte técnico, atualização sobre casos, dúvidas sobre o sistema, problemas técnicos, solicitações de informação)
+- Improdutivo: Emails que não necessitam de uma ação imediata (mensagens de felicitações, agradecimentos genéricos, spam, mensagens sem propósito claro)
+{emails}
+Responda APENAS com JSON válido no formato:
+{{"results": [{{"id": número do email, "category": "Produtivo" ou "Improdutivo", "confidence": 0.0-1.0}}]}}
+Inclua exatamente um item por email. Não inclua nenhum texto adicional, apenas o JSON."""
+
+
+_PROMPTS_DIGEST = hashlib.sha256(json.dumps([
+    CLASSIFICATION_SYSTEM_PROMPT, REPLY_SYSTEM_PROMPT, COMBINED_SYSTEM_PROMPT,
+    CLASSIFICATION_PROMPT, PRODUCTIVE_REPLY_PROMPT, UNPRODUCTIVE_REPLY_PROMPT,
+    COMBINED_PROMPT, BATCH_CLASSIFICATION_PROMPT, ASSINATURA,
+]).encode("utf-8")).hexdigest()
+
+
+def prompt_version() -> str:
+    """Versão dos prompts usada na chave do cache; muda com qualquer template, a assinatura ou OPERATION_PARAMS."""
+    params = json.dumps(OPERATION_PARAMS, sort_keys=True)
+    return hashlib.sha256(f"{_PROMPTS_DIGEST}\x00{params}".encode("utf-8")).hexdigest()[:16]
+
+
+class InvalidLLMOutputError(Exception):
+    pass
+
+
+async def create_chat_completion(operation: str, messages: List[Dict[str, str]], **overrides: Any) -> Completion:
+    params = {**OPERATION_PARAMS[operation], **overrides}
+    backend = backend_for(operation)
+    with stage(operation), LLM_CALLS_IN_FLIGHT.track_inprogress(operation=operation):
+        try:
+            completion = await backend.complete(messages, **params)
+        except Exception:
+            LLM_CALLS.inc(operation=operation, outcome="error")
+            raise
+    LLM_CALLS.inc(operation=operation, outcome="ok")
+    record_usage(operation, completion)
+    return completion
+
+
+def normalize_classification(result: Dict[str, Any]) -> Dict[str, Any]:
+    if result.get("category") not in ["Produtivo", "Improdutivo"]:
+        result["category"] = "Produtivo"
+    
+    if "confidence" not in result or not isinstance(result["confidence"], (int, float)):
+        result["confidence"] = 0.8
+    
+    result["confidence"] = max(0.0, min(1.0, float(result["confidence"])))
+    
+    return result
+
+
+def finalize_response(response_text: str) -> str:
+    response_text = response_text.strip()
+    
+    if response_text.startswith('"') and response_text.endswith('"'):
+        response_text = response_text[1:-1]
+    if response_text.startswith("'") and response_text.endswith("'"):
+        response_text = response_text[1:-1]
+    
+    if NOME not in response_text or EMPRESA not in response_text:
+        response_text = response_text.rstrip() + f"\n\n{ASSINATURA}"
+    
+    return response_text
+
+
+def fallback_response(category: str) -> str:
+    if category == "Produtivo":
+        return f"Obrigado pelo seu email. Recebemos sua solicitação e nossa equipe está analisando. Retornaremos em breve com uma resposta.\n\n{ASSINATURA}"
+    return f"Obrigado pelo contato. Sua mensagem foi recebida com muito carinho. Tenha um ótimo dia!\n\n{ASSINATURA}"
+
+
+async def get_ai_classification(text: str) -> Dict[str, Any]:
+    try:
+        prompt = CLASSIFICATION_PROMPT.format(text=truncate_email(text))
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = await create_chat_completion(
+            operation="classification",
             messages=[
                 {
                     "role": "system", 
-                    "content": "Você é um classificador de emails especializado. Sempre responda apenas com JSON válido."
+                    "content": CLASSIFICATION_SYSTEM_PROMPT
                 },
                 {
                     "role": "user", 
                     "content": prompt
                 }
-            ],
-            temperature=0.3,
-            max_tokens=100
+            ]
         )
         
-        response_text = response.choices[0].message.content.strip()
+        response_text = response.text.strip()
         
         response_text = response_text.replace("```json", "").replace("```", "").strip()
         
@@ -65,16 +198,10 @@ Não inclua nenhum texto adicional, apenas o JSON."""
             else:
                 result = {"category": "Produtivo", "confidence": 0.5}
         
-        if result.get("category") not in ["Produtivo", "Improdutivo"]:
-            result["category"] = "Produtivo"
-        
-        if "confidence" not in result or not isinstance(result["confidence"], (int, float)):
-            result["confidence"] = 0.8
-        
-        result["confidence"] = max(0.0, min(1.0, float(result["confidence"])))
-        
-        return result
+        return normalize_classification(result)
         
+    except LLMUnavailableError:
+        raise
     except ValueError as e:
         raise Exception(f"Erro de configuração: {str(e)}")
     except Exception as e:
@@ -84,85 +211,88 @@ Não inclua nenhum texto adicional, apenas o JSON."""
                 f"Erro na inicialização do cliente OpenAI. "
                 f"Tente reinstalar: pip uninstall openai -y && pip install 'openai>=1.40.0'"
             )
-        raise Exception(f"Erro ao classificar com OpenAI: {error_msg}")
+        raise Exception(f"Erro ao classificar com o LLM: {error_msg}")
+
+
+def build_response_messages(email_content: str, category: str) -> List[Dict[str, str]]:
+    template = PRODUCTIVE_REPLY_PROMPT if category == "Produtivo" else UNPRODUCTIVE_REPLY_PROMPT
+    prompt = template.format(email_content=truncate_email(email_content), nome=NOME, cargo=CARGO, empresa=EMPRESA)
+    return [
+        {
+            "role": "system", 
+            "content": REPLY_SYSTEM_PROMPT
+        },
+        {
+            "role": "user", 
+            "content": prompt
+        }
+    ]
 
 
 async def generate_response(email_content: str, category: str) -> str:
     try:
-        client = get_openai_client()
-        nome = "Lucas"
-        cargo = "CEO"
-        empresa = "AutoU"
+        response = await create_chat_completion(
+            operation="reply",
+            messages=build_response_messages(email_content, category)
+        )
         
-        if category == "Produtivo":
-            prompt = f"""Você é um assistente profissional de uma empresa financeira.
-Gere uma resposta profissional, curta e adequada para o seguinte email produtivo.
-Email recebido:
-{email_content}
-Requisitos:
-- Resposta em português brasileiro
-- Profissional mas calorosa
-- Indique que a solicitação foi recebida e será analisada
-- Seja específico e relevante ao conteúdo do email
-- Máximo 150 palavras
-- Sempre finalize a resposta com:
-  Atenciosamente.
-  {nome}
-  {cargo}
-  {empresa}
+        return finalize_response(response.text)
+    
+    except LLMUnavailableError:
+        raise
+    except ValueError as e:
+        raise Exception(f"Erro de configuração: {str(e)}")
+    except Exception as e:
+        error_msg = str(e)
+        if "proxies" in error_msg.lower() or "proxy" in error_msg.lower():
+            raise Exception(
+                f"Erro na inicialização do cliente OpenAI. "
+                f"Tente reinstalar: pip uninstall openai -y && pip install 'openai>=1.40.0'"
+            )
+        FALLBACKS.inc(kind="canned_reply")
+        return fallback_response(category)
 
-Responda APENAS com a resposta sugerida, sem explicações ou formatação adicional."""
-        else:
-            prompt = f"""Você é um assistente profissional de uma empresa financeira.
-Gere uma resposta profissional, curta e adequada para o seguinte email improdutivo (agradecimento, felicitações, etc).
-Email recebido:
-{email_content}
-Requisitos:
-- Resposta em português brasileiro
-- Profissional mas calorosa
-- Agradeça o contato
-- Seja breve e cordial
-- Máximo 50 palavras
-- Sempre finalize a resposta com:
-  Atenciosamente.
-  {nome}
-  {cargo}
-  {empresa}
 
-Responda APENAS com a resposta sugerida, sem explicações ou formatação adicional."""
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+async def get_ai_classification_and_response(text: str) -> Dict[str, Any]:
+    try:
+        prompt = COMBINED_PROMPT.format(text=truncate_email(text), nome=NOME, cargo=CARGO, empresa=EMPRESA)
+        
+        response = await create_chat_completion(
+            operation="combined",
             messages=[
                 {
                     "role": "system", 
-                    "content": "Você é um assistente que gera respostas profissionais para emails corporativos. Sempre responda em português brasileiro."
+                    "content": COMBINED_SYSTEM_PROMPT
                 },
                 {
                     "role": "user", 
                     "content": prompt
                 }
-            ],
-            temperature=0.7,
-            max_tokens=200
+            ]
         )
         
-        response_text = response.choices[0].message.content.strip()
-        
-        if response_text.startswith('"') and response_text.endswith('"'):
-            response_text = response_text[1:-1]
-        if response_text.startswith("'") and response_text.endswith("'"):
-            response_text = response_text[1:-1]
+        response_text = response.text
+        response_text = response_text.replace("```json", "").replace("```", "").strip()
         
-        nome = "Lucas"
-        cargo = "CEO"
-        empresa = "AutoU"
-        assinatura = f"Atenciosamente.\n{nome}\n{cargo}\n{empresa}"
+        try:
+            result = json.loads(response_text)
+        except json.JSONDecodeError:
+            raise InvalidLLMOutputError("Resposta combinada não é um JSON válido")
         
-        if nome not in response_text or empresa not in response_text:
-            response_text = response_text.rstrip() + f"\n\n{assinatura}"
+        if (
+            not isinstance(result, dict)
+            or result.get("category") not in ["Produtivo", "Improdutivo"]
+            or not isinstance(result.get("suggested_response"), str)
+            or not result["suggested_response"].strip()
+        ):
+            raise InvalidLLMOutputError("Resposta combinada incompleta")
         
-        return response_text
+        result = normalize_classification(result)
+        result["suggested_response"] = finalize_response(result["suggested_response"])
+        return result
     
+    except (InvalidLLMOutputError, LLMUnavailableError):
+        raise
     except ValueError as e:
         raise Exception(f"Erro de configuração: {str(e)}")
     except Exception as e:
@@ -172,11 +302,82 @@ Responda APENAS com a resposta sugerida, sem explicações ou formatação adici
                 f"Erro na inicialização do cliente OpenAI. "
                 f"Tente reinstalar: pip uninstall openai -y && pip install 'openai>=1.40.0'"
             )
-        nome = "Lucas"
-        cargo = "CEO"
-        empresa = "AutoU"
-        
-        if category == "Produtivo":
-            return f"Obrigado pelo seu email. Recebemos sua solicitação e nossa equipe está analisando. Retornaremos em breve com uma resposta.\n\nAtenciosamente.\n{nome}\n{cargo}\n{empresa}"
-        else:
-            return f"Obrigado pelo contato. Sua mensagem foi recebida com muito carinho. Tenha um ótimo dia!\n\nAtenciosamente.\n{nome}\n{cargo}\n{empresa}"
\ No newline at end of file
+        raise Exception(f"Erro ao classificar com o LLM: {error_msg}")
+
+
+async def stream_response(email_content: str, category: str) -> AsyncIterator[Dict[str, str]]:
+    chunks: List[str] = []
+    params = OPERATION_PARAMS["reply_stream"]
+    try:
+        with LLM_CALLS_IN_FLIGHT.track_inprogress(operation="reply_stream"):
+            async for part in backend_for("reply_stream").stream(
+                build_response_messages(email_content, category),
+                params["temperature"],
+                params["max_tokens"]
+            ):
+                if isinstance(part, Completion):
+                    record_usage("reply_stream", part)
+                    continue
+                chunks.append(part)
+                yield {"type": "token", "text": part}
+    except LLMUnavailableError:
+        LLM_CALLS.inc(operation="reply_stream", outcome="error")
+        raise
+    except Exception:
+        LLM_CALLS.inc(operation="reply_stream", outcome="error")
+        FALLBACKS.inc(kind="canned_reply")
+        yield {"type": "done", "text": fallback_response(category)}
+        return
+
+    LLM_CALLS.inc(operation="reply_stream", outcome="ok")
+    yield {"type": "done", "text": finalize_response("".join(chunks))}
+
+
+async def get_ai_batch_classification(texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+    try:
+        emails = "\n".join(f"Email {index}:\n{truncate_email(text)}\n---" for index, text in enumerate(texts, start=1))
+        prompt = BATCH_CLASSIFICATION_PROMPT.format(count=len(texts), emails=emails)
+        
+        response = await create_chat_completion(
+            operation="batch_classification",
+            messages=[
+                {
+                    "role": "system", 
+                    "content": CLASSIFICATION_SYSTEM_PROMPT
+                },
+                {
+                    "role": "user", 
+                    "content": prompt
+                }
+            ],
+            max_tokens=40 * len(texts) + 50
+        )
+        
+        response_text = response.text
+        response_text = response_text.replace("```json", "").replace("```", "").strip()
+        
+        try:
+            items = json.loads(response_text).get("results", [])
+        except (json.JSONDecodeError, AttributeError):
+            raise InvalidLLMOutputError("Resposta do lote não é um JSON válido")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        for item in items:
+            if not isinstance(item, dict) or item.get("category") not in ["Produtivo", "Improdutivo"]:
+                continue
+            try:
+                position = int(item.get("id")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= position < len(texts) and results[position] is None:
+                results[position] = normalize_classification(
+                    {"category": item["category"], "confidence": item.get("confidence")}
+                )
+        return results
+    
+    except (InvalidLLMOutputError, LLMUnavailableError):
+        raise
+    except ValueError as e:
+        raise Exception(f"Erro de configuração: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Erro ao classificar com o LLM: {str(e)}")
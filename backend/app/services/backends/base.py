@@ -0,0 +1,94 @@
+import asyncio
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Union
+
+Messages = List[Dict[str, str]]
+
+
+class Completion:
+    """Texto gerado e uso de tokens; tem os mesmos campos do `usage` da OpenAI, para record_usage."""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class InferenceBackend(ABC):
+    """Motor de inferência usado pelo ai_service: recebe mensagens de chat e devolve o texto gerado.
+
+    Cada backend limita quantas chamadas roda ao mesmo tempo (max_concurrency; 0 = sem limite).
+    """
+
+    name = "base"
+
+    def __init__(self, model: str, max_concurrency: int = 0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.calls = 0
+        self.errors = 0
+
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            yield
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    async def complete(self, messages: Messages, temperature: float, max_tokens: int, json_output: bool = False) -> Completion:
+        async with self._slot():
+            return await self._complete(messages, temperature, max_tokens, json_output)
+
+    async def stream(self, messages: Messages, temperature: float, max_tokens: int) -> AsyncIterator[Union[str, Completion]]:
+        """Produz os trechos de texto conforme são gerados e, por último, um Completion com o texto inteiro."""
+        async with self._slot():
+            async for part in self._stream(messages, temperature, max_tokens):
+                yield part
+
+    @abstractmethod
+    async def _complete(self, messages: Messages, temperature: float, max_tokens: int, json_output: bool) -> Completion:
+        """Faz a chamada ao modelo; complete() já reservou a vaga de concorrência."""
+
+    @abstractmethod
+    def _stream(self, messages: Messages, temperature: float, max_tokens: int) -> AsyncIterator[Union[str, Completion]]:
+        """Gerador assíncrono com os trechos e, por último, o Completion; stream() já reservou a vaga."""
+
+    async def warm_up(self) -> None:
+        """Prepara o backend antes da primeira chamada; sem isso, tudo é carregado sob demanda."""
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
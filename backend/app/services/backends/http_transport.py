@@ -0,0 +1,60 @@
+from typing import Any, AsyncIterator, Dict
+
+import httpx
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """Corpo da resposta que dá a requisição por encerrada quando é fechado (lido até o fim ou abandonado)."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, usage: Dict[str, int]):
+        self._stream = stream
+        self._usage = usage
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._usage["in_flight"] -= 1
+        await self._stream.aclose()
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """Transporte que repassa tudo ao do httpx e conta requisições em andamento e conexões abertas.
+
+    Usa só APIs públicas: a interface de transporte do httpx e a extensão `trace` do httpcore, que
+    avisa quando uma conexão TCP nova é aberta.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, usage: Dict[str, int]):
+        self._transport = transport
+        self._usage = usage
+
+    async def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self._usage["connections_opened"] += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if "trace" not in request.extensions:
+            request.extensions["trace"] = self._trace
+        self._usage["requests"] += 1
+        self._usage["in_flight"] += 1
+        self._usage["max_in_flight"] = max(self._usage["max_in_flight"], self._usage["in_flight"])
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._usage["in_flight"] -= 1
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_CountedStream(response.stream, self._usage),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
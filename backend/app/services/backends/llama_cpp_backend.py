@@ -0,0 +1,145 @@
+import asyncio
+import os
+import queue
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from app.services.backends.base import Completion, InferenceBackend, Messages
+
+
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", "")
+LOCAL_MODEL_CONTEXT = int(os.getenv("LOCAL_MODEL_CONTEXT", "4096"))
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", "0"))
+LOCAL_MODEL_CHAT_FORMAT = os.getenv("LOCAL_MODEL_CHAT_FORMAT", "")
+
+
+class LlamaCppBackend(InferenceBackend):
+    """Modelo local em GGUF (ex.: um modelo pequeno quantizado em Q4) rodando na CPU via llama.cpp, sem rede.
+
+    Cada chamada simultânea usa uma instância própria do modelo; os pesos são mapeados em memória
+    uma vez só, então o custo extra por instância é o contexto (KV cache).
+    """
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str = LOCAL_MODEL_PATH, max_concurrency: int = 1):
+        super().__init__(os.path.basename(model_path) or "local", max(1, max_concurrency))
+        self.model_path = model_path
+        self._instances: "queue.Queue[Any]" = queue.Queue()
+        self._loaded = 0
+        self._load_lock = threading.Lock()
+
+    def _load(self) -> None:
+        with self._load_lock:
+            if self._loaded:
+                return
+            if not self.model_path:
+                raise ValueError("LOCAL_MODEL_PATH não configurado. Informe o caminho de um modelo .gguf")
+            try:
+                from llama_cpp import Llama
+            except ImportError:
+                raise ValueError("Biblioteca llama-cpp-python não está instalada. Execute: pip install -r requirements-local.txt")
+
+            for _ in range(self.max_concurrency):
+                self._instances.put(Llama(
+                    model_path=self.model_path,
+                    n_ctx=LOCAL_MODEL_CONTEXT,
+                    n_threads=LOCAL_MODEL_THREADS or None,
+                    chat_format=LOCAL_MODEL_CHAT_FORMAT or None,
+                    verbose=False,
+                ))
+                self._loaded += 1
+
+    def _generate(self, messages: Messages, temperature: float, max_tokens: int, json_output: bool) -> Dict[str, Any]:
+        self._load()
+        llama = self._instances.get()
+        try:
+            extra = {"response_format": {"type": "json_object"}} if json_output else {}
+            return llama.create_chat_completion(messages=messages, temperature=temperature, max_tokens=max_tokens, **extra)
+        finally:
+            self._instances.put(llama)
+
+    def _generate_stream(
+        self,
+        messages: Messages,
+        temperature: float,
+        max_tokens: int,
+        loop: asyncio.AbstractEventLoop,
+        parts: asyncio.Queue,
+        stop: threading.Event,
+    ) -> None:
+        llama = None
+        try:
+            self._load()
+            llama = self._instances.get()
+            for chunk in llama.create_chat_completion(messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True):
+                if stop.is_set():
+                    break
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    loop.call_soon_threadsafe(parts.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(parts.put_nowait, e)
+        finally:
+            if llama is not None:
+                self._instances.put(llama)
+            loop.call_soon_threadsafe(parts.put_nowait, None)
+
+    def _count_tokens(self, text: str) -> int:
+        llama = self._instances.get()
+        try:
+            return len(llama.tokenize(text.encode("utf-8"), add_bos=False))
+        finally:
+            self._instances.put(llama)
+
+    async def _complete(self, messages: Messages, temperature: float, max_tokens: int, json_output: bool) -> Completion:
+        response = await asyncio.to_thread(self._generate, messages, temperature, max_tokens, json_output)
+        usage = response.get("usage") or {}
+        return Completion(
+            response["choices"][0]["message"].get("content") or "",
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+        )
+
+    async def _stream(self, messages: Messages, temperature: float, max_tokens: int) -> AsyncIterator[Union[str, Completion]]:
+        loop = asyncio.get_running_loop()
+        parts: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        producer = loop.run_in_executor(None, self._generate_stream, messages, temperature, max_tokens, loop, parts, stop)
+        chunks: List[str] = []
+        try:
+            while True:
+                part = await parts.get()
+                if part is None:
+                    break
+                if isinstance(part, Exception):
+                    raise part
+                chunks.append(part)
+                yield part
+        finally:
+            stop.set()
+        await producer
+
+        text = "".join(chunks)
+        prompt = "\n".join(message["content"] for message in messages)
+        prompt_tokens, completion_tokens = await asyncio.gather(
+            asyncio.to_thread(self._count_tokens, prompt),
+            asyncio.to_thread(self._count_tokens, text),
+        )
+        yield Completion(text, prompt_tokens, completion_tokens)
+
+    def _prime(self) -> None:
+        self._load()
+        llama = self._instances.get()
+        try:
+            llama.create_completion("Olá", max_tokens=1)
+        finally:
+            self._instances.put(llama)
+
+    async def warm_up(self) -> None:
+        """Carrega o modelo e gera um token, para trazer os pesos mapeados para a memória."""
+        await asyncio.to_thread(self._prime)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "model_path": self.model_path or None, "loaded_instances": self._loaded}
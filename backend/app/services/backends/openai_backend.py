@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Union
+
+from app.services.backends.base import Completion, InferenceBackend, Messages
+from app.services.dispatcher import get_llm_dispatcher
+from app.utils.metrics import Gauge
+
+if TYPE_CHECKING:
+    import httpx
+
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_WARMUP_CONNECTIONS = int(os.getenv("LLM_WARMUP_CONNECTIONS", "2"))
+
+_client = None
+_http_client: Optional["httpx.AsyncClient"] = None
+_http_transport: Optional["httpx.AsyncHTTPTransport"] = None
+_client_lock = asyncio.Lock()
+_pool_introspection_warned = False
+
+# contadores próprios de requisições HTTP ao provedor, mantidos pelo CountingTransport
+_http_usage: Dict[str, int] = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "connections_opened": 0}
+
+
+LLM_POOL_OPEN_CONNECTIONS = Gauge(
+    "email_classifier_llm_pool_open_connections",
+    "Conexões abertas no pool HTTP do cliente OpenAI"
+)
+LLM_POOL_IDLE_CONNECTIONS = Gauge(
+    "email_classifier_llm_pool_idle_connections",
+    "Conexões ociosas no pool HTTP do cliente OpenAI"
+)
+LLM_HTTP_IN_FLIGHT = Gauge(
+    "email_classifier_llm_http_requests_in_flight",
+    "Requisições HTTP ao provedor do LLM em andamento (até o fim do corpo da resposta)"
+)
+
+
+def init_openai_client():
+    global _client, _http_client, _http_transport
+
+    if _client is not None:
+        return _client
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY não encontrada nas variáveis de ambiente")
+    
+    try:
+        import httpx
+        from openai import AsyncOpenAI
+
+        from app.services.backends.http_transport import CountingTransport
+
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+        http_client = httpx.AsyncClient(
+            transport=CountingTransport(transport, _http_usage),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        client = AsyncOpenAI(
+            api_key=api_key.strip(),
+            http_client=http_client,
+            max_retries=0,
+        )
+    except ImportError:
+        raise ValueError("Biblioteca openai não está instalada. Execute: pip install openai>=1.40.0")
+    except Exception as e:
+        raise ValueError(f"Erro ao inicializar cliente OpenAI: {str(e)}")
+
+    _client = client
+    _http_client = http_client
+    _http_transport = transport
+    return client
+
+
+async def get_openai_client():
+    """Cliente compartilhado; na primeira vez o SDK é importado e o cliente montado em uma thread, fora do event loop."""
+    if _client is not None:
+        return _client
+    async with _client_lock:
+        if _client is None:
+            await asyncio.to_thread(init_openai_client)
+    return _client
+
+
+async def close_openai_client() -> None:
+    global _client, _http_client, _http_transport
+
+    client = _client
+    _client = None
+    _http_client = None
+    _http_transport = None
+    if client is not None:
+        await client.close()
+
+
+def _pool_connections() -> Optional[List[Any]]:
+    """Conexões abertas no pool do httpx, ou None se a versão instalada não expuser o pool.
+
+    O httpx não tem API pública para isso: lemos o pool do httpcore por trás do transporte e, se a
+    estrutura mudar, os números de conexões deixam de ser informados (com um aviso) em vez de quebrar.
+    """
+    global _pool_introspection_warned
+    if _http_transport is None:
+        return []
+    try:
+        return [conn for conn in _http_transport._pool.connections if not conn.is_closed()]
+    except Exception as e:
+        if not _pool_introspection_warned:
+            _pool_introspection_warned = True
+            logger.warning("Não foi possível ler as conexões do pool HTTP do LLM: %s", e)
+        return None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Uso do pool HTTP: contadores próprios de requisições e, quando disponível, as conexões do pool."""
+    stats = {
+        "initialized": _client is not None,
+        "max_connections": LLM_POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": LLM_POOL_MAX_KEEPALIVE,
+        "keepalive_expiry": LLM_POOL_KEEPALIVE_EXPIRY,
+        "requests": _http_usage["requests"],
+        "in_flight_requests": _http_usage["in_flight"],
+        "max_in_flight_requests": _http_usage["max_in_flight"],
+        "connections_opened": _http_usage["connections_opened"],
+        "pool_introspection": False,
+        "open_connections": None,
+        "idle_connections": None,
+        "active_connections": None,
+    }
+    connections = _pool_connections()
+    if connections is None:
+        return stats
+
+    idle = sum(1 for conn in connections if conn.is_idle())
+    stats["pool_introspection"] = True
+    stats["open_connections"] = len(connections)
+    stats["idle_connections"] = idle
+    stats["active_connections"] = len(connections) - idle
+    return stats
+
+
+LLM_POOL_OPEN_CONNECTIONS.set_function(lambda: get_pool_stats()["open_connections"])
+LLM_POOL_IDLE_CONNECTIONS.set_function(lambda: get_pool_stats()["idle_connections"])
+LLM_HTTP_IN_FLIGHT.set_function(lambda: _http_usage["in_flight"])
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]], max_tokens: int = 0) -> int:
+    return sum(len(message.get("content", "")) for message in messages) // 4 + max_tokens
+
+
+class OpenAIBackend(InferenceBackend):
+    """Modelos da API da OpenAI (ou compatível, via OPENAI_BASE_URL), com rate limit, retries e circuit breaker do dispatcher."""
+
+    name = "openai"
+
+    def __init__(self, model: str = LLM_MODEL, max_concurrency: int = 0):
+        super().__init__(model, max_concurrency)
+
+    async def _request(self, messages: Messages, temperature: float, max_tokens: int, **extra: Any):
+        client = await get_openai_client()
+        return await get_llm_dispatcher().call(
+            lambda: client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **extra
+            ),
+            estimated_tokens=estimate_request_tokens(messages, max_tokens)
+        )
+
+    async def _complete(self, messages: Messages, temperature: float, max_tokens: int, json_output: bool) -> Completion:
+        extra = {"response_format": {"type": "json_object"}} if json_output else {}
+        response = await self._request(messages, temperature, max_tokens, **extra)
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content or "",
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+    async def _stream(self, messages: Messages, temperature: float, max_tokens: int) -> AsyncIterator[Union[str, Completion]]:
+        stream = await self._request(messages, temperature, max_tokens, stream=True, stream_options={"include_usage": True})
+        chunks: List[str] = []
+        usage = None
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                chunks.append(delta)
+                yield delta
+        yield Completion(
+            "".join(chunks),
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+    async def warm_up(self) -> None:
+        """Importa o SDK, monta o cliente e abre LLM_WARMUP_CONNECTIONS conexões (DNS e TLS) com o provedor.
+
+        A listagem de modelos não consome tokens; qualquer resposta, mesmo de erro, já deixa a conexão aberta no pool.
+        """
+        client = await get_openai_client()
+        results = await asyncio.gather(
+            *(client.models.list() for _ in range(LLM_WARMUP_CONNECTIONS)),
+            return_exceptions=True
+        )
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures and _http_usage["connections_opened"] == 0:
+            logger.warning("Aquecimento das conexões com o LLM falhou: %s", failures[0])
+
+    async def close(self) -> None:
+        await close_openai_client()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "pool": get_pool_stats()}
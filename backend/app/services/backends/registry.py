@@ -0,0 +1,80 @@
+import logging
+import os
+from typing import Any, Dict
+
+from app.services.backends.base import InferenceBackend
+from app.services.backends.llama_cpp_backend import LlamaCppBackend
+from app.services.backends.openai_backend import LLM_MODEL, OpenAIBackend
+
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "openai")
+CLASSIFICATION_BACKEND = os.getenv("CLASSIFICATION_BACKEND", "") or INFERENCE_BACKEND
+REPLY_BACKEND = os.getenv("REPLY_BACKEND", "") or INFERENCE_BACKEND
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "0"))
+LOCAL_LLM_MAX_CONCURRENCY = int(os.getenv("LOCAL_LLM_MAX_CONCURRENCY", "1"))
+
+BACKEND_NAMES = ("openai", "llama_cpp")
+REPLY_OPERATIONS = ("reply", "reply_stream")
+
+for _variable, _name in (
+    ("INFERENCE_BACKEND", INFERENCE_BACKEND),
+    ("CLASSIFICATION_BACKEND", CLASSIFICATION_BACKEND),
+    ("REPLY_BACKEND", REPLY_BACKEND),
+):
+    if _name not in BACKEND_NAMES:
+        raise ValueError(f"{_variable} desconhecido: {_name}. Use {' ou '.join(BACKEND_NAMES)}")
+
+_backends: Dict[str, InferenceBackend] = {}
+
+
+def _create_backend(name: str) -> InferenceBackend:
+    if name == "openai":
+        return OpenAIBackend(LLM_MODEL, OPENAI_MAX_CONCURRENCY)
+    if name == "llama_cpp":
+        return LlamaCppBackend(max_concurrency=LOCAL_LLM_MAX_CONCURRENCY)
+    raise ValueError(f"Backend de inferência desconhecido: {name}. Use {' ou '.join(BACKEND_NAMES)}")
+
+
+def get_backend(name: str) -> InferenceBackend:
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = _create_backend(name)
+    return backend
+
+
+def backend_for(operation: str) -> InferenceBackend:
+    """Backend da operação: respostas usam REPLY_BACKEND; as classificações, CLASSIFICATION_BACKEND."""
+    return get_backend(REPLY_BACKEND if operation in REPLY_OPERATIONS else CLASSIFICATION_BACKEND)
+
+
+def model_fingerprint() -> str:
+    """Identifica os modelos em uso, para que o cache não misture resultados de backends diferentes."""
+    classification = get_backend(CLASSIFICATION_BACKEND)
+    reply = get_backend(REPLY_BACKEND)
+    if classification is reply:
+        return classification.model if classification.name == "openai" else f"{classification.name}:{classification.model}"
+    return f"{classification.name}:{classification.model}|{reply.name}:{reply.model}"
+
+
+async def warm_up_backends() -> None:
+    for name in dict.fromkeys((CLASSIFICATION_BACKEND, REPLY_BACKEND)):
+        try:
+            await get_backend(name).warm_up()
+        except ValueError as e:
+            logger.warning("Backend de inferência %s não inicializado na partida: %s", name, e)
+
+
+async def close_backends() -> None:
+    for backend in list(_backends.values()):
+        await backend.close()
+    _backends.clear()
+
+
+def backend_stats() -> Dict[str, Any]:
+    return {
+        "classification": CLASSIFICATION_BACKEND,
+        "reply": REPLY_BACKEND,
+        **{name: backend.stats() for name, backend in _backends.items()},
+    }
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import zipfile
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from fastapi import UploadFile
+
+from app.models.email import ClassificationMode
+from app.services.classifier import classify_email
+from app.utils.file_parser import SUPPORTED_EXTENSIONS, FileTooLargeError, parse_file
+from app.utils.mail_parser import INVALID_MAILDIR_MESSAGE, MAILBOX_MAX_BYTES, is_mailbox, iter_mailbox_messages, message_text
+
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+EmailLoader = Callable[[], Awaitable[str]]
+
+UNSUPPORTED_BATCH_FILE_MESSAGE = "Tipo de arquivo não suportado. Use .txt, .pdf, .eml, .mbox ou .zip (Maildir)"
+
+
+class BatchItem:
+    def __init__(self, load: EmailLoader, item_id: Optional[str] = None, message: Optional[Dict[str, str]] = None):
+        self.load = load
+        self.id = item_id
+        self.message = message
+
+
+BatchItems = Union[Iterable[BatchItem], AsyncIterable[BatchItem]]
+
+
+def text_item(text: str, item_id: Optional[str] = None) -> BatchItem:
+    async def load() -> str:
+        if len(text) > 800:
+            raise ValueError("Texto muito longo. Máximo 800 caracteres")
+        return text
+    return BatchItem(load, item_id)
+
+
+def file_item(file: UploadFile) -> BatchItem:
+    async def load() -> str:
+        if not file.filename or not file.filename.endswith(SUPPORTED_EXTENSIONS):
+            raise ValueError(UNSUPPORTED_BATCH_FILE_MESSAGE)
+        return await parse_file(file)
+    return BatchItem(load, file.filename)
+
+
+def _message_item(message: Dict[str, Any]) -> BatchItem:
+    async def load() -> str:
+        if message["error"]:
+            raise ValueError(message["error"])
+        text = message_text(message)
+        if not text.strip():
+            raise ValueError("Email não contém texto")
+        return text
+    info = {"message_id": message["message_id"], "subject": message["subject"], "sender": message["sender"]}
+    return BatchItem(load, message["id"], info)
+
+
+def check_mailbox(file: UploadFile) -> None:
+    """Recusa caixas de email acima do limite ou .zip inválidos antes de ler qualquer mensagem."""
+    if file.size is not None and file.size > MAILBOX_MAX_BYTES:
+        raise FileTooLargeError(MAILBOX_MAX_BYTES)
+    if file.filename.lower().endswith(".zip"):
+        file.file.seek(0)
+        if not zipfile.is_zipfile(file.file):
+            raise ValueError(INVALID_MAILDIR_MESSAGE)
+
+
+async def mailbox_items(file: UploadFile) -> AsyncIterator[BatchItem]:
+    """Lê as mensagens de um .mbox ou Maildir (.zip) uma a uma, em uma thread, conforme o lote as consome."""
+    check_mailbox(file)
+    messages = iter_mailbox_messages(file.file, file.filename)
+    while True:
+        message = await asyncio.to_thread(next, messages, None)
+        if message is None:
+            return
+        yield _message_item(message)
+
+
+async def _upload_items(files: Sequence[UploadFile]) -> AsyncIterator[BatchItem]:
+    for file in files:
+        if is_mailbox(file.filename):
+            async for item in mailbox_items(file):
+                yield item
+        else:
+            yield file_item(file)
+
+
+def upload_items(files: Sequence[UploadFile]) -> AsyncIterator[BatchItem]:
+    """Itens de um lote de arquivos; as caixas de email são validadas já aqui, antes de a resposta começar."""
+    for file in files:
+        if is_mailbox(file.filename):
+            check_mailbox(file)
+    return _upload_items(files)
+
+
+async def _classify_item(
+    index: int,
+    item: BatchItem,
+    mode: Optional[ClassificationMode],
+    refresh: bool,
+    include_reply: bool = True
+) -> Dict[str, Any]:
+    """Resultado de um email, só com os campos preenchidos (sem `null`), como a resposta do lote."""
+    outcome: Dict[str, Any] = {"index": index}
+    if item.id is not None:
+        outcome["id"] = item.id
+    try:
+        email_content = await item.load()
+        result = await classify_email(email_content, mode=mode, refresh=refresh, include_reply=include_reply)
+        outcome["result"] = result.model_dump(exclude_none=True)
+    except ValueError as e:
+        outcome["error"] = str(e)
+    except Exception as e:
+        outcome["error"] = f"Erro ao processar: {str(e)}"
+    if item.message is not None:
+        outcome["message"] = {key: value for key, value in item.message.items() if value is not None}
+    return outcome
+
+
+async def _aiter_items(items: BatchItems) -> AsyncIterator[BatchItem]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def iter_batch_results(
+    items: BatchItems,
+    concurrency: Optional[int] = None,
+    mode: Optional[ClassificationMode] = None,
+    refresh: bool = False,
+    include_reply: bool = True
+) -> AsyncIterator[Dict[str, Any]]:
+    limit = max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    source = _aiter_items(items)
+    source_lock = asyncio.Lock()
+    next_index = 0
+    results: asyncio.Queue = asyncio.Queue(maxsize=limit)
+    done = object()
+
+    async def worker() -> None:
+        nonlocal next_index
+        while True:
+            async with source_lock:
+                try:
+                    item = await source.__anext__()
+                except StopAsyncIteration:
+                    return
+                index = next_index
+                next_index += 1
+            await results.put(await _classify_item(index, item, mode, refresh, include_reply))
+
+    failure: Optional[BaseException] = None
+
+    async def run_workers() -> None:
+        nonlocal failure
+        # se a leitura da entrada falhar, os outros workers terminam os emails que já pegaram
+        outcomes = await asyncio.gather(*(worker() for _ in range(limit)), return_exceptions=True)
+        failure = next((outcome for outcome in outcomes if isinstance(outcome, BaseException)), None)
+        await results.put(done)
+
+    runner = asyncio.create_task(run_workers())
+    try:
+        while True:
+            result = await results.get()
+            if result is done:
+                break
+            yield result
+        if failure is not None:
+            raise failure
+    finally:
+        if not runner.done():
+            runner.cancel()
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+        await source.aclose()
+
+
+async def _limit_items(items: BatchItems, limit: int) -> AsyncIterator[BatchItem]:
+    count = 0
+    async for item in _aiter_items(items):
+        count += 1
+        if count > limit:
+            raise ValueError(f"Lote muito grande. Máximo {limit} emails")
+        yield item
+
+
+async def classify_batch(
+    items: BatchItems,
+    concurrency: Optional[int] = None,
+    mode: Optional[ClassificationMode] = None,
+    refresh: bool = False,
+    include_reply: bool = True
+) -> List[Dict[str, Any]]:
+    if isinstance(items, Sequence) and len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Lote muito grande. Máximo {BATCH_MAX_ITEMS} emails")
+
+    limited = _limit_items(items, BATCH_MAX_ITEMS)
+    results = [result async for result in iter_batch_results(limited, concurrency, mode, refresh, include_reply)]
+    results.sort(key=lambda result: result["index"])
+    return results
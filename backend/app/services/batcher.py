@@ -0,0 +1,122 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.ai_service import InvalidLLMOutputError, get_ai_batch_classification, get_ai_classification
+from app.utils.metrics import FALLBACKS
+
+
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "false").lower() == "true"
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "25"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "10"))
+
+
+class ClassificationBatcher:
+    def __init__(self, window_ms: float = MICROBATCH_WINDOW_MS, max_size: int = MICROBATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches_sent = 0
+        self.emails_batched = 0
+        self.single_calls = 0
+        self.fallbacks = 0
+
+    async def classify(self, text: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._dispatch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, pending: List[Tuple[str, asyncio.Future]]) -> None:
+        if len(pending) == 1:
+            self.single_calls += 1
+            await self._classify_individually(pending)
+            return
+
+        self.batches_sent += 1
+        self.emails_batched += len(pending)
+        try:
+            results = await get_ai_batch_classification([text for text, _ in pending])
+        except InvalidLLMOutputError:
+            results = [None] * len(pending)
+        except Exception as e:
+            # indisponibilidade (429, circuito aberto, fila cheia) e outros erros valem para todo o lote:
+            # repetir email a email só multiplicaria a carga sobre um provedor que já está recusando
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        missing = []
+        for (text, future), result in zip(pending, results):
+            if result is None:
+                missing.append((text, future))
+            elif not future.done():
+                future.set_result(result)
+
+        if missing:
+            self.fallbacks += len(missing)
+            FALLBACKS.inc(len(missing), kind="microbatch_individual")
+            await self._classify_individually(missing)
+
+    async def _classify_individually(self, pending: List[Tuple[str, asyncio.Future]]) -> None:
+        async def run(text: str, future: asyncio.Future) -> None:
+            try:
+                result = await get_ai_classification(text)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+        await asyncio.gather(*(run(text, future) for text, future in pending))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": MICROBATCH_ENABLED,
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "batches_sent": self.batches_sent,
+            "emails_batched": self.emails_batched,
+            "average_batch_size": round(self.emails_batched / self.batches_sent, 2) if self.batches_sent else 0.0,
+            "single_calls": self.single_calls,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_batcher: Optional[ClassificationBatcher] = None
+
+
+def get_classification_batcher() -> ClassificationBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = ClassificationBatcher()
+    return _batcher
+
+
+async def classify_with_llm(text: str) -> Dict[str, Any]:
+    if MICROBATCH_ENABLED:
+        return await get_classification_batcher().classify(text)
+    return await get_ai_classification(text)
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.ai_service import prompt_version
+from app.services.backends.registry import model_fingerprint
+from app.services.shared_state import SHARED_STATE_DB_PATH
+from app.utils.metrics import CACHE_REMOVALS
+
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("CACHE_DISK_MAX_ENTRIES", "100000"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", SHARED_STATE_DB_PATH)
+
+_DISK_PURGE_INTERVAL = 1000
+
+
+def normalize_email_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def make_cache_key(text: str, namespace: str = "") -> str:
+    payload = f"{prompt_version()}\x00{model_fingerprint()}\x00{normalize_email_text(text)}"
+    if namespace:
+        payload = f"{namespace}\x00{payload}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        db_path: str = CACHE_DB_PATH,
+        disk_max_entries: int = CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        # o limite do disco é aplicado na limpeza periódica, então ela roda ao menos a cada 10% dele
+        self._purge_interval = max(1, min(_DISK_PURGE_INTERVAL, disk_max_entries // 10))
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path or None
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._sets_since_purge = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_evictions = 0
+
+        if self.db_path:
+            self._open_db()
+
+    def _open_db(self) -> None:
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS classification_cache ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS classification_cache_expires ON classification_cache (expires_at)")
+        self._db.commit()
+        self._purge_disk()
+
+    def _purge_disk(self) -> None:
+        """Apaga as linhas vencidas e, acima de `disk_max_entries`, as gravadas há mais tempo."""
+        with self._db_lock:
+            expired = self._db.execute(
+                "DELETE FROM classification_cache WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            # todas as entradas têm o mesmo TTL, então expires_at ordena pela data de gravação
+            evicted = self._db.execute(
+                "DELETE FROM classification_cache WHERE key IN ("
+                "SELECT key FROM classification_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            ).rowcount
+            self._db.commit()
+        self.disk_evictions += evicted
+        CACHE_REMOVALS.inc(expired, reason="expiration")
+        CACHE_REMOVALS.inc(evicted, reason="eviction")
+
+    def _disk_get(self, key: str) -> Optional[tuple[float, Dict[str, Any]]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM classification_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_set(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO classification_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(value, ensure_ascii=False)),
+            )
+            self._db.commit()
+        self._sets_since_purge += 1
+        if self._sets_since_purge >= self._purge_interval:
+            self._sets_since_purge = 0
+            self._purge_disk()
+
+    def _memory_set(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            CACHE_REMOVALS.inc(reason="eviction")
+
+    async def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+            self.expirations += 1
+            CACHE_REMOVALS.inc(reason="expiration")
+
+        if self._db is not None:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None:
+                expires_at, value = entry
+                self._memory_set(key, expires_at, value)
+                self.disk_hits += 1
+                return value
+
+        return None
+
+    async def get_first(self, *keys: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Procura as chaves em ordem e devolve (chave, valor) da primeira encontrada; conta uma só consulta."""
+        for key in keys:
+            value = await self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return key, value
+        self.misses += 1
+        return None, None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_first(key))[1]
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, expires_at, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, expires_at, value)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM classification_cache")
+                self._db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": CACHE_ENABLED,
+            "prompt_version": prompt_version(),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": self.db_path is not None,
+            "disk_max_entries": self.disk_max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_evictions": self.disk_evictions,
+        }
+
+
+_cache: Optional[ClassificationCache] = None
+
+
+def get_classification_cache() -> ClassificationCache:
+    global _cache
+    if _cache is None:
+        _cache = ClassificationCache()
+    return _cache
+
+
+def close_classification_cache() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
@@ -1,19 +1,302 @@
-from app.models.email import ClassificationResponse
-from app.services.ai_service import get_ai_classification, generate_response
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, Optional, get_args
 
-async def classify_email(email_content: str) -> ClassificationResponse:
+from app.models.email import ClassificationResponse, ClassificationMode
+from app.services.ai_service import (
+    generate_response,
+    get_ai_classification_and_response,
+    InvalidLLMOutputError,
+    fallback_response,
+    stream_response,
+)
+from app.services.batcher import classify_with_llm
+from app.services.local_classifier import LOCAL_CLASSIFIER_ENABLED, classify_locally
+from app.services.cache import CACHE_ENABLED, get_classification_cache, make_cache_key
+from app.services.near_duplicate import NEAR_DUP_ENABLED, get_near_duplicate_index
+from app.services.replies import PendingReply, get_reply_store
+from app.services.result_log import record_result
+from app.services.speculative import SPECULATIVE_REPLY, classify_with_speculative_reply
+from app.utils.metrics import CACHE_LOOKUPS, FALLBACKS, stage
+from app.utils.preprocess import preprocess_email
+
+CLASSIFY_MODE: ClassificationMode = os.getenv("CLASSIFY_MODE", "two_step")
+if CLASSIFY_MODE not in get_args(ClassificationMode):
+    raise ValueError(f"CLASSIFY_MODE desconhecido: {CLASSIFY_MODE}. Use {' ou '.join(get_args(ClassificationMode))}")
+
+
+async def classify_email(
+    email_content: str,
+    mode: Optional[ClassificationMode] = None,
+    refresh: bool = False,
+    include_reply: bool = True,
+    speculative: bool = False
+) -> ClassificationResponse:
+    """Classifica o email e gera a resposta sugerida.
+
+    speculative=True marca tráfego interativo: com SPECULATIVE_REPLY ligado, a resposta começa a ser
+    redigida em paralelo à classificação.
+    """
     if not email_content or not email_content.strip():
         raise ValueError("Conteúdo do email não pode estar vazio")
-    
-    classification_result = await get_ai_classification(email_content.strip())
-    
+
+    email_content = preprocess_email(email_content.strip())
+    if not include_reply:
+        return await _classify_without_reply(email_content, refresh)
+
+    mode = mode or CLASSIFY_MODE
+
+    cache_key = None
+    if CACHE_ENABLED:
+        cache = get_classification_cache()
+        cache_key = make_cache_key(email_content)
+        if not refresh:
+            cached = await cache.get(cache_key)
+            CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                result = ClassificationResponse(**cached)
+                record_result(email_content, result, "cache")
+                return result
+
+    result = await _classify_near_duplicate(email_content) if NEAR_DUP_ENABLED and not refresh else None
+    source = "near_duplicate"
+    if result is None:
+        result = await _classify_uncached(email_content, mode, speculative)
+        source = "model"
+        await _remember_near_duplicate(email_content, result)
+
+    if cache_key is not None and result.suggested_response != fallback_response(result.category):
+        await cache.set(cache_key, result.model_dump(exclude_none=True))
+
+    record_result(email_content, result, source)
+    return result
+
+
+async def _classify_without_reply(email_content: str, refresh: bool) -> ClassificationResponse:
+    classification = None
+    reply = None
+    source = "cache"
+
+    if CACHE_ENABLED:
+        cache = get_classification_cache()
+        classification_key = make_cache_key(email_content, namespace="classification")
+        if not refresh:
+            full_key = make_cache_key(email_content)
+            key, classification = await cache.get_first(full_key, classification_key)
+            if key == full_key:
+                reply = classification["suggested_response"]
+            CACHE_LOOKUPS.inc(result="miss" if classification is None else "hit")
+
+    if classification is None and NEAR_DUP_ENABLED and not refresh:
+        classification = await _find_near_duplicate(email_content)
+        source = "near_duplicate"
+        if classification is not None:
+            reply = classification["suggested_response"]
+
+    if classification is None:
+        classification = await _get_classification(email_content)
+        source = "model"
+        if CACHE_ENABLED:
+            await cache.set(classification_key, {
+                "category": classification["category"],
+                "confidence": classification.get("confidence", 0.8)
+            })
+
+    confidence = classification.get("confidence", 0.8)
+    reply_id = await get_reply_store().add(email_content, classification["category"], confidence, reply)
+    result = ClassificationResponse(category=classification["category"], confidence=confidence, reply_id=reply_id)
+    record_result(email_content, result, source)
+    return result
+
+
+async def generate_reply(reply_id: str) -> ClassificationResponse:
+    """Gera (ou reaproveita) a resposta de uma classificação feita com include_reply=False."""
+    store = get_reply_store()
+    entry = await store.get(reply_id)
+
+    if entry.reply is not None:
+        store.reused += 1
+    else:
+        if entry.task is None:
+            entry.task = asyncio.ensure_future(_generate_stored_reply(reply_id, entry))
+        try:
+            await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            entry.task = None
+            raise
+
+    return ClassificationResponse(
+        category=entry.category,
+        suggested_response=entry.reply,
+        confidence=entry.confidence,
+        reply_id=reply_id
+    )
+
+
+async def _generate_stored_reply(reply_id: str, entry: PendingReply) -> None:
+    store = get_reply_store()
+    cache_key = make_cache_key(entry.email_content) if CACHE_ENABLED else None
+    if cache_key is not None:
+        cached = await get_classification_cache().get(cache_key)
+        if cached is not None and cached["category"] == entry.category:
+            await store.set_reply(reply_id, entry, cached["suggested_response"])
+            store.reused += 1
+            return
+
+    reply = await generate_response(email_content=entry.email_content, category=entry.category)
+    await store.set_reply(reply_id, entry, reply)
+    store.generated += 1
+
+    result = ClassificationResponse(category=entry.category, suggested_response=reply, confidence=entry.confidence)
+    await _remember_near_duplicate(entry.email_content, result)
+    if cache_key is not None and reply != fallback_response(entry.category):
+        await get_classification_cache().set(cache_key, result.model_dump(exclude_none=True))
+
+
+async def _find_near_duplicate(email_content: str) -> Optional[Dict[str, Any]]:
+    index = get_near_duplicate_index()
+    with stage("near_duplicate"):
+        signature = await index.compute_signature(email_content)
+        return index.lookup(email_content, signature)
+
+
+async def _classify_near_duplicate(email_content: str) -> Optional[ClassificationResponse]:
+    match = await _find_near_duplicate(email_content)
+    if match is None:
+        return None
+
+    suggested_response = match["suggested_response"]
+    if suggested_response is None:
+        suggested_response = await generate_response(email_content=email_content, category=match["category"])
+
+    return ClassificationResponse(
+        category=match["category"],
+        suggested_response=suggested_response,
+        confidence=match["confidence"]
+    )
+
+
+async def _remember_near_duplicate(email_content: str, result: ClassificationResponse) -> None:
+    if NEAR_DUP_ENABLED and result.suggested_response != fallback_response(result.category):
+        index = get_near_duplicate_index()
+        signature = await index.compute_signature(email_content)
+        index.add(email_content, result.category, result.confidence, result.suggested_response, signature)
+
+
+def _classify_locally(email_content: str) -> Optional[Dict[str, Any]]:
+    if not LOCAL_CLASSIFIER_ENABLED:
+        return None
+    with stage("local_classification"):
+        return classify_locally(email_content)
+
+
+async def _get_classification(email_content: str) -> Dict[str, Any]:
+    local_result = _classify_locally(email_content)
+    if local_result is not None:
+        return local_result
+    return await classify_with_llm(email_content)
+
+
+async def _classify_uncached(email_content: str, mode: ClassificationMode, speculative: bool = False) -> ClassificationResponse:
+    classification_result = _classify_locally(email_content)
+
+    if classification_result is None and mode == "combined":
+        try:
+            result = await get_ai_classification_and_response(email_content)
+            return ClassificationResponse(
+                category=result["category"],
+                suggested_response=result["suggested_response"],
+                confidence=result.get("confidence", 0.8)
+            )
+        except InvalidLLMOutputError:
+            FALLBACKS.inc(kind="combined_to_two_step")
+
+    if classification_result is None and speculative and SPECULATIVE_REPLY != "off":
+        speculated = await classify_with_speculative_reply(email_content, lambda: classify_with_llm(email_content))
+        if speculated is not None:
+            classification_result, suggested_response = speculated
+            return ClassificationResponse(
+                category=classification_result["category"],
+                suggested_response=suggested_response,
+                confidence=classification_result.get("confidence", 0.8)
+            )
+
+    if classification_result is None:
+        classification_result = await classify_with_llm(email_content)
+
     suggested_response = await generate_response(
-        email_content=email_content.strip(),
+        email_content=email_content,
         category=classification_result["category"]
     )
-    
+
     return ClassificationResponse(
         category=classification_result["category"],
         suggested_response=suggested_response,
         confidence=classification_result.get("confidence", 0.8)
-    )
\ No newline at end of file
+    )
+
+
+async def stream_classification(
+    email_content: str,
+    refresh: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    if not email_content or not email_content.strip():
+        raise ValueError("Conteúdo do email não pode estar vazio")
+
+    email_content = preprocess_email(email_content.strip())
+
+    cache_key = None
+    if CACHE_ENABLED:
+        cache = get_classification_cache()
+        cache_key = make_cache_key(email_content)
+        if not refresh:
+            cached = await cache.get(cache_key)
+            CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                record_result(email_content, ClassificationResponse(**cached), "cache")
+                yield {"event": "classification", "category": cached["category"], "confidence": cached["confidence"]}
+                yield {"event": "done", **cached}
+                return
+
+    match = await _find_near_duplicate(email_content) if NEAR_DUP_ENABLED and not refresh else None
+    if match is not None and match["suggested_response"] is not None:
+        result = ClassificationResponse(
+            category=match["category"],
+            suggested_response=match["suggested_response"],
+            confidence=match["confidence"]
+        )
+        record_result(email_content, result, "near_duplicate")
+        yield {"event": "classification", "category": result.category, "confidence": result.confidence}
+        yield {"event": "done", **result.model_dump(exclude_none=True)}
+        return
+
+    classification_result = match or await _get_classification(email_content)
+    yield {
+        "event": "classification",
+        "category": classification_result["category"],
+        "confidence": classification_result.get("confidence", 0.8)
+    }
+
+    suggested_response = ""
+    async for part in stream_response(email_content, classification_result["category"]):
+        if part["type"] == "token":
+            yield {"event": "token", "text": part["text"]}
+        else:
+            suggested_response = part["text"]
+
+    result = ClassificationResponse(
+        category=classification_result["category"],
+        suggested_response=suggested_response,
+        confidence=classification_result.get("confidence", 0.8)
+    )
+
+    if match is None:
+        await _remember_near_duplicate(email_content, result)
+
+    if cache_key is not None and result.suggested_response != fallback_response(result.category):
+        await cache.set(cache_key, result.model_dump(exclude_none=True))
+
+    record_result(email_content, result, "model" if match is None else "near_duplicate")
+    yield {"event": "done", **result.model_dump(exclude_none=True)}
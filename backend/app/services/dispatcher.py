@@ -0,0 +1,286 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.services.shared_state import SharedState, get_shared_state
+from app.utils.metrics import Gauge
+
+
+LLM_RATE_LIMIT_RPM = int(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+LLM_RATE_LIMIT_TPM = int(os.getenv("LLM_RATE_LIMIT_TPM", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "200"))
+
+
+class LLMUnavailableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        if not self.enabled:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    async def adjust(self, amount: float) -> None:
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Balde guardado no estado compartilhado, para o limite valer para a soma dos workers."""
+
+    def __init__(self, per_minute: int, name: str, state: SharedState):
+        super().__init__(per_minute)
+        self.name = name
+        self.state = state
+
+    async def acquire(self, amount: float = 1) -> float:
+        if not self.enabled:
+            return 0.0
+        amount = min(amount, self.capacity)
+        delay = await asyncio.to_thread(self.state.reserve_tokens, self.name, self.capacity, self.rate, amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    async def adjust(self, amount: float) -> None:
+        if self.enabled and amount:
+            await asyncio.to_thread(self.state.adjust_tokens, self.name, self.capacity, self.rate, amount)
+
+
+def _make_bucket(name: str, per_minute: int) -> TokenBucket:
+    state = get_shared_state()
+    if state is None or per_minute <= 0:
+        return TokenBucket(per_minute)
+    return SharedTokenBucket(per_minute, name, state)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURES, reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.probing = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        import openai
+    except ImportError:
+        return False
+
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (408, 409)
+
+
+def _retry_after_from(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class LLMDispatcher:
+    def __init__(
+        self,
+        requests_per_minute: int = LLM_RATE_LIMIT_RPM,
+        tokens_per_minute: int = LLM_RATE_LIMIT_TPM,
+        max_retries: int = LLM_MAX_RETRIES,
+        queue_max: int = LLM_QUEUE_MAX,
+    ):
+        self.request_bucket = _make_bucket("llm_requests", requests_per_minute)
+        self.token_bucket = _make_bucket("llm_tokens", tokens_per_minute)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+        self.queue_max = queue_max
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def _check_circuit(self) -> None:
+        if not self.breaker.allow_request():
+            self.rejected += 1
+            raise LLMUnavailableError(
+                "Serviço de IA temporariamente indisponível. Tente novamente em instantes",
+                retry_after=self.breaker.retry_after(),
+            )
+
+    async def _wait_for_capacity(self, estimated_tokens: int) -> None:
+        if self.queue_depth >= self.queue_max:
+            self.rejected += 1
+            raise LLMUnavailableError("Fila de chamadas ao modelo cheia. Tente novamente em instantes", retry_after=1.0)
+
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            self.throttled_seconds += await self.request_bucket.acquire(1)
+            self.throttled_seconds += await self.token_bucket.acquire(estimated_tokens)
+        finally:
+            self.queue_depth -= 1
+
+    async def call(self, request: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+        self._check_circuit()
+        await self._wait_for_capacity(estimated_tokens)
+        self.calls += 1
+
+        attempt = 0
+        while True:
+            try:
+                result = await request()
+            except asyncio.CancelledError:
+                self.breaker.probing = False
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    self.breaker.probing = False
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or self.breaker.state == "open":
+                    self.failures += 1
+                    raise LLMUnavailableError(
+                        f"Serviço de IA indisponível após {attempt + 1} tentativa(s): {str(e)}",
+                        retry_after=_retry_after_from(e) or self.breaker.retry_after() or None,
+                    ) from e
+
+                delay = _retry_after_from(e)
+                if delay is None:
+                    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(min(delay, LLM_BACKOFF_MAX))
+                self._check_circuit()
+                await self._wait_for_capacity(estimated_tokens)
+                continue
+
+            self.breaker.record_success()
+            usage = getattr(result, "usage", None)
+            total_tokens = getattr(usage, "total_tokens", None)
+            if total_tokens is not None:
+                await self.token_bucket.adjust(total_tokens - estimated_tokens)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": int(self.request_bucket.capacity),
+            "shared_rate_limit": isinstance(self.request_bucket, SharedTokenBucket) or isinstance(self.token_bucket, SharedTokenBucket),
+            "tokens_per_minute": int(self.token_bucket.capacity),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_max": self.queue_max,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+        }
+
+
+_dispatcher: Optional[LLMDispatcher] = None
+
+LLM_QUEUE_DEPTH = Gauge(
+    "email_classifier_llm_queue_depth",
+    "Chamadas aguardando capacidade de rate limit"
+)
+LLM_QUEUE_DEPTH.set_function(lambda: get_llm_dispatcher().queue_depth)
+LLM_CIRCUIT_OPEN = Gauge(
+    "email_classifier_llm_circuit_open",
+    "1 quando o circuit breaker do LLM está aberto"
+)
+LLM_CIRCUIT_OPEN.set_function(lambda: 1 if get_llm_dispatcher().breaker.state == "open" else 0)
+
+
+def get_llm_dispatcher() -> LLMDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = LLMDispatcher()
+    return _dispatcher
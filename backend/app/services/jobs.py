@@ -0,0 +1,526 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from io import BytesIO
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import UploadFile
+
+from app.models.email import ClassificationMode
+from app.services.classifier import classify_email
+from app.services.dispatcher import LLMUnavailableError
+from app.services.batch import UNSUPPORTED_BATCH_FILE_MESSAGE, check_mailbox
+from app.services.shared_state import pid_alive
+from app.utils.file_parser import SUPPORTED_EXTENSIONS, parse_file, read_upload
+from app.utils.mail_parser import is_mailbox, iter_mailbox_messages, message_text
+
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_ITEMS = int(os.getenv("JOBS_MAX_ITEMS", "50000"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "2"))
+
+_EXPORT_PAGE_SIZE = 500
+_INSERT_CHUNK_SIZE = 500
+CSV_COLUMNS = ("index", "id", "status", "category", "confidence", "suggested_response", "error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    mode TEXT,
+    refresh INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    owner INTEGER
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    item_id TEXT,
+    text TEXT,
+    filename TEXT,
+    content BLOB,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    done_order INTEGER,
+    owner INTEGER,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status, job_id, idx);
+CREATE INDEX IF NOT EXISTS job_items_done_order ON job_items (job_id, done_order);
+"""
+
+# (id, texto, nome do arquivo, conteúdo do arquivo, erro de leitura); com erro, o item já nasce como falho
+JobInput = Tuple[Optional[str], Optional[str], Optional[str], Optional[bytes], Optional[str]]
+
+
+class JobNotFoundError(LookupError):
+    pass
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def text_job_input(text: str, item_id: Optional[str] = None) -> JobInput:
+    if len(text) > 800:
+        raise ValueError("Texto muito longo. Máximo 800 caracteres")
+    return item_id, text, None, None, None
+
+
+def _mailbox_job_inputs(file: UploadFile) -> Iterator[JobInput]:
+    for message in iter_mailbox_messages(file.file, file.filename):
+        if message["error"]:
+            yield message["id"], None, None, None, message["error"]
+        else:
+            yield message["id"], message_text(message), None, None, None
+
+
+async def file_job_inputs(file: UploadFile) -> Iterable[JobInput]:
+    """Entradas do job para um arquivo; caixas de email são expandidas sob demanda ao gravar o job."""
+    if is_mailbox(file.filename):
+        check_mailbox(file)
+        return _mailbox_job_inputs(file)
+    if not file.filename or not file.filename.endswith(SUPPORTED_EXTENSIONS):
+        raise ValueError(UNSUPPORTED_BATCH_FILE_MESSAGE)
+    return [(file.filename, None, file.filename, await read_upload(file), None)]
+
+
+def _item_record(row: sqlite3.Row) -> Dict[str, Any]:
+    """Item como nos lotes: só os campos preenchidos, sem `null`."""
+    record: Dict[str, Any] = {"index": row["idx"]}
+    if row["item_id"] is not None:
+        record["id"] = row["item_id"]
+    if row["result"]:
+        # resultados gravados antes do exclude_none ainda trazem "reply_id": null
+        record["result"] = {key: value for key, value in json.loads(row["result"]).items() if value is not None}
+    if row["error"] is not None:
+        record["error"] = row["error"]
+    return record
+
+
+def _job_record(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "status": row["status"],
+        "mode": row["mode"],
+        "total": row["total"],
+        "succeeded": row["succeeded"],
+        "failed": row["failed"],
+        "pending": row["total"] - row["succeeded"] - row["failed"],
+        "created_at": row["created_at"],
+        "finished_at": row["finished_at"],
+    }
+
+
+class JobStore:
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        for table in ("jobs", "job_items"):
+            columns = {row["name"] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            if "owner" not in columns:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN owner INTEGER")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def create_job(self, inputs: Iterable[JobInput], mode: Optional[str], refresh: bool, max_items: int = JOBS_MAX_ITEMS) -> str:
+        """Grava o job em blocos, lendo as entradas fora do lock; fica em 'loading' até a última entrada."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, mode, refresh, total, created_at, updated_at, owner) VALUES (?, 'loading', ?, ?, 0, ?, ?, ?)",
+                (job_id, mode, int(refresh), now, now, os.getpid()),
+            )
+            self._db.commit()
+
+        total = 0
+        failed = 0
+        try:
+            for chunk in _chunks(enumerate(inputs), _INSERT_CHUNK_SIZE):
+                total = chunk[-1][0] + 1
+                if total > max_items:
+                    raise ValueError(f"Job muito grande. Máximo {max_items} emails")
+                rows = []
+                for index, (item_id, text, filename, content, error) in chunk:
+                    # nenhum worker pega itens de um job em 'loading', então a ordem de término é só nossa aqui
+                    done_order = None
+                    if error is not None:
+                        failed += 1
+                        done_order = failed
+                    rows.append((
+                        job_id, index, item_id, text, filename, content,
+                        "pending" if error is None else "failed", error, done_order,
+                    ))
+                with self._lock:
+                    self._db.executemany(
+                        "INSERT INTO job_items (job_id, idx, item_id, text, filename, content, status, error, done_order) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    self._db.commit()
+            if total == 0:
+                raise ValueError("É necessário fornecer uma lista de emails ou arquivos")
+        except BaseException:
+            self._delete(job_id)
+            raise
+
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "UPDATE jobs SET status = CASE WHEN ? >= ? THEN 'completed' ELSE 'queued' END, total = ?, failed = ?, "
+                "updated_at = ?, finished_at = CASE WHEN ? >= ? THEN ? END WHERE id = ?",
+                (failed, total, total, failed, now, failed, total, now, job_id),
+            )
+            self._db.commit()
+        return job_id
+
+    def _delete(self, job_id: str) -> None:
+        with self._lock:
+            self._db.rollback()
+            self._db.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._db.commit()
+
+    def requeue_interrupted(self) -> int:
+        """Devolve à fila os itens deste processo e de processos que já terminaram; os de outros workers vivos ficam."""
+        with self._lock:
+            owners = {
+                row[0] for row in self._db.execute(
+                    "SELECT owner FROM job_items WHERE status = 'running' UNION SELECT owner FROM jobs WHERE status = 'loading'"
+                )
+            }
+            stale = [owner for owner in owners if owner is None or owner == os.getpid() or not pid_alive(owner)]
+            if not stale:
+                return 0
+            params = [owner for owner in stale if owner is not None] or [-1]
+            owned = "(owner IS NULL OR owner IN (%s))" % ",".join("?" * len(params))
+            self._db.execute(
+                f"DELETE FROM job_items WHERE job_id IN (SELECT id FROM jobs WHERE status = 'loading' AND {owned})", params
+            )
+            self._db.execute(f"DELETE FROM jobs WHERE status = 'loading' AND {owned}", params)
+            cursor = self._db.execute(f"UPDATE job_items SET status = 'pending' WHERE status = 'running' AND {owned}", params)
+            self._db.commit()
+            return cursor.rowcount
+
+    def claim_next(self) -> Optional[sqlite3.Row]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute(
+                "SELECT i.job_id, i.idx, i.item_id, i.text, i.filename, i.content, i.attempts, j.mode, j.refresh "
+                "FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.status = 'pending' AND j.status IN ('queued', 'running') "
+                "ORDER BY j.created_at, i.job_id, i.idx LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE job_items SET status = 'running', attempts = attempts + 1, owner = ? WHERE job_id = ? AND idx = ?",
+                (os.getpid(), row["job_id"], row["idx"]),
+            )
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), row["job_id"]),
+            )
+            self._db.commit()
+            return row
+
+    def release(self, job_id: str, index: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE job_items SET status = 'pending' WHERE job_id = ? AND idx = ? AND status = 'running'",
+                (job_id, index),
+            )
+            self._db.commit()
+
+    def complete(self, job_id: str, index: int, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        status = "done" if error is None else "failed"
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, text = NULL, content = NULL, "
+                "done_order = (SELECT COALESCE(MAX(done_order), 0) + 1 FROM job_items WHERE job_id = ?) "
+                "WHERE job_id = ? AND idx = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result else None, error, job_id, job_id, index),
+            )
+            column = "succeeded" if error is None else "failed"
+            self._db.execute(
+                f"UPDATE jobs SET {column} = {column} + 1, updated_at = ? WHERE id = ?",
+                (now, job_id),
+            )
+            self._db.execute(
+                "UPDATE jobs SET status = 'completed', finished_at = ? "
+                "WHERE id = ? AND status = 'running' AND succeeded + failed >= total",
+                (now, job_id),
+            )
+            self._db.commit()
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (now, now, job_id),
+            )
+            self._db.commit()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFoundError(job_id)
+        return _job_record(row)
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_record(row) for row in rows]
+
+    def finished_since(self, job_id: str, after: int, limit: int = _EXPORT_PAGE_SIZE) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, item_id, result, error, done_order FROM job_items "
+                "WHERE job_id = ? AND done_order > ? ORDER BY done_order LIMIT ?",
+                (job_id, after, limit),
+            ).fetchall()
+        return [(row["done_order"], _item_record(row)) for row in rows]
+
+    def results_page(self, job_id: str, after_index: int, limit: int = _EXPORT_PAGE_SIZE) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idx, item_id, status, result, error FROM job_items "
+                "WHERE job_id = ? AND idx > ? ORDER BY idx LIMIT ?",
+                (job_id, after_index, limit),
+            ).fetchall()
+        return [dict(_item_record(row), status=row["status"]) for row in rows]
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.status = 'pending' AND j.status IN ('queued', 'running') LIMIT 1"
+            ).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobManager:
+    def __init__(self, store: JobStore, workers: int = JOBS_WORKERS):
+        self.store = store
+        self.worker_count = max(1, workers)
+        self._workers: List[asyncio.Task] = []
+        self._started: Optional[asyncio.Future] = None
+        self._draining = False
+        self._wakeup = asyncio.Event()
+        self._progress = asyncio.Condition()
+        self.processed = 0
+        self.retried = 0
+        self.resumed = 0
+
+    async def start(self) -> None:
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._started)
+
+    async def _start(self) -> None:
+        self._draining = False
+        self.resumed = await asyncio.to_thread(self.store.requeue_interrupted)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._wakeup.set()
+
+    async def stop(self, drain_timeout: float = 0) -> None:
+        """Para os workers; com drain_timeout, deixa os emails em andamento terminarem antes de cancelar."""
+        self._draining = True
+        self._wakeup.set()
+        if self._workers and drain_timeout > 0:
+            await asyncio.wait(self._workers, timeout=drain_timeout)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._started = None
+        await asyncio.to_thread(self.store.requeue_interrupted)
+
+    async def submit(self, inputs: Iterable[JobInput], mode: Optional[ClassificationMode] = None, refresh: bool = False) -> Dict[str, Any]:
+        await self.start()
+        job_id = await asyncio.to_thread(self.store.create_job, inputs, mode, refresh)
+        self._wakeup.set()
+        return await asyncio.to_thread(self.store.get_job, job_id)
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        job = await asyncio.to_thread(self.store.cancel, job_id)
+        await self._notify()
+        return job
+
+    async def get_job(self, job_id: str) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.store.get_job, job_id)
+
+    async def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.list_jobs, limit)
+
+    async def _notify(self) -> None:
+        async with self._progress:
+            self._progress.notify_all()
+
+    async def _worker(self) -> None:
+        while not self._draining:
+            row = await asyncio.to_thread(self.store.claim_next)
+            if row is None:
+                self._wakeup.clear()
+                if await asyncio.to_thread(self.store.has_pending):
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOBS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(row)
+
+    async def _process(self, row: sqlite3.Row) -> None:
+        job_id, index = row["job_id"], row["idx"]
+        try:
+            if row["filename"]:
+                upload = UploadFile(BytesIO(row["content"]), filename=row["filename"], size=len(row["content"]))
+                email_content = await parse_file(upload)
+            else:
+                email_content = row["text"]
+            result = (await classify_email(email_content, mode=row["mode"], refresh=bool(row["refresh"]))).model_dump(exclude_none=True)
+            error = None
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self.store.release, job_id, index))
+            raise
+        except LLMUnavailableError as e:
+            if row["attempts"] < JOBS_MAX_ATTEMPTS:
+                self.retried += 1
+                await asyncio.sleep(e.retry_after or 1.0)
+                await asyncio.to_thread(self.store.release, job_id, index)
+                self._wakeup.set()
+                return
+            result, error = None, str(e)
+        except ValueError as e:
+            result, error = None, str(e)
+        except Exception as e:
+            result, error = None, f"Erro ao processar: {str(e)}"
+
+        await asyncio.to_thread(self.store.complete, job_id, index, result, error)
+        self.processed += 1
+        await self._notify()
+
+    async def iter_events(self, job_id: str, after: int = 0) -> AsyncIterator[Tuple[str, int, Dict[str, Any]]]:
+        """Produz ("result", ordem, item) para cada email concluído e termina com ("done", ordem, job)."""
+        while True:
+            job = await self.get_job(job_id)
+            finished = await asyncio.to_thread(self.store.finished_since, job_id, after)
+            for order, item in finished:
+                after = order
+                yield "result", order, item
+            if finished:
+                continue
+            if job["status"] not in ("queued", "running"):
+                yield "done", after, job
+                return
+            async with self._progress:
+                try:
+                    await asyncio.wait_for(self._progress.wait(), timeout=5.0)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def iter_results(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        await self.get_job(job_id)
+        after = -1
+        while True:
+            page = await asyncio.to_thread(self.store.results_page, job_id, after)
+            if not page:
+                return
+            for item in page:
+                yield item
+            after = page[-1]["index"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "processed": self.processed,
+            "retried": self.retried,
+            "resumed": self.resumed,
+        }
+
+
+async def export_jsonl(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    async for item in results:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+
+async def export_csv(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for item in results:
+        result = item.get("result", {})
+        writer.writerow((
+            item["index"],
+            item.get("id", ""),
+            item["status"],
+            result.get("category", ""),
+            result.get("confidence", ""),
+            result.get("suggested_response", ""),
+            item.get("error", ""),
+        ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(JobStore())
+    return _manager
+
+
+def job_stats() -> Dict[str, Any]:
+    if _manager is None:
+        return {"started": False}
+    return {"started": True, **_manager.stats()}
+
+
+async def close_job_manager(drain_timeout: float = 0) -> None:
+    global _manager
+    if _manager is not None:
+        await _manager.stop(drain_timeout)
+        _manager.store.close()
+        _manager = None
@@ -0,0 +1,130 @@
+import json
+import math
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.metrics import LOCAL_CLASSIFICATIONS
+
+
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "false").lower() == "true"
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.95"))
+LOCAL_CLASSIFIER_MAX_WORDS = int(os.getenv("LOCAL_CLASSIFIER_MAX_WORDS", "40"))
+LOCAL_CLASSIFIER_DATA = os.getenv(
+    "LOCAL_CLASSIFIER_DATA",
+    str(Path(__file__).resolve().parent.parent / "data" / "labeled_emails.jsonl")
+)
+
+CATEGORIES = ("Produtivo", "Improdutivo")
+_HASH_BUCKETS = 1 << 18
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _WORD_RE.findall(text)
+
+
+def hashed_features(tokens: List[str]) -> Counter:
+    grams = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+    return Counter(zlib.crc32(gram.encode("utf-8")) % _HASH_BUCKETS for gram in grams)
+
+
+class LocalClassifier:
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.class_docs = {category: 0 for category in CATEGORIES}
+        self.class_totals = {category: 0 for category in CATEGORIES}
+        self.feature_counts: Dict[str, Counter] = {category: Counter() for category in CATEGORIES}
+        self.vocabulary: set = set()
+
+    def fit(self, examples: Iterable[Tuple[str, str]]) -> "LocalClassifier":
+        for text, category in examples:
+            if category not in CATEGORIES:
+                continue
+            features = hashed_features(tokenize(text))
+            self.class_docs[category] += 1
+            self.class_totals[category] += sum(features.values())
+            self.feature_counts[category].update(features)
+            self.vocabulary.update(features)
+        return self
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        features = hashed_features(tokenize(text))
+        total_docs = sum(self.class_docs.values()) or 1
+        vocabulary_size = len(self.vocabulary) or 1
+
+        scores = {}
+        for category in CATEGORIES:
+            denominator = self.class_totals[category] + self.alpha * vocabulary_size
+            score = math.log((self.class_docs[category] + 1) / (total_docs + len(CATEGORIES)))
+            for feature, count in features.items():
+                if feature not in self.vocabulary:
+                    continue
+                score += count * math.log((self.feature_counts[category][feature] + self.alpha) / denominator)
+            scores[category] = score
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        normalizer = sum(math.exp(score - top) for score in scores.values())
+        return best, 1.0 / normalizer
+
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    examples = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                record = json.loads(line)
+                examples.append((record["text"], record["category"]))
+    return examples
+
+
+_classifier: Optional[LocalClassifier] = None
+_answered_locally = 0
+_escalated = 0
+
+
+def get_local_classifier() -> LocalClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = LocalClassifier().fit(load_examples(LOCAL_CLASSIFIER_DATA))
+    return _classifier
+
+
+def classify_locally(text: str) -> Optional[Dict[str, Any]]:
+    global _answered_locally, _escalated
+
+    if not LOCAL_CLASSIFIER_ENABLED:
+        return None
+
+    if len(text.split()) > LOCAL_CLASSIFIER_MAX_WORDS:
+        _escalated += 1
+        LOCAL_CLASSIFICATIONS.inc(result="rejected")
+        return None
+
+    category, confidence = get_local_classifier().predict(text)
+    if confidence < LOCAL_CLASSIFIER_THRESHOLD:
+        _escalated += 1
+        LOCAL_CLASSIFICATIONS.inc(result="rejected")
+        return None
+
+    _answered_locally += 1
+    LOCAL_CLASSIFICATIONS.inc(result="accepted")
+    return {"category": category, "confidence": round(confidence, 4)}
+
+
+def local_classifier_stats() -> Dict[str, Any]:
+    total = _answered_locally + _escalated
+    return {
+        "enabled": LOCAL_CLASSIFIER_ENABLED,
+        "threshold": LOCAL_CLASSIFIER_THRESHOLD,
+        "answered_locally": _answered_locally,
+        "escalated": _escalated,
+        "local_fraction": round(_answered_locally / total, 4) if total else 0.0,
+    }
@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from app.services.local_classifier import tokenize
+from app.utils.metrics import Counter
+
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "false").lower() == "true"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.7"))
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "5000"))
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "64"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "2"))
+
+# acima disso (~2 ms de MinHash) a assinatura é calculada em uma thread; abaixo, o salto custa mais que o cálculo
+_INLINE_SIGNATURE_MAX_CHARS = 500
+_MERSENNE_PRIME = (1 << 61) - 1
+_NUMBER_RE = re.compile(r"\d{3,}")
+_PLACEHOLDER = "\x00{}\x00"
+_PLACEHOLDER_RE = re.compile("\x00(\\d+)\x00")
+
+NEAR_DUP_LOOKUPS = Counter(
+    "email_classifier_near_duplicate_lookups_total",
+    "Consultas ao índice de quase duplicatas: hit (classificação e resposta reaproveitadas), classification_only ou miss",
+    ("result",)
+)
+
+
+def _mask(token: str) -> str:
+    return "0" if any(char.isdigit() for char in token) else token
+
+
+def shingles(text: str, size: int = NEAR_DUP_SHINGLE_SIZE) -> Set[str]:
+    tokens = [_mask(token) for token in tokenize(text)]
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[index:index + size]) for index in range(len(tokens) - size + 1)}
+
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NEAR_DUP_NUM_PERM, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+
+    def signature(self, items: Set[str]) -> Tuple[int, ...]:
+        hashes = [_shingle_hash(item) for item in items]
+        if not hashes:
+            return ()
+        return tuple(min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in self.permutations)
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    if not first or len(first) != len(second):
+        return 0.0
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def make_reply_template(email_content: str, reply: str) -> Tuple[str, FrozenSet[str]]:
+    """Troca no texto da resposta os números longos vindos do email por marcadores de posição.
+
+    Também devolve as palavras da resposta que vieram do email (nomes, produtos); se alguma delas
+    não aparecer no novo email, a resposta não é reaproveitada.
+    """
+    numbers = _NUMBER_RE.findall(email_content)
+
+    def replace(match: re.Match) -> str:
+        value = match.group(0)
+        return _PLACEHOLDER.format(numbers.index(value)) if value in numbers else value
+
+    template = _NUMBER_RE.sub(replace, reply)
+    borrowed = frozenset(set(tokenize(_NUMBER_RE.sub(" ", reply))) & set(tokenize(email_content)))
+    return template, borrowed
+
+
+def fill_reply_template(template: str, borrowed: FrozenSet[str], email_content: str) -> Optional[str]:
+    if borrowed - set(tokenize(email_content)):
+        return None
+    numbers = _NUMBER_RE.findall(email_content)
+    missing = False
+
+    def replace(match: re.Match) -> str:
+        nonlocal missing
+        position = int(match.group(1))
+        if position >= len(numbers):
+            missing = True
+            return ""
+        return numbers[position]
+
+    reply = _PLACEHOLDER_RE.sub(replace, template)
+    return None if missing else reply
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        max_entries: int = NEAR_DUP_MAX_ENTRIES,
+        num_perm: int = NEAR_DUP_NUM_PERM,
+        bands: int = NEAR_DUP_BANDS,
+    ):
+        if num_perm % bands:
+            raise ValueError("NEAR_DUP_NUM_PERM deve ser múltiplo de NEAR_DUP_BANDS")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        # lookup() e add() do mesmo email usam a mesma assinatura; lru_cache também é seguro entre threads
+        self.signature = lru_cache(maxsize=256)(self._signature)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[int, Set[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.classification_only = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _signature(self, email_content: str) -> Tuple[int, ...]:
+        return self.hasher.signature(shingles(email_content))
+
+    async def compute_signature(self, email_content: str) -> Tuple[int, ...]:
+        """signature() sem travar o event loop com emails longos."""
+        if len(email_content) <= _INLINE_SIGNATURE_MAX_CHARS:
+            return self.signature(email_content)
+        return await asyncio.to_thread(self.signature, email_content)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[int]:
+        return [hash((band,) + signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def lookup(self, email_content: str, signature: Optional[Tuple[int, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Devolve a classificação do email indexado mais parecido e, se der para adaptar, a resposta.
+
+        A assinatura é a parte cara; no event loop, calcule-a antes com compute_signature().
+        """
+        if signature is None:
+            signature = self.signature(email_content)
+        if not signature:
+            return None
+
+        candidates: Set[int] = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best, best_score = None, 0.0
+        for entry_id in candidates:
+            score = similarity(signature, self._entries[entry_id]["signature"])
+            if score > best_score:
+                best, best_score = entry_id, score
+
+        if best is None or best_score < self.threshold:
+            self.misses += 1
+            NEAR_DUP_LOOKUPS.inc(result="miss")
+            return None
+
+        entry = self._entries[best]
+        self._entries.move_to_end(best)
+        reply = fill_reply_template(entry["template"], entry["borrowed"], email_content)
+        if reply is None:
+            self.classification_only += 1
+        else:
+            self.hits += 1
+        NEAR_DUP_LOOKUPS.inc(result="hit" if reply is not None else "classification_only")
+        return {
+            "category": entry["category"],
+            "confidence": entry["confidence"],
+            "suggested_response": reply,
+            "similarity": best_score,
+        }
+
+    def add(
+        self,
+        email_content: str,
+        category: str,
+        confidence: float,
+        reply: str,
+        signature: Optional[Tuple[int, ...]] = None
+    ) -> None:
+        if signature is None:
+            signature = self.signature(email_content)
+        if not signature:
+            return
+        template, borrowed = make_reply_template(email_content, reply)
+        entry_id = self._next_id
+        self._next_id += 1
+        keys = self._band_keys(signature)
+        self._entries[entry_id] = {
+            "signature": signature,
+            "keys": keys,
+            "category": category,
+            "confidence": confidence,
+            "template": template,
+            "borrowed": borrowed,
+        }
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            evicted_id, evicted = self._entries.popitem(last=False)
+            for key in evicted["keys"]:
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(evicted_id)
+                    if not bucket:
+                        del self._buckets[key]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.classification_only + self.misses
+        return {
+            "enabled": NEAR_DUP_ENABLED,
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "classification_only": self.classification_only,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.classification_only) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_index: Optional[NearDuplicateIndex] = None
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex()
+    return _index
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.services.shared_state import SharedState, get_shared_state
+
+
+REPLY_STORE_MAX_ENTRIES = int(os.getenv("REPLY_STORE_MAX_ENTRIES", "10000"))
+REPLY_STORE_TTL_SECONDS = float(os.getenv("REPLY_STORE_TTL_SECONDS", "3600"))
+
+_SHARED_PURGE_INTERVAL = 1000
+
+
+class ReplyNotFoundError(LookupError):
+    pass
+
+
+class PendingReply:
+    def __init__(self, email_content: str, category: str, confidence: float, expires_at: float):
+        self.email_content = email_content
+        self.category = category
+        self.confidence = confidence
+        self.expires_at = expires_at
+        self.reply: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class ReplyStore:
+    """Guarda o email e a categoria de classificações feitas sem resposta, para gerá-la depois pelo reply_id.
+
+    Com estado compartilhado, as entradas também vão para o SQLite, e o reply_id vale em qualquer worker.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = REPLY_STORE_MAX_ENTRIES,
+        ttl_seconds: float = REPLY_STORE_TTL_SECONDS,
+        shared: Optional[SharedState] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._entries: "OrderedDict[str, PendingReply]" = OrderedDict()
+        self._adds_since_purge = 0
+        self.created = 0
+        self.generated = 0
+        self.reused = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _remember(self, reply_id: str, entry: PendingReply) -> None:
+        self._entries[reply_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _save_shared(self, reply_id: str, entry: PendingReply) -> None:
+        await asyncio.to_thread(
+            self.shared.save_reply, reply_id, entry.expires_at, entry.email_content, entry.category, entry.confidence, entry.reply
+        )
+
+    async def add(self, email_content: str, category: str, confidence: float, reply: Optional[str] = None) -> str:
+        reply_id = uuid.uuid4().hex
+        entry = PendingReply(email_content, category, confidence, time.time() + self.ttl_seconds)
+        entry.reply = reply
+        self._remember(reply_id, entry)
+        self.created += 1
+        if self.shared is not None:
+            await self._save_shared(reply_id, entry)
+            self._adds_since_purge += 1
+            if self._adds_since_purge >= _SHARED_PURGE_INTERVAL:
+                self._adds_since_purge = 0
+                await asyncio.to_thread(self.shared.purge_replies)
+        return reply_id
+
+    async def get(self, reply_id: str) -> PendingReply:
+        entry = self._entries.get(reply_id)
+        if entry is not None and entry.expires_at <= time.time():
+            del self._entries[reply_id]
+            self.expired += 1
+            raise ReplyNotFoundError(reply_id)
+        if entry is not None and (entry.reply is not None or self.shared is None):
+            self._entries.move_to_end(reply_id)
+            return entry
+
+        if self.shared is not None:
+            row = await asyncio.to_thread(self.shared.load_reply, reply_id)
+            if row is not None:
+                if entry is None:
+                    entry = PendingReply(row["email_content"], row["category"], row["confidence"], row["expires_at"])
+                    self._remember(reply_id, entry)
+                entry.reply = entry.reply or row["reply"]
+        if entry is None:
+            raise ReplyNotFoundError(reply_id)
+        self._entries.move_to_end(reply_id)
+        return entry
+
+    async def set_reply(self, reply_id: str, entry: PendingReply, reply: str) -> None:
+        entry.reply = reply
+        if self.shared is not None:
+            await self._save_shared(reply_id, entry)
+
+    async def drain(self, timeout: float) -> None:
+        """Espera as gerações em andamento terminarem, para não perder respostas ao desligar."""
+        tasks = [entry.task for entry in self._entries.values() if entry.task is not None and not entry.task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "shared": self.shared is not None,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "created": self.created,
+            "generated": self.generated,
+            "reused": self.reused,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+
+_store: Optional[ReplyStore] = None
+
+
+def get_reply_store() -> ReplyStore:
+    global _store
+    if _store is None:
+        _store = ReplyStore(shared=get_shared_state())
+    return _store
@@ -0,0 +1,281 @@
+import asyncio
+import csv
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.models.email import ClassificationResponse
+from app.services.backends.registry import model_fingerprint
+from app.services.cache import normalize_email_text
+from app.utils.metrics import Counter
+
+
+logger = logging.getLogger(__name__)
+
+RESULT_LOG_ENABLED = os.getenv("RESULT_LOG_ENABLED", "false").lower() == "true"
+RESULT_LOG_DB_PATH = os.getenv("RESULT_LOG_DB_PATH", "results.db")
+RESULT_LOG_BUFFER = int(os.getenv("RESULT_LOG_BUFFER", "10000"))
+RESULT_LOG_BATCH_SIZE = int(os.getenv("RESULT_LOG_BATCH_SIZE", "500"))
+RESULT_LOG_FLUSH_SECONDS = float(os.getenv("RESULT_LOG_FLUSH_SECONDS", "1"))
+RESULT_LOG_INCLUDE_TEXT = os.getenv("RESULT_LOG_INCLUDE_TEXT", "false").lower() == "true"
+
+_EXPORT_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classification_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    category TEXT NOT NULL,
+    confidence REAL,
+    source TEXT NOT NULL,
+    model TEXT NOT NULL,
+    email_hash TEXT NOT NULL,
+    email_chars INTEGER NOT NULL,
+    email TEXT,
+    suggested_response TEXT,
+    response_chars INTEGER
+);
+CREATE INDEX IF NOT EXISTS classification_results_created ON classification_results (created_at);
+CREATE INDEX IF NOT EXISTS classification_results_category ON classification_results (category, created_at);
+"""
+
+_COLUMNS = (
+    "id", "created_at", "category", "confidence", "source", "model",
+    "email_hash", "email_chars", "email", "suggested_response", "response_chars",
+)
+
+RESULT_LOG_RECORDS = Counter(
+    "email_classifier_result_log_records_total",
+    "Resultados de classificação gravados no histórico (written) ou descartados com o buffer cheio (dropped)",
+    ("outcome",)
+)
+
+Row = Tuple[float, str, Optional[float], str, str, str, int, Optional[str], Optional[str], Optional[int]]
+
+
+def email_hash(email_content: str) -> str:
+    return hashlib.sha256(normalize_email_text(email_content).encode("utf-8")).hexdigest()
+
+
+class ResultLog:
+    """Histórico de todas as classificações, só de acréscimo, em SQLite (WAL).
+
+    record() só põe o resultado em um buffer limitado em memória; uma tarefa em segundo plano grava
+    os resultados em lotes, em uma thread, a cada RESULT_LOG_FLUSH_SECONDS ou RESULT_LOG_BATCH_SIZE
+    resultados. Com o buffer cheio, o resultado é descartado e contado em `dropped`, e a requisição segue.
+    O banco só é aberto em open(), que faz I/O e deve rodar fora do event loop.
+    """
+
+    def __init__(
+        self,
+        db_path: str = RESULT_LOG_DB_PATH,
+        max_buffer: int = RESULT_LOG_BUFFER,
+        batch_size: int = RESULT_LOG_BATCH_SIZE,
+        flush_seconds: float = RESULT_LOG_FLUSH_SECONDS,
+    ):
+        self.db_path = db_path
+        self.max_buffer = max_buffer
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self._buffer: Deque[Row] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+
+    def open(self) -> None:
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.row_factory = sqlite3.Row
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(classification_results)")}
+        if "response_chars" not in columns:
+            self._db.execute("ALTER TABLE classification_results ADD COLUMN response_chars INTEGER")
+            self._db.commit()
+
+    def record(self, email_content: str, result: ClassificationResponse, source: str) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            RESULT_LOG_RECORDS.inc(outcome="dropped")
+            return
+
+        response = result.suggested_response
+        self._buffer.append((
+            time.time(),
+            result.category,
+            result.confidence,
+            source,
+            model_fingerprint(),
+            email_hash(email_content),
+            len(email_content),
+            email_content if RESULT_LOG_INCLUDE_TEXT else None,
+            response if RESULT_LOG_INCLUDE_TEXT else None,
+            len(response) if response is not None else None,
+        ))
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _write(self, rows: List[Row]) -> None:
+        with self._db_lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO classification_results (created_at, category, confidence, source, model, "
+                    "email_hash, email_chars, email, suggested_response, response_chars) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    async def flush(self) -> None:
+        """Grava tudo o que está no buffer, em lotes de até batch_size resultados."""
+        async with self._flush_lock:
+            while self._buffer:
+                rows = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                start = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._write, rows)
+                except sqlite3.Error as e:
+                    self.failed_flushes += 1
+                    self.dropped += len(rows)
+                    RESULT_LOG_RECORDS.inc(len(rows), outcome="dropped")
+                    logger.warning("Falha ao gravar %d resultados no histórico: %s", len(rows), e)
+                    continue
+                self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+                self.flushes += 1
+                self.written += len(rows)
+                RESULT_LOG_RECORDS.inc(len(rows), outcome="written")
+
+    def query(
+        self,
+        start: Optional[float],
+        end: Optional[float],
+        category: Optional[str],
+        after_id: int = 0,
+        limit: int = _EXPORT_PAGE_SIZE,
+    ) -> List[Dict[str, Any]]:
+        conditions = ["id > ?"]
+        params: List[Any] = [after_id]
+        if start is not None:
+            conditions.append("created_at >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("created_at < ?")
+            params.append(end)
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM classification_results "
+                f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def iter_results(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        category: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Resultados na ordem em que foram gravados, lidos do disco uma página por vez."""
+        await self.flush()
+        after = 0
+        while True:
+            page = await asyncio.to_thread(self.query, start, end, category, after)
+            if not page:
+                return
+            for item in page:
+                yield item
+            after = page[-1]["id"]
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "db_path": self.db_path,
+            "include_text": RESULT_LOG_INCLUDE_TEXT,
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+async def export_results_csv(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_COLUMNS)
+    async for item in results:
+        writer.writerow(["" if item[column] is None else item[column] for column in _COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+_log: Optional[ResultLog] = None
+
+
+async def start_result_log() -> None:
+    """Abre o histórico na partida, em uma thread; sem RESULT_LOG_ENABLED=true, não faz nada."""
+    global _log
+    if _log is None and RESULT_LOG_ENABLED:
+        log = ResultLog()
+        await asyncio.to_thread(log.open)
+        _log = log
+
+
+def get_result_log() -> Optional[ResultLog]:
+    """Histórico de resultados, ou None se estiver desligado (ou ainda não foi aberto)."""
+    return _log
+
+
+def record_result(email_content: str, result: ClassificationResponse, source: str) -> None:
+    log = get_result_log()
+    if log is not None:
+        log.record(email_content, result, source)
+
+
+async def close_result_log() -> None:
+    global _log
+    if _log is not None:
+        await _log.close()
+        _log = None
+
+
+def result_log_stats() -> Dict[str, Any]:
+    return _log.stats() if _log is not None else {"enabled": RESULT_LOG_ENABLED}
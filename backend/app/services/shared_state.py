@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.metrics import REGISTRY, collect_samples, render_merged_metrics
+
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_DB_PATH = os.getenv("SHARED_STATE_DB_PATH", "")
+METRICS_SYNC_SECONDS = float(os.getenv("METRICS_SYNC_SECONDS", "5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metric_snapshots (
+    pid INTEGER PRIMARY KEY,
+    updated REAL NOT NULL,
+    samples TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending_replies (
+    id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    email_content TEXT NOT NULL,
+    category TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    reply TEXT
+);
+"""
+
+
+def pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedState:
+    """Estado dividido entre os workers do gunicorn em um arquivo SQLite (WAL): baldes de rate limit, métricas e respostas pendentes."""
+
+    def __init__(self, db_path: str = SHARED_STATE_DB_PATH):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _update_bucket(self, name: str, capacity: float, rate: float, amount: float) -> float:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tokens, updated FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+                now = time.time()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                tokens -= amount
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                    (name, tokens, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return tokens
+
+    def reserve_tokens(self, name: str, capacity: float, rate: float, amount: float) -> float:
+        """Reserva `amount` no balde e devolve quantos segundos esperar até a reserva ficar coberta."""
+        tokens = self._update_bucket(name, capacity, rate, amount)
+        return max(0.0, -tokens / rate)
+
+    def adjust_tokens(self, name: str, capacity: float, rate: float, amount: float) -> None:
+        self._update_bucket(name, capacity, rate, amount)
+
+    def publish_metrics(self, samples: List[Tuple[str, str, str, float]], pid: Optional[int] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO metric_snapshots (pid, updated, samples) VALUES (?, ?, ?)",
+                (pid or os.getpid(), time.time(), json.dumps(samples)),
+            )
+
+    def metric_snapshots(self) -> List[List[Tuple[str, str, str, float]]]:
+        """Amostras de todos os workers; de processos que já terminaram só contam contadores e histogramas."""
+        with self._lock:
+            rows = self._db.execute("SELECT pid, samples FROM metric_snapshots").fetchall()
+        gauges = {metric.name for metric in REGISTRY if metric.kind == "gauge"}
+        snapshots = []
+        for pid, samples in rows:
+            samples = json.loads(samples)
+            if pid != os.getpid() and not pid_alive(pid):
+                samples = [sample for sample in samples if sample[0] not in gauges]
+            snapshots.append(samples)
+        return snapshots
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM metric_snapshots")
+
+    def save_reply(self, reply_id: str, expires_at: float, email_content: str, category: str, confidence: float, reply: Optional[str]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pending_replies (id, expires_at, email_content, category, confidence, reply) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (reply_id, expires_at, email_content, category, confidence, reply),
+            )
+
+    def load_reply(self, reply_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires_at, email_content, category, confidence, reply FROM pending_replies WHERE id = ?",
+                (reply_id,),
+            ).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        return {"expires_at": row[0], "email_content": row[1], "category": row[2], "confidence": row[3], "reply": row[4]}
+
+    def purge_replies(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM pending_replies WHERE expires_at <= ?", (time.time(),))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_state: Optional[SharedState] = None
+_sync_task: Optional[asyncio.Task] = None
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """Estado compartilhado, ou None quando SHARED_STATE_DB_PATH não está configurado (processo único)."""
+    global _state
+    if _state is None and SHARED_STATE_DB_PATH:
+        _state = SharedState()
+    return _state
+
+
+async def _sync_metrics() -> None:
+    while True:
+        await asyncio.sleep(METRICS_SYNC_SECONDS)
+        try:
+            await asyncio.to_thread(_state.publish_metrics, collect_samples())
+        except sqlite3.Error as e:
+            logger.warning("Falha ao publicar métricas no estado compartilhado: %s", e)
+
+
+async def start_shared_state() -> None:
+    global _sync_task
+    if get_shared_state() is not None and _sync_task is None:
+        _sync_task = asyncio.create_task(_sync_metrics())
+
+
+async def render_shared_metrics() -> str:
+    state = get_shared_state()
+    await asyncio.to_thread(state.publish_metrics, collect_samples())
+    return render_merged_metrics(await asyncio.to_thread(state.metric_snapshots))
+
+
+async def close_shared_state() -> None:
+    """Publica os contadores finais deste worker (sem os gauges, que deixam de valer) e fecha o arquivo."""
+    global _state, _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        await asyncio.gather(_sync_task, return_exceptions=True)
+        _sync_task = None
+    if _state is not None:
+        await asyncio.to_thread(_state.publish_metrics, collect_samples(include_gauges=False))
+        _state.close()
+        _state = None
@@ -0,0 +1,100 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.ai_service import build_response_messages, generate_response
+from app.services.local_classifier import CATEGORIES, get_local_classifier
+from app.utils.metrics import Counter
+from app.utils.preprocess import count_tokens
+
+
+SPECULATIVE_REPLY = os.getenv("SPECULATIVE_REPLY", "off").lower()
+SPECULATIVE_MIN_CONFIDENCE = float(os.getenv("SPECULATIVE_MIN_CONFIDENCE", "0.6"))
+
+SPECULATIVE_REPLIES = Counter(
+    "email_classifier_speculative_replies_total",
+    "Respostas geradas em paralelo à classificação: hit (categoria prevista certa), miss ou skipped (palpite fraco)",
+    ("result",)
+)
+SPECULATIVE_WASTED_TOKENS = Counter(
+    "email_classifier_speculative_wasted_tokens_total",
+    "Tokens estimados das respostas especulativas descartadas ou canceladas"
+)
+
+_stats = {"hits": 0, "misses": 0, "skipped": 0, "cancelled": 0, "wasted_tokens": 0}
+
+
+def speculative_categories(email_content: str) -> List[str]:
+    """Categorias para as quais vale começar a resposta antes da classificação chegar."""
+    if SPECULATIVE_REPLY == "both":
+        return list(CATEGORIES)
+    if SPECULATIVE_REPLY != "guess":
+        return []
+    category, confidence = get_local_classifier().predict(email_content)
+    return [category] if confidence >= SPECULATIVE_MIN_CONFIDENCE else []
+
+
+def _discard(task: asyncio.Task, email_content: str, category: str) -> None:
+    """Cancela um rascunho que não vai ser usado e contabiliza os tokens gastos com ele."""
+    prompt_tokens = sum(count_tokens(message["content"]) for message in build_response_messages(email_content, category))
+    if not task.done():
+        task.cancel()
+        _stats["cancelled"] += 1
+        wasted = prompt_tokens
+    elif task.cancelled() or task.exception() is not None:
+        wasted = prompt_tokens
+    else:
+        wasted = prompt_tokens + count_tokens(task.result())
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    _stats["wasted_tokens"] += wasted
+    SPECULATIVE_WASTED_TOKENS.inc(wasted)
+
+
+async def classify_with_speculative_reply(
+    email_content: str,
+    classify: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Classifica e, ao mesmo tempo, redige a resposta da(s) categoria(s) provável(is).
+
+    Devolve None quando não há palpite bom o bastante para especular; aí o chamador segue em sequência.
+    """
+    categories = speculative_categories(email_content)
+    if not categories:
+        _stats["skipped"] += 1
+        SPECULATIVE_REPLIES.inc(result="skipped")
+        return None
+
+    drafts = {
+        category: asyncio.ensure_future(generate_response(email_content=email_content, category=category))
+        for category in categories
+    }
+    try:
+        classification = await classify()
+    except BaseException:
+        for category, task in drafts.items():
+            _discard(task, email_content, category)
+        raise
+
+    category = classification["category"]
+    for other, task in drafts.items():
+        if other != category:
+            _discard(task, email_content, other)
+
+    if category in drafts:
+        _stats["hits"] += 1
+        SPECULATIVE_REPLIES.inc(result="hit")
+        return classification, await drafts[category]
+
+    _stats["misses"] += 1
+    SPECULATIVE_REPLIES.inc(result="miss")
+    return classification, await generate_response(email_content=email_content, category=category)
+
+
+def speculative_stats() -> Dict[str, Any]:
+    decided = _stats["hits"] + _stats["misses"]
+    return {
+        "mode": SPECULATIVE_REPLY,
+        "min_confidence": SPECULATIVE_MIN_CONFIDENCE,
+        **_stats,
+        "hit_rate": round(_stats["hits"] / decided, 4) if decided else 0.0,
+    }
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from app.services.backends.registry import warm_up_backends
+from app.services.local_classifier import LOCAL_CLASSIFIER_ENABLED, get_local_classifier
+from app.services.speculative import SPECULATIVE_REPLY
+from app.utils.preprocess import PREPROCESS_ENABLED, load_tokenizer
+
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() == "true"
+
+_stats: Dict[str, Any] = {"enabled": STARTUP_WARMUP, "seconds": None, "steps": {}, "failed": []}
+
+
+def _import_pdf_reader() -> None:
+    from PyPDF2 import PdfReader  # noqa: F401
+
+
+async def _timed(name: str, step: Callable[[], Awaitable[Any]]) -> None:
+    start = time.perf_counter()
+    try:
+        await step()
+    except Exception as e:
+        _stats["failed"].append(name)
+        logger.warning("Aquecimento de %s falhou: %s", name, e)
+    _stats["steps"][name] = round(time.perf_counter() - start, 4)
+
+
+async def warm_up() -> Dict[str, Any]:
+    """Carrega na partida o que normalmente só é carregado na primeira requisição que precisa dele.
+
+    Monta os clientes e abre conexões com os backends de inferência, treina o pré-classificador local,
+    carrega o tokenizador e importa o leitor de PDF, em paralelo. Falhas só geram aviso: a etapa volta
+    a ser feita sob demanda.
+    """
+    start = time.perf_counter()
+    steps = {"backends": warm_up_backends, "pdf": lambda: asyncio.to_thread(_import_pdf_reader)}
+    if LOCAL_CLASSIFIER_ENABLED or SPECULATIVE_REPLY == "guess":
+        steps["local_classifier"] = lambda: asyncio.to_thread(get_local_classifier)
+    if PREPROCESS_ENABLED:
+        steps["tokenizer"] = lambda: asyncio.to_thread(load_tokenizer)
+
+    await asyncio.gather(*(_timed(name, step) for name, step in steps.items()))
+    _stats["seconds"] = round(time.perf_counter() - start, 4)
+    return warmup_stats()
+
+
+def warmup_stats() -> Dict[str, Any]:
+    return {**_stats, "steps": dict(_stats["steps"]), "failed": list(_stats["failed"])}
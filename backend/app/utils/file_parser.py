@@ -1,32 +1,161 @@
+import asyncio
+import codecs
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, Iterator, Optional, Union
+
 from fastapi import UploadFile
 from io import BytesIO
-from PyPDF2 import PdfReader
+
+from app.utils.mail_parser import message_text, parse_message
+from app.utils.metrics import stage
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+
+
+PDF_POOL_KIND = os.getenv("PDF_POOL_KIND", "thread")
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "20000"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".eml")
+UNSUPPORTED_FILE_MESSAGE = "Tipo de arquivo não suportado. Use .txt, .pdf ou .eml"
+
+_pdf_executor: Optional[Executor] = None
+
+
+class FileTooLargeError(ValueError):
+    def __init__(self, max_bytes: int = UPLOAD_MAX_BYTES):
+        super().__init__(f"Arquivo muito grande. Máximo {round(max_bytes / (1024 * 1024), 2):g} MB")
+        self.max_bytes = max_bytes
+
+
+def get_pdf_executor() -> Executor:
+    global _pdf_executor
+    if _pdf_executor is None:
+        if PDF_POOL_KIND == "process":
+            _pdf_executor = ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS)
+        else:
+            _pdf_executor = ThreadPoolExecutor(max_workers=PDF_POOL_WORKERS, thread_name_prefix="pdf")
+    return _pdf_executor
+
+
+def shutdown_pdf_executor() -> None:
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=False, cancel_futures=True)
+        _pdf_executor = None
+
+
+def iter_pdf_pages(reader: "PdfReader", max_pages: int) -> Iterator[str]:
+    for page in islice(reader.pages, max_pages):
+        page_text = page.extract_text()
+        if page_text:
+            yield page_text
+
+
+def extract_pdf_text(
+    source: Union[str, bytes, BinaryIO],
+    max_pages: int = PDF_MAX_PAGES,
+    max_chars: int = PDF_MAX_CHARS
+) -> str:
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(BytesIO(source) if isinstance(source, bytes) else source)
+
+    parts = []
+    total = 0
+    for page_text in iter_pdf_pages(reader, max_pages):
+        parts.append(page_text)
+        total += len(page_text) + 1
+        if total >= max_chars:
+            break
+
+    return "\n".join(parts)[:max_chars]
+
+
+async def iter_upload_chunks(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> AsyncIterator[bytes]:
+    if file.size is not None and file.size > max_bytes:
+        raise FileTooLargeError(max_bytes)
+
+    total = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise FileTooLargeError(max_bytes)
+        yield chunk
+
+
+async def read_text_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> str:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    async for chunk in iter_upload_chunks(file, max_bytes):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+async def read_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    return b"".join([chunk async for chunk in iter_upload_chunks(file, max_bytes)])
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    return size
+
+
+async def pdf_source(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> Union[bytes, BinaryIO]:
+    """O PDF como o pool o recebe: o próprio arquivo do upload (já em disco ou em memória) no pool de threads,
+    ou os bytes no de processos, que não compartilha arquivos abertos."""
+    if PDF_POOL_KIND == "process":
+        return await read_upload(file, max_bytes)
+    size = file.size if file.size is not None else await asyncio.to_thread(_stream_size, file.file)
+    if size > max_bytes:
+        raise FileTooLargeError(max_bytes)
+    await asyncio.to_thread(file.file.seek, 0)
+    return file.file
+
 
 async def parse_file(file: UploadFile) -> str:
-    try:
-        content = await file.read()
+    with stage("parse_file"):
+        return await _parse_file(file)
 
+
+async def _parse_file(file: UploadFile) -> str:
+    try:
         if file.filename and file.filename.endswith('.txt'):
-            return content.decode('utf-8')
+            return await read_text_upload(file)
 
         elif file.filename and file.filename.endswith('.pdf'):
-            pdf_file = BytesIO(content)
-            reader = PdfReader(pdf_file)
-
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+            source = await pdf_source(file)
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(get_pdf_executor(), extract_pdf_text, source)
 
             if not text.strip():
                 raise ValueError("PDF não contém texto extraível (pode ser escaneado)")
 
             return text
 
+        elif file.filename and file.filename.endswith('.eml'):
+            text = message_text(parse_message(await read_upload(file)))
+            if not text.strip():
+                raise ValueError("Email não contém texto")
+
+            return text
+
         else:
-            raise ValueError("Tipo de arquivo não suportado. Use .txt ou .pdf")
+            raise ValueError(UNSUPPORTED_FILE_MESSAGE)
 
+    except FileTooLargeError:
+        raise
     except UnicodeDecodeError as e:
         raise ValueError("Erro ao decodificar arquivo. Certifique-se de usar UTF-8") from e
     except Exception as e:
@@ -0,0 +1,159 @@
+import os
+import re
+import zipfile
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from html.parser import HTMLParser
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+
+MAILBOX_MAX_BYTES = int(os.getenv("MAILBOX_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+MAIL_MAX_MESSAGE_BYTES = int(os.getenv("MAIL_MAX_MESSAGE_BYTES", str(10 * 1024 * 1024)))
+MAIL_MAX_CHARS = int(os.getenv("MAIL_MAX_CHARS", "20000"))
+
+MAILBOX_EXTENSIONS = (".mbox", ".zip")
+
+INVALID_MAILDIR_MESSAGE = "Arquivo .zip inválido. Envie um Maildir compactado"
+
+_BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "table", "hr"}
+_SKIPPED_TAGS = {"script", "style", "head", "title"}
+_MBOXRD_FROM = re.compile(rb"^>+From ")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*(\n\s*)+")
+
+_parser = BytesParser(policy=policy.default)
+
+
+class _HTMLTextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    extractor = _HTMLTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    lines = (" ".join(line.split()) for line in "".join(extractor.parts).splitlines())
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _header(message: EmailMessage, name: str) -> str:
+    try:
+        return str(message.get(name, "") or "").strip()
+    except Exception:
+        return ""
+
+
+def message_body(message: EmailMessage) -> str:
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        content = part.get_content()
+    except (LookupError, UnicodeError):
+        payload = part.get_payload(decode=True) or b""
+        content = payload.decode("utf-8", "replace")
+    if not isinstance(content, str):
+        return ""
+    if part.get_content_type() == "text/html":
+        return html_to_text(content)
+    return content.strip()
+
+
+def parse_message(raw: bytes) -> Dict[str, Any]:
+    message = _parser.parsebytes(raw)
+    return {
+        "message_id": _header(message, "message-id"),
+        "subject": _header(message, "subject"),
+        "sender": _header(message, "from"),
+        "body": message_body(message),
+    }
+
+
+def message_text(message: Dict[str, Any], max_chars: int = MAIL_MAX_CHARS) -> str:
+    header = []
+    if message["subject"]:
+        header.append(f"Assunto: {message['subject']}")
+    if message["sender"]:
+        header.append(f"De: {message['sender']}")
+    text = "\n".join(header) + "\n\n" + message["body"] if header else message["body"]
+    return text[:max_chars]
+
+
+def iter_mbox(handle: BinaryIO, max_message_bytes: int = MAIL_MAX_MESSAGE_BYTES) -> Iterator[bytes]:
+    """Percorre um arquivo mbox linha a linha, guardando em memória só a mensagem atual."""
+    lines: List[bytes] = []
+    size = 0
+    previous_blank = True
+    for line in handle:
+        if line.startswith(b"From ") and previous_blank:
+            if lines:
+                yield b"".join(lines)
+            lines, size = [], 0
+            previous_blank = False
+            continue
+        previous_blank = line in (b"\n", b"\r\n")
+        if size < max_message_bytes:
+            if _MBOXRD_FROM.match(line):
+                line = line[1:]
+            lines.append(line)
+            size += len(line)
+    if lines:
+        yield b"".join(lines)
+
+
+def iter_maildir_zip(handle: BinaryIO, max_message_bytes: int = MAIL_MAX_MESSAGE_BYTES) -> Iterator[Tuple[str, bytes]]:
+    """Percorre as mensagens de um Maildir compactado em .zip, uma entrada por vez."""
+    try:
+        archive = zipfile.ZipFile(handle)
+    except zipfile.BadZipFile as e:
+        raise ValueError(INVALID_MAILDIR_MESSAGE) from e
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or info.file_size > max_message_bytes:
+                continue
+            parts = info.filename.split("/")
+            if len(parts) < 2 or parts[-2] not in ("cur", "new") or parts[-1].startswith("."):
+                continue
+            with archive.open(info) as entry:
+                yield info.filename, entry.read()
+
+
+def is_mailbox(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(MAILBOX_EXTENSIONS)
+
+
+def iter_mailbox_messages(handle: BinaryIO, filename: str) -> Iterator[Dict[str, Any]]:
+    """Produz as mensagens de um .mbox ou de um Maildir em .zip conforme são lidas."""
+    handle.seek(0)
+    if filename.lower().endswith(".zip"):
+        raw_messages = iter_maildir_zip(handle)
+    else:
+        raw_messages = ((f"{filename}#{index}", raw) for index, raw in enumerate(iter_mbox(handle), start=1))
+
+    for item_id, raw in raw_messages:
+        try:
+            message = parse_message(raw)
+            error = None
+        except Exception as e:
+            message = {"message_id": "", "subject": "", "sender": "", "body": ""}
+            error = f"Erro ao ler mensagem: {str(e)}"
+        yield {"id": item_id, "error": error, **message}
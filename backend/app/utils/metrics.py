@@ -0,0 +1,262 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        return iter(())
+
+    def render(self, samples: Optional[Iterable[Tuple[str, str, float]]] = None) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        samples = self.samples() if samples is None else samples
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in samples)
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def total(self, **labels: str) -> float:
+        """Soma das séries que têm os rótulos informados (ex.: total(kind="prompt"))."""
+        positions = [(self.labelnames.index(name), value) for name, value in labels.items()]
+        return sum(
+            value for key, value in self._values.items()
+            if all(key[position] == expected for position, expected in positions)
+        )
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        if self._function is not None:
+            # None: valor indisponível neste processo; a série fica de fora em vez de aparecer como 0
+            value = self._function()
+            if value is not None:
+                yield self.name, "", float(value)
+            return
+        for key, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * len(self.buckets))
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, self._sums[key]
+            yield f"{self.name}_count", labels, cumulative
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def collect_samples(include_gauges: bool = True) -> List[Tuple[str, str, str, float]]:
+    """Amostras atuais deste processo como (métrica, série, rótulos, valor), para publicar no estado compartilhado."""
+    return [
+        (metric.name, name, labels, value)
+        for metric in REGISTRY
+        if include_gauges or metric.kind != "gauge"
+        for name, labels, value in metric.samples()
+    ]
+
+
+def render_merged_metrics(snapshots: Iterable[Iterable[Tuple[str, str, str, float]]]) -> str:
+    """Soma as amostras publicadas pelos workers; contadores, histogramas e gauges são somados série a série."""
+    merged: Dict[str, Dict[Tuple[str, str], float]] = {}
+    for samples in snapshots:
+        for metric_name, name, labels, value in samples:
+            series = merged.setdefault(metric_name, {})
+            series[(name, labels)] = series.get((name, labels), 0.0) + value
+    return "\n".join(
+        metric.render((name, labels, value) for (name, labels), value in merged.get(metric.name, {}).items())
+        for metric in REGISTRY
+    ) + "\n"
+
+
+STAGE_DURATION = Histogram(
+    "email_classifier_stage_duration_seconds",
+    "Duração de cada etapa do processamento",
+    ("stage",)
+)
+REQUEST_DURATION = Histogram(
+    "email_classifier_request_duration_seconds",
+    "Duração total das requisições HTTP",
+    ("method", "path", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "email_classifier_requests_in_flight",
+    "Requisições HTTP em andamento"
+)
+LLM_CALLS_IN_FLIGHT = Gauge(
+    "email_classifier_llm_calls_in_flight",
+    "Chamadas ao LLM em andamento",
+    ("operation",)
+)
+LLM_CALLS = Counter(
+    "email_classifier_llm_calls_total",
+    "Chamadas ao LLM por operação e resultado",
+    ("operation", "outcome")
+)
+LLM_TOKENS = Counter(
+    "email_classifier_llm_tokens_total",
+    "Tokens consumidos no LLM, conforme o campo usage da resposta",
+    ("operation", "kind")
+)
+CACHE_LOOKUPS = Counter(
+    "email_classifier_cache_lookups_total",
+    "Consultas ao cache de classificações",
+    ("result",)
+)
+CACHE_REMOVALS = Counter(
+    "email_classifier_cache_removals_total",
+    "Entradas removidas do cache, em memória ou em disco: por falta de espaço (eviction) ou vencidas (expiration)",
+    ("reason",)
+)
+LOCAL_CLASSIFICATIONS = Counter(
+    "email_classifier_local_classifications_total",
+    "Emails vistos pelo pré-classificador local: respondidos localmente (accepted) ou enviados ao LLM (rejected)",
+    ("result",)
+)
+FALLBACKS = Counter(
+    "email_classifier_fallbacks_total",
+    "Caminhos alternativos usados quando a via principal falha",
+    ("kind",)
+)
+
+
+def record_usage(operation: str, usage) -> None:
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, operation=operation, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, operation=operation, kind="completion")
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def start_request_timing() -> List[Tuple[str, float]]:
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,251 @@
+import logging
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.metrics import Counter, Histogram, stage
+
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+EMAIL_MAX_TOKENS = int(os.getenv("EMAIL_MAX_TOKENS", "1000"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+TOKENIZER_RETRY_SECONDS = float(os.getenv("TOKENIZER_RETRY_SECONDS", "300"))
+# diretório opcional (não incluído no repositório) com o arquivo BPE do tiktoken, para rodar sem rede;
+# usado se existir e TIKTOKEN_CACHE_DIR não estiver definido
+VENDORED_TOKENIZER_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "tiktoken")
+
+_CHARS_PER_TOKEN = 4
+
+_REPLY_HEADERS = [
+    re.compile(r"^\s*(Em|On)\s.{0,200}\s(escreveu|wrote)\s*:\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*(Mensagem original|Original Message|Mensagem encaminhada|Forwarded message)\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^\s*_{10,}\s*$"),
+]
+_OUTLOOK_HEADER = re.compile(r"^\s*\*?(De|From)\s*:\*?\s+\S")
+_OUTLOOK_FOLLOWUP = re.compile(r"^\s*\*?(Enviado|Enviada|Sent|Data|Date|Para|To|Assunto|Subject)\s*:", re.IGNORECASE)
+_SIGNATURE_DELIMITER = re.compile(r"^(--|__)\s*$")
+_MOBILE_SIGNATURE = re.compile(r"^\s*(Enviado do meu|Enviado de meu|Sent from my|Get Outlook for)\b", re.IGNORECASE)
+_SIGN_OFFS = re.compile(
+    r"^\s*(atenciosamente|att\.?|atte\.?|cordialmente|abra[cç]os?|saudações|grato|grata|"
+    r"best regards|kind regards|regards|cheers|sincerely)\s*[,.!]?\s*$",
+    re.IGNORECASE,
+)
+_LEGAL_FOOTER = re.compile(
+    r"(esta mensagem|este e-?mail|this (e-?mail|message)).{0,200}(confidencia|destinat|intended (solely )?for|privileged)"
+    r"|aviso legal|disclaimer|confidentiality notice|antes de imprimir|before printing"
+    r"|se voc[eê] (recebeu|n[aã]o [eé] o destinat)|if you (have )?received this",
+    re.IGNORECASE | re.DOTALL,
+)
+_PAGE_NUMBER = re.compile(r"^\s*(-\s*\d+\s*-|(p[aá]gina|page|p[aá]g\.?)\s*\d+(\s*(de|of|/)\s*\d+)?)\s*$", re.IGNORECASE)
+_HYPHENATED_BREAK = re.compile(r"(\w)-\n(\w)")
+_CONTROL_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\u200b\ufeff]")
+_SPACES = re.compile("[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+_SIGN_OFF_WINDOW = 6
+
+PREPROCESS_TOKENS = Counter(
+    "email_classifier_preprocess_tokens_total",
+    "Tokens do email antes e depois do pré-processamento",
+    ("kind",)
+)
+PREPROCESS_TOKENS_SAVED = Histogram(
+    "email_classifier_preprocess_tokens_saved",
+    "Tokens removidos do email por requisição antes de chamar o LLM",
+    buckets=(0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+
+_stats = {"requests": 0, "original_tokens": 0, "kept_tokens": 0, "truncated": 0, "estimated_counts": 0}
+
+_tokenizer: Dict[str, Any] = {"encoding": None, "error": None, "last_attempt": None}
+_tokenizer_lock = threading.Lock()
+_tokenizer_loading = threading.Event()
+
+
+def load_tokenizer():
+    """Carrega o tokenizador (pode baixar o arquivo BPE); bloqueia, então rode em uma thread.
+
+    Em caso de falha, guarda o erro e deixa uma nova tentativa para depois de TOKENIZER_RETRY_SECONDS.
+    """
+    with _tokenizer_lock:
+        if _tokenizer["encoding"] is not None:
+            return _tokenizer["encoding"]
+        _tokenizer["last_attempt"] = time.monotonic()
+        if "TIKTOKEN_CACHE_DIR" not in os.environ and os.path.isdir(VENDORED_TOKENIZER_DIR):
+            os.environ["TIKTOKEN_CACHE_DIR"] = VENDORED_TOKENIZER_DIR
+        try:
+            import tiktoken
+            _tokenizer["encoding"] = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            _tokenizer["error"] = str(e)
+            logger.warning(
+                "Tokenizador %s indisponível, usando estimativa por caracteres; nova tentativa em %.0fs: %s",
+                TOKENIZER_ENCODING, TOKENIZER_RETRY_SECONDS, e
+            )
+            return None
+        if _tokenizer["error"] is not None:
+            logger.info("Tokenizador %s carregado; estimativa por caracteres desativada", TOKENIZER_ENCODING)
+        _tokenizer["error"] = None
+        return _tokenizer["encoding"]
+
+
+def _load_in_background() -> None:
+    try:
+        load_tokenizer()
+    finally:
+        _tokenizer_loading.clear()
+
+
+def _encoding():
+    """Tokenizador já carregado, ou None; nunca bloqueia: o carregamento (e as novas tentativas) rodam em uma thread."""
+    encoding = _tokenizer["encoding"]
+    if encoding is not None:
+        return encoding
+    last_attempt = _tokenizer["last_attempt"]
+    retry_due = last_attempt is None or time.monotonic() - last_attempt >= TOKENIZER_RETRY_SECONDS
+    if retry_due and not _tokenizer_loading.is_set():
+        _tokenizer_loading.set()
+        threading.Thread(target=_load_in_background, name="tokenizer-load", daemon=True).start()
+    return None
+
+
+def start_tokenizer_load() -> None:
+    """Começa a carregar o tokenizador em segundo plano, sem esperar."""
+    _encoding()
+
+
+def tokenizer_name() -> str:
+    return TOKENIZER_ENCODING if _encoding() is not None else "chars/4"
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        _stats["estimated_counts"] += 1
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> Tuple[str, bool]:
+    return _truncate(text, max_tokens, _encoding())
+
+
+@lru_cache(maxsize=256)
+def _truncate(text: str, max_tokens: int, encoding) -> Tuple[str, bool]:
+    """Corte memorizado por tokenizador: o mesmo email é cortado nas estatísticas e em cada prompt."""
+    if encoding is None:
+        limit = max_tokens * _CHARS_PER_TOKEN
+        if len(text) <= limit:
+            return text, False
+        cut = text.rfind(" ", 0, limit)
+        return text[:cut if cut > limit // 2 else limit].rstrip(), True
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text, False
+    return encoding.decode(tokens[:max_tokens]).rstrip(), True
+
+
+def _cut_at_reply_header(lines: List[str]) -> List[str]:
+    for index, line in enumerate(lines):
+        if index == 0:
+            continue
+        if any(pattern.match(line) for pattern in _REPLY_HEADERS):
+            return lines[:index]
+        if _OUTLOOK_HEADER.match(line) and any(_OUTLOOK_FOLLOWUP.match(next_line) for next_line in lines[index + 1:index + 4]):
+            return lines[:index]
+    return lines
+
+
+def strip_quoted_history(text: str) -> str:
+    lines = [line for line in text.split("\n") if not line.lstrip().startswith(">")]
+    return "\n".join(_cut_at_reply_header(lines))
+
+
+def strip_signature(text: str) -> str:
+    lines = text.split("\n")
+    for index, line in enumerate(lines):
+        if index > 0 and (_SIGNATURE_DELIMITER.match(line) or _MOBILE_SIGNATURE.match(line)):
+            lines = lines[:index]
+            break
+
+    content_lines = [index for index, line in enumerate(lines) if line.strip()]
+    for index in content_lines[-_SIGN_OFF_WINDOW:]:
+        if index > content_lines[0] and _SIGN_OFFS.match(lines[index]):
+            return "\n".join(lines[:index])
+    return "\n".join(lines)
+
+
+def strip_legal_footer(text: str) -> str:
+    paragraphs = re.split(r"\n\s*\n", text)
+    kept = [paragraph for paragraph in paragraphs if not _LEGAL_FOOTER.search(paragraph)]
+    return "\n\n".join(kept)
+
+
+def clean_extraction_noise(text: str) -> str:
+    text = _CONTROL_CHARS.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+    text = _HYPHENATED_BREAK.sub(r"\1\2", text)
+    return "\n".join(line for line in text.split("\n") if not _PAGE_NUMBER.match(line))
+
+
+def collapse_whitespace(text: str) -> str:
+    lines = (_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def clean_email(text: str) -> str:
+    text = clean_extraction_noise(text)
+    cleaned = collapse_whitespace(strip_legal_footer(strip_signature(strip_quoted_history(text))))
+    return cleaned or collapse_whitespace(text)
+
+
+def preprocess_email(text: str, max_tokens: Optional[int] = None) -> str:
+    """Limpa o email e registra quantos tokens sobram depois do corte no orçamento.
+
+    Devolve o texto limpo, sem o corte: ele identifica o email no cache, no índice de quase duplicados
+    e nas respostas pendentes, e não pode depender de o tokenizador já ter carregado. O corte é aplicado
+    só ao montar os prompts, com truncate_email().
+    """
+    if not PREPROCESS_ENABLED:
+        return text
+
+    with stage("preprocess"):
+        original_tokens = count_tokens(text)
+        cleaned = clean_email(text)
+        kept, truncated = truncate_to_tokens(cleaned, max_tokens or EMAIL_MAX_TOKENS)
+        kept_tokens = count_tokens(kept) if kept != text else original_tokens
+
+    saved = max(0, original_tokens - kept_tokens)
+    PREPROCESS_TOKENS.inc(original_tokens, kind="original")
+    PREPROCESS_TOKENS.inc(kept_tokens, kind="kept")
+    PREPROCESS_TOKENS_SAVED.observe(saved)
+    _stats["requests"] += 1
+    _stats["original_tokens"] += original_tokens
+    _stats["kept_tokens"] += kept_tokens
+    _stats["truncated"] += int(truncated)
+    return cleaned
+
+
+def truncate_email(text: str) -> str:
+    """Texto do email cortado em EMAIL_MAX_TOKENS, como vai para os prompts."""
+    if not PREPROCESS_ENABLED:
+        return text
+    return truncate_to_tokens(text, EMAIL_MAX_TOKENS)[0]
+
+
+def preprocess_stats() -> Dict[str, Any]:
+    original = _stats["original_tokens"]
+    return {
+        "enabled": PREPROCESS_ENABLED,
+        "max_tokens": EMAIL_MAX_TOKENS,
+        "tokenizer": TOKENIZER_ENCODING if _tokenizer["encoding"] is not None else "chars/4",
+        "tokenizer_error": _tokenizer["error"],
+        **_stats,
+        "tokens_saved": original - _stats["kept_tokens"],
+        "saved_fraction": round(1 - _stats["kept_tokens"] / original, 4) if original else 0.0,
+    }
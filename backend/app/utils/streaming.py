@@ -0,0 +1,53 @@
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def ndjson_line(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+def sse_event(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_error(error: Exception) -> Dict[str, Any]:
+    """Erro que interrompeu um stream depois de o status 200 já ter sido enviado."""
+    message = str(error) if isinstance(error, ValueError) else f"Erro ao processar: {str(error)}"
+    return {"error": message}
+
+
+async def ndjson_stream(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Uma linha por resultado; se a fonte falhar no meio, a última linha traz só o `error`, sem `index`."""
+    try:
+        async for result in results:
+            yield ndjson_line(result)
+    except Exception as e:
+        yield ndjson_line(stream_error(e))
+
+
+async def sse_stream(
+    results: AsyncIterator[Dict[str, Any]],
+    event: str = "result"
+) -> AsyncIterator[str]:
+    """Um evento por resultado e `done` no fim; se a fonte falhar no meio, termina com um evento `error`."""
+    succeeded = 0
+    failed = 0
+    try:
+        async for result in results:
+            if "error" not in result:
+                succeeded += 1
+            else:
+                failed += 1
+            yield sse_event(event, result, event_id=str(result.get("index")))
+    except Exception as e:
+        yield sse_event("error", {**stream_error(e), "succeeded": succeeded, "failed": failed})
+        return
+    yield sse_event("done", {"succeeded": succeeded, "failed": failed})
@@ -0,0 +1,13 @@
+import os
+
+from uvicorn.workers import UvicornWorker
+
+
+SHUTDOWN_REQUEST_TIMEOUT = int(os.getenv("SHUTDOWN_REQUEST_TIMEOUT", "30"))
+
+
+class ClassifierWorker(UvicornWorker):
+    """Worker do gunicorn que, ao receber SIGTERM, espera as requisições em andamento por até SHUTDOWN_REQUEST_TIMEOUT
+    segundos (streams longos são cortados depois disso) antes de drenar jobs e respostas no lifespan."""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "timeout_graceful_shutdown": SHUTDOWN_REQUEST_TIMEOUT}
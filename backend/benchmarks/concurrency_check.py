@@ -0,0 +1,74 @@
+"""
+Verifica que chamadas simultâneas a classify_email se sobrepõem no event loop.
+
+Uso (a partir de backend/):
+    python -m benchmarks.concurrency_check --requests 10 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import uvicorn
+
+from benchmarks.fake_llm import create_fake_llm_app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_llm(latency: float):
+    port = _free_port()
+    app = create_fake_llm_app(latency)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, app, f"http://127.0.0.1:{port}/v1"
+
+
+async def run(n: int) -> float:
+    from app.services.classifier import classify_email
+
+    await classify_email("Aquecimento")
+    start = time.perf_counter()
+    await asyncio.gather(*(classify_email(f"Preciso de ajuda com o chamado {i}") for i in range(n)))
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    server, fake_app, base_url = start_fake_llm(args.latency)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+    try:
+        elapsed = asyncio.run(run(args.requests))
+    finally:
+        server.should_exit = True
+
+    serial = args.requests * 2 * args.latency
+    print(f"requisições: {args.requests}")
+    print(f"tempo total: {elapsed:.2f}s (serial seria >= {serial:.2f}s)")
+    print(f"máximo de chamadas simultâneas no LLM: {fake_app.state.max_in_flight}")
+
+    if elapsed >= serial / 2 or fake_app.state.max_in_flight < 2:
+        print("FALHA: as chamadas ao LLM não se sobrepuseram")
+        return 1
+    print("OK: as chamadas ao LLM rodaram em paralelo")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
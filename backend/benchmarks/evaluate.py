@@ -0,0 +1,385 @@
+"""
+Avaliação offline de qualidade x custo das configurações do classificador.
+
+Passa um corpus rotulado (padrão: benchmarks/data/heldout_emails.jsonl) por classify_email
+(ou só por get_ai_classification, com --target classification) em várias configurações,
+cada uma em um processo próprio, e mostra lado a lado: acurácia e F1 por categoria,
+calibração da confiança (ECE e Brier), tokens e chamadas ao LLM por email, custo
+estimado e latências p50/p95/p99.
+
+Cada configuração é `nome:CHAVE=VALOR,CHAVE=VALOR`. Chaves com ponto ajustam os
+parâmetros de uma operação do ai_service (`classification.temperature=0`,
+`combined.max_tokens=150`); as demais são variáveis de ambiente da API
+(`CLASSIFY_MODE=combined`, `LLM_MODEL=gpt-4o`, `INFERENCE_BACKEND=llama_cpp`).
+Cache, near-duplicate e histórico ficam desligados para que todo email passe pelo modelo.
+
+O LLM pode ser:
+- o servidor falso (padrão), que com --recordings reproduz respostas e latências gravadas de um modelo real;
+- a OpenAI de verdade (--llm openai), gravando as respostas em --record para reprodução posterior;
+- um modelo local, configurando INFERENCE_BACKEND=llama_cpp e LOCAL_MODEL_PATH na configuração.
+
+Uso (a partir de backend/):
+    python -m benchmarks.evaluate --llm openai --record benchmarks/recordings/gpt-4o-mini.jsonl \\
+        --config two_step: --config combined:CLASSIFY_MODE=combined
+    python -m benchmarks.evaluate --recordings benchmarks/recordings/gpt-4o-mini.jsonl \\
+        --config two_step: --config combined:CLASSIFY_MODE=combined --config local:LOCAL_CLASSIFIER_ENABLED=true
+
+O corpus padrão fica fora do treino do pré-classificador local (app/data/labeled_emails.jsonl);
+configurações que o usam (LOCAL_CLASSIFIER_ENABLED=true ou SPECULATIVE_REPLY=guess) são recusadas
+quando o corpus é o próprio arquivo de treino, o que superestimaria a acurácia.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.loadtest import BACKEND_DIR, RESULTS_DIR, ServerProcess, _free_port, latency_summary
+from benchmarks.payloads import HELDOUT_EMAILS, load_sample_emails
+
+
+CATEGORIES = ("Produtivo", "Improdutivo")
+
+# isola o modelo: nada de respostas reaproveitadas entre emails parecidos
+BASE_ENV = {
+    "CACHE_ENABLED": "false",
+    "NEAR_DUP_ENABLED": "false",
+    "RESULT_LOG_ENABLED": "false",
+    "SPECULATIVE_REPLY": "off",
+}
+
+
+def parse_config(value: str) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    name, separator, settings = value.partition(":")
+    if not separator or not name:
+        raise argparse.ArgumentTypeError("use nome:CHAVE=VALOR,CHAVE=VALOR")
+    env: Dict[str, str] = {}
+    params: Dict[str, Any] = {}
+    for setting in filter(None, (part.strip() for part in settings.split(","))):
+        key, separator, raw = setting.partition("=")
+        if not separator:
+            raise argparse.ArgumentTypeError(f"ajuste sem valor: {setting}")
+        if "." in key:
+            try:
+                params[key] = json.loads(raw)
+            except json.JSONDecodeError:
+                params[key] = raw
+        else:
+            env[key] = raw
+    return name, env, params
+
+
+def trains_on(corpus: Path, config_env: Dict[str, str]) -> bool:
+    """Se a configuração usa o pré-classificador local treinado com o próprio corpus avaliado."""
+    from app.services.local_classifier import LOCAL_CLASSIFIER_DATA
+
+    env = {**os.environ, **BASE_ENV, **config_env}
+    uses_local = env.get("LOCAL_CLASSIFIER_ENABLED", "false").lower() == "true" or env.get("SPECULATIVE_REPLY") == "guess"
+    training = Path(config_env.get("LOCAL_CLASSIFIER_DATA", LOCAL_CLASSIFIER_DATA))
+    return uses_local and corpus.resolve() == training.resolve()
+
+
+async def run_worker(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Roda dentro do processo da configuração: classifica o corpus e devolve predições e contadores."""
+    from app.services import ai_service
+    from app.services.classifier import classify_email
+    from app.services.warmup import warm_up
+    from app.utils.metrics import LLM_CALLS, LLM_TOKENS
+
+    for key, value in spec["params"].items():
+        operation, _, param = key.partition(".")
+        if operation not in ai_service.OPERATION_PARAMS:
+            raise ValueError(f"operação desconhecida: {operation}. Use {', '.join(ai_service.OPERATION_PARAMS)}")
+        ai_service.OPERATION_PARAMS[operation][param] = value
+
+    await warm_up()
+    semaphore = asyncio.Semaphore(spec["concurrency"])
+
+    async def classify(text: str) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if spec["target"] == "classification":
+                    result = await ai_service.get_ai_classification(text)
+                    category, confidence = result["category"], result.get("confidence")
+                else:
+                    result = await classify_email(text)
+                    category, confidence = result.category, result.confidence
+                error = None
+            except Exception as e:
+                category, confidence, error = None, None, str(e)
+            return {"category": category, "confidence": confidence, "error": error, "latency": time.perf_counter() - start}
+
+    started = time.perf_counter()
+    predictions = await asyncio.gather(*(classify(text) for text in spec["texts"]))
+    return {
+        "predictions": predictions,
+        "duration_s": time.perf_counter() - started,
+        "prompt_tokens": LLM_TOKENS.total(kind="prompt"),
+        "completion_tokens": LLM_TOKENS.total(kind="completion"),
+        "llm_calls": LLM_CALLS.total(),
+    }
+
+
+def run_config(
+    name: str,
+    env: Dict[str, str],
+    params: Dict[str, Any],
+    texts: List[str],
+    args,
+    base_env: Dict[str, str],
+) -> Dict[str, Any]:
+    spec = {"params": params, "texts": texts, "target": args.target, "concurrency": args.concurrency}
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.evaluate", "--worker"],
+        cwd=BACKEND_DIR,
+        env={**base_env, **BASE_ENV, **env},
+        input=json.dumps(spec, ensure_ascii=False),
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"configuração {name} falhou:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def classification_report(expected: List[str], predicted: List[Optional[str]]) -> Dict[str, Any]:
+    per_category = {}
+    for category in CATEGORIES:
+        tp = sum(1 for e, p in zip(expected, predicted) if e == category and p == category)
+        fp = sum(1 for e, p in zip(expected, predicted) if e != category and p == category)
+        fn = sum(1 for e, p in zip(expected, predicted) if e == category and p != category)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_category[category] = {
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(f1, 4),
+            "support": tp + fn,
+        }
+    correct = sum(1 for e, p in zip(expected, predicted) if e == p)
+    return {
+        "accuracy": round(correct / len(expected), 4) if expected else 0.0,
+        "macro_f1": round(sum(item["f1"] for item in per_category.values()) / len(per_category), 4),
+        "categories": per_category,
+    }
+
+
+def calibration(confidences: List[float], correct: List[bool], bins: int) -> Dict[str, Any]:
+    """ECE (diferença média entre confiança e acerto, por faixa de confiança) e Brier score."""
+    if not confidences:
+        return {"ece": None, "brier": None, "mean_confidence": None, "bins": []}
+    table = []
+    ece = 0.0
+    for index in range(bins):
+        low, high = index / bins, (index + 1) / bins
+        members = [
+            (confidence, hit) for confidence, hit in zip(confidences, correct)
+            if low <= confidence < high or (index == bins - 1 and confidence == 1.0)
+        ]
+        if not members:
+            continue
+        mean_confidence = sum(confidence for confidence, _ in members) / len(members)
+        accuracy = sum(1 for _, hit in members if hit) / len(members)
+        ece += abs(accuracy - mean_confidence) * len(members) / len(confidences)
+        table.append({
+            "range": f"{low:.2f}-{high:.2f}",
+            "count": len(members),
+            "mean_confidence": round(mean_confidence, 4),
+            "accuracy": round(accuracy, 4),
+        })
+    brier = sum((confidence - float(hit)) ** 2 for confidence, hit in zip(confidences, correct)) / len(confidences)
+    return {
+        "ece": round(ece, 4),
+        "brier": round(brier, 4),
+        "mean_confidence": round(sum(confidences) / len(confidences), 4),
+        "bins": table,
+    }
+
+
+def summarize(name: str, env: Dict[str, str], params: Dict[str, Any], samples, raw: Dict[str, Any], args) -> Dict[str, Any]:
+    predictions = raw["predictions"]
+    expected = [category for _, category in samples]
+    predicted = [prediction["category"] for prediction in predictions]
+    answered = [
+        (prediction["confidence"], prediction["category"] == category)
+        for prediction, (_, category) in zip(predictions, samples)
+        if prediction["category"] is not None and prediction["confidence"] is not None
+    ]
+    count = len(samples)
+    prompt_tokens = raw["prompt_tokens"] / count
+    completion_tokens = raw["completion_tokens"] / count
+    cost_per_1k = (prompt_tokens * args.price_prompt + completion_tokens * args.price_completion) / 1000
+    return {
+        "name": name,
+        "env": env,
+        "params": params,
+        **classification_report(expected, predicted),
+        "errors": sum(1 for prediction in predictions if prediction["error"]),
+        "calibration": calibration([c for c, _ in answered], [hit for _, hit in answered], args.bins),
+        "prompt_tokens_per_email": round(prompt_tokens, 1),
+        "completion_tokens_per_email": round(completion_tokens, 1),
+        "tokens_per_email": round(prompt_tokens + completion_tokens, 1),
+        "llm_calls_per_email": round(raw["llm_calls"] / count, 3),
+        "cost_per_1k_emails_usd": round(cost_per_1k, 4),
+        "duration_s": round(raw["duration_s"], 3),
+        **latency_summary([prediction["latency"] for prediction in predictions if not prediction["error"]]),
+        "misclassified": [
+            {"text": text, "expected": category, "predicted": prediction["category"], "confidence": prediction["confidence"], "error": prediction["error"]}
+            for prediction, (text, category) in zip(predictions, samples)
+            if prediction["category"] != category
+        ],
+    }
+
+
+def recommend(results: List[Dict[str, Any]], min_f1: float) -> Optional[Dict[str, Any]]:
+    """A configuração mais barata (e, no empate, mais rápida) que atinge o F1 macro mínimo sem erros."""
+    eligible = [result for result in results if result["macro_f1"] >= min_f1 and not result["errors"]]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda result: (result["cost_per_1k_emails_usd"], result["latency_p95_ms"]))
+
+
+def print_report(results: List[Dict[str, Any]], recommended: Optional[Dict[str, Any]], min_f1: float) -> None:
+    width = max(len(result["name"]) for result in results) + 2
+    header = (
+        f"{'config':<{width}}{'acurácia':>9}{'F1 macro':>9}{'F1 Prod':>9}{'F1 Impr':>9}{'ECE':>7}{'Brier':>7}"
+        f"{'tok/email':>10}{'LLM/email':>10}{'US$/1k':>9}{'p50 ms':>9}{'p95 ms':>9}{'erros':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        categories = result["categories"]
+        ece = result["calibration"]["ece"]
+        brier = result["calibration"]["brier"]
+        print(
+            f"{result['name']:<{width}}{result['accuracy']:>9.3f}{result['macro_f1']:>9.3f}"
+            f"{categories['Produtivo']['f1']:>9.3f}{categories['Improdutivo']['f1']:>9.3f}"
+            f"{'-' if ece is None else f'{ece:.3f}':>7}{'-' if brier is None else f'{brier:.3f}':>7}"
+            f"{result['tokens_per_email']:>10}{result['llm_calls_per_email']:>10}{result['cost_per_1k_emails_usd']:>9}"
+            f"{result['latency_p50_ms']:>9}{result['latency_p95_ms']:>9}{result['errors']:>7}"
+        )
+    if recommended is None:
+        print(f"\nnenhuma configuração atingiu F1 macro >= {min_f1} sem erros")
+    else:
+        print(f"\nrecomendada (F1 macro >= {min_f1}, menor custo e depois menor p95): {recommended['name']}")
+
+
+def start_llm(args) -> Tuple[Optional[ServerProcess], Dict[str, str]]:
+    """Sobe o servidor falso quando necessário e devolve o ambiente que aponta a API para ele."""
+    env = os.environ.copy()
+    if args.llm == "openai" and not args.record:
+        return None, env
+
+    port = _free_port()
+    command = [sys.executable, "-m", "benchmarks.fake_llm", "--port", str(port), "--latency", str(args.latency)]
+    if args.record:
+        upstream = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        command += ["--recordings", str(args.record), "--upstream", upstream]
+    elif args.recordings:
+        command += ["--recordings", str(args.recordings)]
+    else:
+        env["OPENAI_API_KEY"] = "fake-key"
+    fake = ServerProcess(command, os.environ.copy(), f"http://127.0.0.1:{port}/stats")
+    fake.wait_ready()
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    env.setdefault("OPENAI_API_KEY", "fake-key")
+    return fake, env
+
+
+def _replay_misses(fake: Optional[ServerProcess]) -> int:
+    if fake is None:
+        return 0
+    return httpx.get(fake.health_url, timeout=5).json().get("replay_misses", 0)
+
+
+def main() -> int:
+    if "--worker" in sys.argv:
+        print(json.dumps(asyncio.run(run_worker(json.loads(sys.stdin.read())))))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Avaliação de qualidade x custo das configurações do classificador")
+    parser.add_argument("--config", type=parse_config, action="append", default=[], help="nome:CHAVE=VALOR,... (repetível)")
+    parser.add_argument("--corpus", type=Path, default=HELDOUT_EMAILS,
+                        help="JSONL com campos text e category (padrão: emails fora do treino do pré-classificador)")
+    parser.add_argument("--target", choices=("email", "classification"), default="email",
+                        help="email: classify_email completo; classification: só get_ai_classification")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm", choices=("fake", "openai"), default="fake")
+    parser.add_argument("--latency", type=float, default=0.05, help="latência do LLM falso sem gravação, em segundos")
+    parser.add_argument("--recordings", type=Path, help="respostas gravadas para o LLM falso reproduzir")
+    parser.add_argument("--record", type=Path, help="com --llm openai, grava as respostas neste arquivo")
+    parser.add_argument("--price-prompt", type=float, default=0.15, help="US$ por 1M tokens de prompt (padrão: gpt-4o-mini)")
+    parser.add_argument("--price-completion", type=float, default=0.60, help="US$ por 1M tokens de resposta (padrão: gpt-4o-mini)")
+    parser.add_argument("--min-f1", type=float, default=0.9, help="F1 macro mínimo para recomendar uma configuração")
+    parser.add_argument("--bins", type=int, default=5, help="faixas de confiança da calibração")
+    parser.add_argument("--label", default="evaluation")
+    parser.add_argument("--output", type=Path, help="arquivo JSON de saída (padrão: benchmarks/results/<label>-<data>.json)")
+    args = parser.parse_args()
+    if args.record and args.llm != "openai":
+        parser.error("--record precisa de --llm openai")
+    configs = args.config or [parse_config("padrão:")]
+    for name, config_env, _ in configs:
+        if trains_on(args.corpus, config_env):
+            parser.error(
+                f"a configuração {name} usa o pré-classificador local, treinado com {args.corpus}; "
+                f"avalie-a com um corpus fora do treino (o padrão, {HELDOUT_EMAILS.name}, por exemplo)"
+            )
+
+    samples = load_sample_emails(args.corpus)
+    texts = [text for text, _ in samples]
+    fake, env = start_llm(args)
+    results = []
+    try:
+        for name, config_env, params in configs:
+            print(f"avaliando {name}...", file=sys.stderr)
+            misses_before = _replay_misses(fake)
+            raw = run_config(name, config_env, params, texts, args, env)
+            result = summarize(name, config_env, params, samples, raw, args)
+            if args.recordings:
+                result["replay_misses"] = _replay_misses(fake) - misses_before
+                if result["replay_misses"]:
+                    print(
+                        f"aviso: {name} fez {result['replay_misses']} chamadas sem resposta gravada; "
+                        "elas usaram a heurística do servidor falso",
+                        file=sys.stderr,
+                    )
+            results.append(result)
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    recommended = recommend(results, args.min_f1)
+    print_report(results, recommended, args.min_f1)
+
+    timestamp = datetime.now(timezone.utc)
+    output = args.output or RESULTS_DIR / f"{args.label}-{timestamp.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "label": args.label,
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "config": {
+            "corpus": str(args.corpus),
+            "emails": len(samples),
+            "target": args.target,
+            "llm": args.llm,
+            "recordings": str(args.recordings or args.record or "") or None,
+            "min_f1": args.min_f1,
+        },
+        "recommended": recommended["name"] if recommended else None,
+        "results": results,
+    }, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nresultado salvo em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+async def _stream_chunks(model: str, content: str, usage: dict = None):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    for index in range(0, len(content), 8):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": content[index:index + 8]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(0.01)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    if usage is not None:
+        usage_chunk = dict(final, choices=[], usage=usage)
+        yield f"data: {json.dumps(usage_chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+RECORDED_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format")
+
+
+def request_key(body: Dict[str, Any]) -> str:
+    """Identifica a requisição pelo que muda a resposta do modelo (não por stream ou stream_options)."""
+    relevant = {field: body.get(field) for field in RECORDED_FIELDS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def load_recordings(path: Path) -> Dict[str, Dict[str, Any]]:
+    recordings = {}
+    if path.exists():
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    record = json.loads(line)
+                    recordings[record["key"]] = record
+    return recordings
+
+
+def create_fake_llm_app(
+    latency: float = 0.2,
+    error_rate: float = 0.0,
+    jitter: float = 0.0,
+    recordings: Optional[Path] = None,
+    upstream: Optional[str] = None,
+) -> FastAPI:
+    """Servidor falso de chat completions.
+
+    Com `recordings`, responde com as respostas gravadas de um modelo real (e a latência gravada);
+    requisições sem gravação caem na heurística e são contadas em `replay_misses`. Com `recordings`
+    e `upstream`, repassa as requisições ao provedor real e grava as respostas no arquivo.
+    """
+    app = FastAPI(title="Fake LLM")
+    app.state.latency = latency
+    app.state.jitter = jitter
+    app.state.error_rate = error_rate
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    app.state.requests = 0
+    app.state.recordings = load_recordings(recordings) if recordings else {}
+    app.state.replay_hits = 0
+    app.state.replay_misses = 0
+    app.state.recorded = 0
+
+    async def _record(request: Request, body: Dict[str, Any], key: str) -> Dict[str, Any]:
+        headers = {"authorization": request.headers.get("authorization", "")}
+        payload = {field: body[field] for field in RECORDED_FIELDS if body.get(field) is not None}
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(f"{upstream.rstrip('/')}/chat/completions", json=payload, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+        record = {
+            "key": key,
+            "content": data["choices"][0]["message"]["content"],
+            "usage": data.get("usage"),
+            "latency": round(time.perf_counter() - start, 4),
+        }
+        app.state.recordings[key] = record
+        app.state.recorded += 1
+        with open(recordings, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        key = request_key(body) if recordings else None
+        recorded = app.state.recordings.get(key) if key else None
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        try:
+            if recorded is None and upstream:
+                recorded = await _record(request, body, key)
+            elif recorded is not None:
+                app.state.replay_hits += 1
+                await asyncio.sleep(recorded.get("latency") or 0.0)
+            else:
+                if recordings:
+                    app.state.replay_misses += 1
+                await asyncio.sleep(max(0.0, app.state.latency + random.uniform(-app.state.jitter, app.state.jitter)))
+        finally:
+            app.state.in_flight -= 1
+
+        if random.random() < app.state.error_rate:
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after": "0"},
+            )
+
+        messages = body.get("messages", [])
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if messages else ""
+
+        reply = "Obrigado pelo contato. Recebemos sua mensagem.\n\nAtenciosamente.\nLucas\nCEO\nAutoU"
+        batch = re.split(r"^Email \d+:\n", user, flags=re.MULTILINE)[1:]
+        if recorded is not None:
+            content = recorded["content"]
+        elif batch:
+            results = [
+                {
+                    "id": index,
+                    "category": "Improdutivo" if "obrigado" in email.lower() else "Produtivo",
+                    "confidence": 0.9,
+                }
+                for index, email in enumerate(batch, start=1)
+            ]
+            content = json.dumps({"results": results}, ensure_ascii=False)
+        elif "classificador" in system:
+            category = "Improdutivo" if "obrigado" in user.lower() else "Produtivo"
+            result = {"category": category, "confidence": 0.9}
+            if "suggested_response" in user:
+                result["suggested_response"] = reply
+            content = json.dumps(result, ensure_ascii=False)
+        else:
+            content = reply
+
+        prompt_tokens = len(json.dumps(messages)) // 4
+        completion_tokens = len(content) // 4
+        usage = (recorded or {}).get("usage") or {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(
+                _stream_chunks(body.get("model", "fake"), content, usage if include_usage else None),
+                media_type="text/event-stream",
+            )
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "requests": app.state.requests,
+            "in_flight": app.state.in_flight,
+            "max_in_flight": app.state.max_in_flight,
+            "replay_hits": app.state.replay_hits,
+            "replay_misses": app.state.replay_misses,
+            "recorded": app.state.recorded,
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor falso compatível com a API de chat completions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--recordings", type=Path, help="arquivo JSONL de respostas gravadas para reproduzir")
+    parser.add_argument("--upstream", help="URL do provedor real (ex.: https://api.openai.com/v1); grava as respostas em --recordings")
+    args = parser.parse_args()
+    if args.upstream and not args.recordings:
+        parser.error("--upstream precisa de --recordings")
+
+    app = create_fake_llm_app(args.latency, args.error_rate, args.jitter, args.recordings, args.upstream)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,384 @@
+"""
+Teste de carga da API contra um servidor falso de chat completions.
+
+Sobe o servidor falso (latência, jitter e taxa de erro configuráveis) e a API
+em subprocessos, dispara uma mistura de requisições JSON, texto, .txt e PDF e
+salva vazão, latências p50/p95/p99 e pico de memória em JSON.
+
+Uso (a partir de backend/):
+    python -m benchmarks.loadtest --requests 300 --concurrency 20 --latency 0.2 --jitter 0.05
+    python -m benchmarks.loadtest --label microbatch --env MICROBATCH_ENABLED=true \\
+        --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.payloads import build_pdf, load_sample_emails, make_email
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+PAYLOAD_KINDS = ("json", "text", "txt", "pdf")
+DEFAULT_MIX = "json=3,text=3,txt=2,pdf=2"
+
+# métrica -> True quando um valor maior é melhor
+COMPARED_METRICS = {
+    "throughput_rps": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "latency_p99_ms": False,
+    "peak_rss_mb": False,
+    "error_rate": False,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in PAYLOAD_KINDS:
+            raise argparse.ArgumentTypeError(f"tipo de payload desconhecido: {kind}")
+        mix[kind] = int(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("a mistura precisa de pelo menos um peso positivo")
+    return mix
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    milliseconds = [value * 1000 for value in latencies]
+    return {
+        "latency_p50_ms": round(percentile(milliseconds, 0.50), 2),
+        "latency_p95_ms": round(percentile(milliseconds, 0.95), 2),
+        "latency_p99_ms": round(percentile(milliseconds, 0.99), 2),
+        "latency_mean_ms": round(sum(milliseconds) / len(milliseconds), 2) if milliseconds else 0.0,
+        "latency_max_ms": round(max(milliseconds), 2) if milliseconds else 0.0,
+    }
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    timings = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        if params.startswith("dur="):
+            try:
+                timings[name] = timings.get(name, 0.0) + float(params[4:])
+            except ValueError:
+                continue
+    return timings
+
+
+def build_request(kind: str, text: str, pdf_pages: int, samples, rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    if kind == "json":
+        return "/api/classify", {"json": {"text": text}}
+    if kind == "text":
+        return "/api/classify/text", {"json": {"text": text}}
+    if kind == "txt":
+        return "/api/classify/file", {"files": {"file": ("email.txt", text.encode("utf-8"), "text/plain")}}
+
+    pages = [text.replace("\n", " ")] + [rng.choice(samples)[0] for _ in range(pdf_pages - 1)]
+    return "/api/classify", {"files": {"file": ("email.pdf", build_pdf(pages), "application/pdf")}}
+
+
+class ServerProcess:
+    def __init__(self, args: List[str], env: Dict[str, str], health_url: str):
+        self.process = subprocess.Popen(
+            args,
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        self.health_url = health_url
+
+    def wait_ready(self, timeout: float = 30.0, interval: float = 0.1) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"processo encerrou antes de ficar pronto:\n{self.process.stderr.read().decode()}")
+            try:
+                if httpx.get(self.health_url, timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(interval)
+        raise RuntimeError(f"{self.health_url} não respondeu em {timeout:.0f}s")
+
+    def peak_rss_mb(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.process.pid}/status") as handle:
+                for line in handle:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+    def stop(self) -> Optional[float]:
+        """Encerra o processo e devolve o pico de RSS informado pelo kernel, em MB."""
+        if self.process.poll() is not None:
+            return None
+        self.process.send_signal(signal.SIGINT)
+        try:
+            _, _, usage = os.wait4(self.process.pid, 0)
+        except (AttributeError, ChildProcessError):
+            self.process.wait()
+            return None
+        self.process.returncode = 0
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return round(usage.ru_maxrss / scale, 1)
+
+
+def start_servers(args) -> Tuple[ServerProcess, ServerProcess, str, str]:
+    llm_port = _free_port()
+    fake = ServerProcess(
+        [
+            sys.executable, "-m", "benchmarks.fake_llm",
+            "--port", str(llm_port),
+            "--latency", str(args.latency),
+            "--jitter", str(args.jitter),
+            "--error-rate", str(args.error_rate),
+        ],
+        os.environ.copy(),
+        f"http://127.0.0.1:{llm_port}/stats",
+    )
+    fake.wait_ready()
+
+    app_port = _free_port()
+    env = os.environ.copy()
+    env.update({"OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1", "OPENAI_API_KEY": "fake-key"})
+    # mede o regime estável: as cargas sob demanda da primeira requisição ficam para benchmarks.startup
+    env.setdefault("STARTUP_WARMUP", "true")
+    env.update(args.env)
+    app = ServerProcess(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+        env,
+        f"http://127.0.0.1:{app_port}/health",
+    )
+    try:
+        app.wait_ready()
+    except Exception:
+        fake.stop()
+        raise
+    return fake, app, f"http://127.0.0.1:{llm_port}", f"http://127.0.0.1:{app_port}"
+
+
+async def run_load(base_url: str, args) -> Tuple[List[Dict[str, Any]], float]:
+    samples = load_sample_emails()
+    rng = random.Random(args.seed)
+    kinds = rng.choices(list(args.mix), weights=list(args.mix.values()), k=args.requests)
+    requests = [
+        (kind, *build_request(kind, make_email(samples, index, rng, unique=not args.repeat), args.pdf_pages, samples, rng))
+        for index, kind in enumerate(kinds)
+    ]
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in requests:
+        queue.put_nowait(item)
+
+    records: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker() -> None:
+            while True:
+                try:
+                    kind, path, payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, **payload)
+                    status = response.status_code
+                    timing = parse_server_timing(response.headers.get("server-timing", ""))
+                except httpx.HTTPError as e:
+                    status, timing = type(e).__name__, {}
+                records.append({
+                    "kind": kind,
+                    "status": status,
+                    "latency": time.perf_counter() - start,
+                    "timing": timing,
+                })
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return records, elapsed
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [record for record in records if record["status"] == 200]
+    summary = {
+        "requests": len(records),
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else 0.0,
+        "status_counts": dict(Counter(str(record["status"]) for record in records)),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+    }
+    summary.update(latency_summary([record["latency"] for record in ok]))
+
+    by_kind = defaultdict(list)
+    for record in records:
+        by_kind[record["kind"]].append(record)
+    payloads = {}
+    for kind, items in sorted(by_kind.items()):
+        succeeded = [item["latency"] for item in items if item["status"] == 200]
+        payloads[kind] = {"requests": len(items), "succeeded": len(succeeded), **latency_summary(succeeded)}
+
+    stage_totals = defaultdict(list)
+    for record in ok:
+        for name, duration in record["timing"].items():
+            stage_totals[name].append(duration)
+    stages = {
+        name: {"count": len(values), "mean_ms": round(sum(values) / len(values), 2), "p95_ms": round(percentile(values, 0.95), 2)}
+        for name, values in sorted(stage_totals.items())
+    }
+    return {"summary": summary, "payloads": payloads, "stages": stages}
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float,
+    metrics: Dict[str, bool] = COMPARED_METRICS
+) -> List[str]:
+    regressions = []
+    print(f"\ncomparação com '{baseline.get('label', '?')}' ({baseline.get('timestamp', '?')}):")
+    for metric, higher_is_better in metrics.items():
+        old = baseline["summary"].get(metric)
+        new = current["summary"].get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else (0.0 if new == old else float("inf"))
+        worse = -change if higher_is_better else change
+        regressed = worse > tolerance and abs(new - old) > 1e-9
+        flag = "  REGRESSÃO" if regressed else ""
+        print(f"  {metric:<16} {old:>10} -> {new:>10} ({change:+.1%}){flag}")
+        if regressed:
+            regressions.append(metric)
+    return regressions
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    summary = result["summary"]
+    print(f"requisições: {summary['requests']} ({summary['succeeded']} ok, status {summary['status_counts']})")
+    print(f"duração: {summary['duration_s']}s  vazão: {summary['throughput_rps']} req/s")
+    print(
+        f"latência ms: p50 {summary['latency_p50_ms']}  p95 {summary['latency_p95_ms']}  "
+        f"p99 {summary['latency_p99_ms']}  máx {summary['latency_max_ms']}"
+    )
+    print(f"pico de RSS da API: {summary['peak_rss_mb']} MB")
+    for kind, stats in result["payloads"].items():
+        print(f"  {kind:<5} {stats['requests']:>5} req  p50 {stats['latency_p50_ms']:>8} ms  p95 {stats['latency_p95_ms']:>8} ms")
+    if result["stages"]:
+        print("etapas (Server-Timing):")
+        for name, stats in result["stages"].items():
+            print(f"  {name:<22} média {stats['mean_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  ({stats['count']})")
+
+
+def _env_pair(value: str) -> Tuple[str, str]:
+    key, separator, val = value.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError("use CHAVE=VALOR")
+    return key, val
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga da API de classificação")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="latência média do LLM falso, em segundos")
+    parser.add_argument("--jitter", type=float, default=0.05, help="variação uniforme em torno da latência")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 429 do LLM falso")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"pesos por payload (padrão: {DEFAULT_MIX})")
+    parser.add_argument("--pdf-pages", type=int, default=3)
+    parser.add_argument("--repeat", action="store_true", help="não torna cada email único, permitindo acertos de cache")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--env", type=_env_pair, action="append", default=[], help="variável de ambiente da API, CHAVE=VALOR")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output", type=Path, help="arquivo JSON de saída (padrão: benchmarks/results/<label>-<data>.json)")
+    parser.add_argument("--compare", type=Path, help="resultado anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="piora relativa aceita antes de acusar regressão")
+    args = parser.parse_args()
+    args.env = dict(args.env)
+
+    fake, app, llm_url, app_url = start_servers(args)
+    try:
+        records, elapsed = asyncio.run(run_load(app_url, args))
+        llm_stats = httpx.get(f"{llm_url}/stats", timeout=5).json()
+        peak_rss = app.peak_rss_mb()
+    finally:
+        rusage_peak = app.stop()
+        fake.stop()
+
+    timestamp = datetime.now(timezone.utc)
+    result = {
+        "label": args.label,
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "mix": args.mix,
+            "pdf_pages": args.pdf_pages,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "env": args.env,
+        },
+        **summarize(records, elapsed),
+        "llm": llm_stats,
+    }
+    result["summary"]["peak_rss_mb"] = peak_rss if peak_rss is not None else rusage_peak
+
+    print_report(result)
+
+    output = args.output or RESULTS_DIR / f"{args.label}-{timestamp.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nresultado salvo em {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if compare(result, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
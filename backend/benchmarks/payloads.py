@@ -0,0 +1,59 @@
+import json
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+
+LABELED_EMAILS = Path(__file__).resolve().parent.parent / "app" / "data" / "labeled_emails.jsonl"
+# emails rotulados que ficam fora do treino do pré-classificador local, para avaliação
+HELDOUT_EMAILS = Path(__file__).resolve().parent / "data" / "heldout_emails.jsonl"
+
+
+def load_sample_emails(path: Path = LABELED_EMAILS) -> List[Tuple[str, str]]:
+    samples = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                record = json.loads(line)
+                samples.append((record["text"], record["category"]))
+    return samples
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: List[str]) -> bytes:
+    """Monta um PDF mínimo com uma linha de texto (Helvetica, latin-1) por página."""
+    count = len(pages)
+    font_id = 3 + 2 * count
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(count))}] /Count {count} >>".encode(),
+    ]
+    for index, text in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * index} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        content = f"BT /F1 11 Tf 72 720 Td ({_pdf_escape(text)}) Tj ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for index, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{index} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return output
+
+
+def make_email(samples: List[Tuple[str, str]], index: int, rng: random.Random, unique: bool = True) -> str:
+    text, _ = rng.choice(samples)
+    if unique:
+        text = f"{text}\n\nRef. {index}"
+    return text
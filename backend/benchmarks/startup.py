@@ -0,0 +1,178 @@
+"""
+Tempo de partida da API: importação dos módulos e tempo até a primeira resposta.
+
+Mede, em várias partidas a frio, o tempo de `import app.main` (com `python -X importtime`,
+agrupado por pacote), o tempo até `/health` responder e o tempo até a primeira
+classificação contra o servidor falso de chat completions, além da latência da
+segunda requisição, já com tudo carregado. O resultado é salvo em JSON em
+`benchmarks/results/` e pode ser comparado com uma execução anterior.
+
+Uso (a partir de backend/):
+    python -m benchmarks.startup --runs 5 --label lazy
+    python -m benchmarks.startup --runs 5 --label warmup --env STARTUP_WARMUP=true \\
+        --compare benchmarks/results/lazy-<data>.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.loadtest import BACKEND_DIR, RESULTS_DIR, ServerProcess, _env_pair, _free_port, compare
+
+
+# todas as métricas são tempos: menor é melhor
+COMPARED_METRICS = {
+    "import_ms": False,
+    "ready_ms": False,
+    "first_response_ms": False,
+    "first_request_ms": False,
+}
+
+
+def profile_imports(env: Dict[str, str]) -> Tuple[float, Dict[str, float]]:
+    """Importa app.main em um processo novo e devolve o total e o tempo próprio de cada pacote, em ms."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    packages: Dict[str, float] = defaultdict(float)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        module = name.strip()
+        packages[module.split(".")[0]] += int(self_us) / 1000
+        if module == "app.main":
+            total = int(cumulative_us) / 1000
+    return total, dict(packages)
+
+
+def cold_start(env: Dict[str, str], email: str, timeout: float) -> Dict[str, float]:
+    """Sobe a API do zero e mede a partida até a primeira e a segunda classificação."""
+    port = _free_port()
+    started = time.perf_counter()
+    app = ServerProcess(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env,
+        f"http://127.0.0.1:{port}/health",
+    )
+    try:
+        app.wait_ready(timeout=timeout, interval=0.01)
+        ready = time.perf_counter() - started
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            request_started = time.perf_counter()
+            client.post("/api/classify/text", json={"text": f"{email} (partida 1)"}).raise_for_status()
+            first_request = time.perf_counter() - request_started
+            first_response = time.perf_counter() - started
+            request_started = time.perf_counter()
+            client.post("/api/classify/text", json={"text": f"{email} (partida 2)"}).raise_for_status()
+            second_request = time.perf_counter() - request_started
+    finally:
+        app.stop()
+    return {
+        "ready_ms": ready * 1000,
+        "first_response_ms": first_response * 1000,
+        "first_request_ms": first_request * 1000,
+        "second_request_ms": second_request * 1000,
+    }
+
+
+def median(values: List[float]) -> float:
+    return round(statistics.median(values), 1) if values else 0.0
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    summary = result["summary"]
+    print(f"partidas: {result['config']['runs']}  (medianas)")
+    print(f"importação de app.main: {summary['import_ms']} ms")
+    print(f"até /health responder:  {summary['ready_ms']} ms")
+    print(f"até a 1ª classificação: {summary['first_response_ms']} ms")
+    print(f"1ª requisição: {summary['first_request_ms']} ms  2ª requisição: {summary['second_request_ms']} ms")
+    print("importação por pacote (tempo próprio):")
+    for package, milliseconds in result["imports"].items():
+        print(f"  {package:<24} {milliseconds:>9} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tempo de partida da API de classificação")
+    parser.add_argument("--runs", type=int, default=5, help="partidas a frio medidas")
+    parser.add_argument("--latency", type=float, default=0.05, help="latência do LLM falso, em segundos")
+    parser.add_argument("--top", type=int, default=12, help="pacotes mostrados no perfil de importação")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--env", type=_env_pair, action="append", default=[], help="variável de ambiente da API, CHAVE=VALOR")
+    parser.add_argument("--label", default="startup")
+    parser.add_argument("--output", type=Path, help="arquivo JSON de saída (padrão: benchmarks/results/<label>-<data>.json)")
+    parser.add_argument("--compare", type=Path, help="resultado anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="piora relativa aceita antes de acusar regressão")
+    args = parser.parse_args()
+    args.env = dict(args.env)
+
+    llm_port = _free_port()
+    fake = ServerProcess(
+        [sys.executable, "-m", "benchmarks.fake_llm", "--port", str(llm_port), "--latency", str(args.latency)],
+        os.environ.copy(),
+        f"http://127.0.0.1:{llm_port}/stats",
+    )
+    env = os.environ.copy()
+    env.update({"OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1", "OPENAI_API_KEY": "fake-key"})
+    env.update(args.env)
+
+    imports: List[float] = []
+    packages: Dict[str, List[float]] = defaultdict(list)
+    runs: List[Dict[str, float]] = []
+    try:
+        fake.wait_ready()
+        # a primeira importação compila os .pyc e não representa uma partida normal
+        profile_imports(env)
+        for index in range(args.runs):
+            total, by_package = profile_imports(env)
+            imports.append(total)
+            for package, milliseconds in by_package.items():
+                packages[package].append(milliseconds)
+            runs.append(cold_start(env, f"Preciso de ajuda com o chamado {index} {time.time_ns()}", args.timeout))
+    finally:
+        fake.stop()
+
+    timestamp = datetime.now(timezone.utc)
+    top = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:args.top]
+    result = {
+        "label": args.label,
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "config": {"runs": args.runs, "latency": args.latency, "env": args.env},
+        "summary": {
+            "import_ms": median(imports),
+            **{metric: median([run[metric] for run in runs]) for metric in runs[0]},
+        },
+        "imports": {package: median(values) for package, values in top},
+        "runs": [{metric: round(value, 1) for metric, value in run.items()} for run in runs],
+    }
+    print_report(result)
+
+    output = args.output or RESULTS_DIR / f"{args.label}-{timestamp.strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nresultado salvo em {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if compare(result, baseline, args.tolerance, COMPARED_METRICS):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
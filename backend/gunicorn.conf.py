@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+
+# Os workers compartilham cache, rate limit, métricas e respostas pendentes por este arquivo SQLite.
+os.environ.setdefault("SHARED_STATE_DB_PATH", "shared_state.db")
+# Cada worker só passa a aceitar requisições depois de montar o cliente do LLM e abrir as conexões.
+os.environ.setdefault("STARTUP_WARMUP", "true")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "app.worker.ClassifierWorker"
+keepalive = 5
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+# SIGTERM: até SHUTDOWN_REQUEST_TIMEOUT para as requisições e SHUTDOWN_DRAIN_SECONDS para jobs e respostas.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "60"))
+accesslog = "-"
+
+
+def on_starting(server):
+    from app.services.shared_state import SharedState
+
+    state = SharedState(os.environ["SHARED_STATE_DB_PATH"])
+    state.reset_metrics()
+    state.close()
@@ -0,0 +1,70 @@
+"""As classificações simultâneas precisam se sobrepor no event loop, e não rodar uma depois da outra."""
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+import uvicorn
+
+# o app lê a configuração na importação: nada de cache, histórico ou atalhos que evitem o LLM
+os.environ.update({
+    "OPENAI_API_KEY": "fake-key",
+    "CACHE_ENABLED": "false",
+    "NEAR_DUP_ENABLED": "false",
+    "RESULT_LOG_ENABLED": "false",
+    "LOCAL_CLASSIFIER_ENABLED": "false",
+    "MICROBATCH_ENABLED": "false",
+    "SPECULATIVE_REPLY": "off",
+    "CLASSIFY_MODE": "two_step",
+})
+
+from benchmarks.fake_llm import create_fake_llm_app  # noqa: E402
+from benchmarks.loadtest import _free_port  # noqa: E402
+
+LATENCY = 0.3
+REQUESTS = 10
+
+
+@pytest.fixture(scope="module")
+def fake_llm():
+    port = _free_port()
+    app = create_fake_llm_app(LATENCY)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "servidor falso não subiu"
+        time.sleep(0.01)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    yield app
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+async def _classify_concurrently(count: int) -> float:
+    from app.services.backends.registry import close_backends
+    from app.services.classifier import classify_email
+
+    try:
+        # a primeira chamada monta o cliente e abre a conexão; fica fora da medição
+        await classify_email("Aquecimento do cliente")
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(classify_email(f"Preciso de ajuda com o chamado {index}") for index in range(count))
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        await close_backends()
+    assert all(result.category == "Produtivo" for result in results)
+    return elapsed
+
+
+def test_concurrent_classifications_overlap(fake_llm):
+    elapsed = asyncio.run(_classify_concurrently(REQUESTS))
+
+    # em two_step cada email faz duas chamadas em sequência (classificação e resposta)
+    serial = REQUESTS * 2 * LATENCY
+    assert elapsed < serial / 4, f"{REQUESTS} classificações levaram {elapsed:.2f}s (em série: {serial:.2f}s)"
+    assert fake_llm.state.max_in_flight >= REQUESTS
@@ -8,7 +8,7 @@ import { EmailUploader } from "./components/EmailUploader"
 import { EmailTextInput } from "./components/EmailTextInput"
 import { ClassificationResult } from "./components/ClassificationResult"
 import { LoadingSpinner } from "./components/LoadingSpinner"
-import { classifyEmailFromFile, classifyEmailFromText } from "./lib/api"
+import { classifyEmailStream } from "./lib/api"
 
 function App() {
   const [activeTab, setActiveTab] = useState("upload")
@@ -42,7 +42,7 @@ function App() {
     setIsLoading(true)
 
     try {
-      let classification
+      let input
 
       if (activeTab === "upload") {
         if (!selectedFile) {
@@ -50,18 +50,32 @@ function App() {
           setIsLoading(false)
           return
         }
-        classification = await classifyEmailFromFile(selectedFile)
+        input = { file: selectedFile }
       } else {
         if (!emailText.trim()) {
           setError("Por favor, insira o texto do email antes de classificar.")
           setIsLoading(false)
           return
         }
-        classification = await classifyEmailFromText(emailText.trim())
+        input = { text: emailText.trim() }
       }
 
+      const classification = await classifyEmailStream(input, {
+        onClassification: ({ category, confidence }) => {
+          setResult({ category, confidence, suggested_response: "" })
+          setIsLoading(false)
+        },
+        onToken: (token) => {
+          setResult((current) => current && {
+            ...current,
+            suggested_response: current.suggested_response + token,
+          })
+        },
+      })
+
       setResult(classification)
     } catch (err) {
+      setResult(null)
       setError(
         err.message || "Erro ao classificar email. Verifique sua conexão e tente novamente."
       )
@@ -5,7 +5,7 @@ import { Button } from "./ui/button"
 import { cn } from "../lib/utils"
 
 const MAX_FILE_SIZE = 10 * 1024 * 1024
-const ACCEPTED_TYPES = [".txt", ".pdf"]
+const ACCEPTED_TYPES = [".txt", ".pdf", ".eml"]
 
 export function EmailUploader({
   onFileSelect,
@@ -141,7 +141,7 @@ export function EmailUploader({
               Arraste o arquivo aqui ou clique para selecionar
             </p>
             <p className="text-xs text-muted-foreground">
-              Formatos aceitos: .txt, .pdf (máximo 10MB)
+              Formatos aceitos: .txt, .pdf, .eml (máximo 10MB)
             </p>
           </div>
           <Button
@@ -160,7 +160,7 @@ export function EmailUploader({
       <input
         id="file-input"
         type="file"
-        accept=".txt,.pdf"
+        accept=".txt,.pdf,.eml"
         className="hidden"
         onChange={handleFileInput}
         disabled={disabled}
@@ -41,3 +41,57 @@ export async function classifyEmailFromText(text) {
   const data = await response.json()
   return data
 }
+
+export async function classifyEmailStream({ file, text }, { onClassification, onToken } = {}) {
+  const options = { method: "POST" }
+
+  if (file) {
+    const formData = new FormData()
+    formData.append("file", file)
+    options.body = formData
+  } else {
+    options.headers = { "Content-Type": "application/json" }
+    options.body = JSON.stringify({ text })
+  }
+
+  const response = await fetch(`${API_URL}/api/classify/stream`, options)
+
+  if (!response.ok || !response.body) {
+    const error = {
+      message: `Erro ao classificar email: ${response.statusText}`,
+      status: response.status,
+    }
+    throw error
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ""
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+
+    buffer += decoder.decode(value, { stream: true })
+    const events = buffer.split("\n\n")
+    buffer = events.pop()
+
+    for (const rawEvent of events) {
+      let event = "message"
+      let data = ""
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7)
+        else if (line.startsWith("data: ")) data += line.slice(6)
+      }
+      if (!data) continue
+
+      const payload = JSON.parse(data)
+      if (event === "classification") onClassification?.(payload)
+      else if (event === "token") onToken?.(payload.text)
+      else if (event === "done") return payload
+      else if (event === "error") throw { message: payload.error }
+    }
+  }
+
+  throw { message: "Conexão encerrada antes do fim da classificação" }
+}